@@ -0,0 +1,28 @@
+-- Add unified symbol columns to the trades table
+-- import_trades1.py fills them from the symbols table while it imports
+-- (symbol_index.py), so cube_commissions_symbol and cube_product_volume can
+-- group trades by unified symbol / asset type without joining symbols.
+-- Run this before re-creating the cube procedures
+-- (populate_comprehensive_cubes.sql, rebuild_cubes_optimized.sql).
+
+USE partner_report;
+
+ALTER TABLE trades
+ADD COLUMN unified_symbol VARCHAR(100) NULL AFTER affiliated_partner_id,
+ADD COLUMN unified_asset_type VARCHAR(100) NULL AFTER unified_symbol,
+ADD COLUMN unified_asset_sub_type VARCHAR(100) NULL AFTER unified_asset_type,
+ADD COLUMN unified_category VARCHAR(50) NULL AFTER unified_asset_sub_type;
+
+-- Index for the symbol and product cubes
+CREATE INDEX idx_trades_partner_unified ON trades(affiliated_partner_id, unified_asset_type, unified_symbol);
+
+-- One-time backfill of the trades imported before (later imports fill the columns themselves)
+UPDATE trades t
+JOIN symbols s ON s.platform = t.platform AND s.symbol = t.asset
+SET t.unified_symbol = s.unified_symbol,
+    t.unified_asset_type = s.unified_asset_type,
+    t.unified_asset_sub_type = s.unified_asset_sub_type,
+    t.unified_category = s.unified_category;
+
+-- Show updated table structure
+DESCRIBE trades;
@@ -0,0 +1,446 @@
+#!/usr/bin/env python3
+"""
+Shared batched writer for the CSV importers
+
+Buffers rows and sends them as real multi-row statements:
+    INSERT INTO table (a, b) VALUES (%s, %s), (%s, %s), ... [ON DUPLICATE KEY UPDATE ...]
+so a batch costs one network round trip, and commits only every
+commit_every rows instead of after every batch.
+
+With a checkpoint (checkpoint.ImportCheckpoint) the writer also saves the
+source position reported through advance() inside every commit, so an
+interrupted import can be resumed with --resume.
+
+before_flush(cursor, rows) runs just before each batch's INSERT, in the same
+transaction (used by cube_refresh.BulkCubeSession to queue partners).
+
+With pipeline_depth > 0 the INSERTs and commits run on a writer thread fed
+through a queue of at most pipeline_depth batches: the caller keeps parsing
+while MySQL executes the previous batch, and blocks only when the queue is
+full. Each queued batch or commit carries the source position at the time
+it was queued, so checkpoints stay exact. Nothing else may use the
+connection until close(); the busy and waiting time of both sides is
+printed by close().
+
+With metrics (ingest_metrics.IngestMetrics) the writer records execute,
+commit and trigger (before_flush) time, the latency of every batch, rows
+read and written, and failed batches as rejects.
+
+A batch the server refuses because of its data (ROW_ERRORS: a duplicate
+key, a value out of range, a bad date...) is split in halves and retried until the
+offending rows are isolated, so one bad row costs about 2 * log2(batch_size)
+extra statements instead of the whole batch. The other rows are written as
+usual; the bad ones are counted in errors and, with reject_file, appended
+to a CSV (the columns plus reject_reason) to be fixed and re-imported.
+Errors that are not about the rows (lock wait timeout, deadlock, lost
+connection) are not bisected. The server has rolled back the whole
+transaction by then, so the writer rolls back too, writes the batches sent
+since the last commit again and retries the statement, once. If that fails
+as well (or before_flush fails), BatchAborted is raised: nothing after the
+last commit and its checkpoint is kept, and the import continues from
+there with --resume. Any other error (a missing table or column, no
+privilege, an error without a server errno) is about the statement, not
+the rows: it raises BatchAborted the same way instead of rejecting every row.
+"""
+
+import csv
+import os
+import queue
+import threading
+import time
+
+from db import Error
+
+DEFAULT_BATCH_SIZE = 1000
+DEFAULT_COMMIT_EVERY = 10000
+DEFAULT_PIPELINE_DEPTH = 4
+# Server errors that are about the connection or transaction, not the rows
+# (lock wait timeout, deadlock, server gone away, lost connection)
+TRANSACTION_ERRORS = {1205, 1213, 2006, 2013, 2055}
+# Server errors caused by the values of a row, the only ones bisected
+# (column cannot be null, duplicate key, foreign key, out of range, truncated,
+# bad datetime, bad value, too long, out of range for the type, CHECK failed)
+ROW_ERRORS = {1048, 1062, 1216, 1452, 1264, 1265, 1292, 1366, 1406, 1690, 3819, 4025}
+
+class BatchAborted(Exception):
+    """The rows written since the last commit were rolled back and could not be written again"""
+
+def add_batch_arguments(parser, batch_size=DEFAULT_BATCH_SIZE, commit_every=DEFAULT_COMMIT_EVERY,
+                        pipeline=False, rejects=False):
+    """Add --batch-size and --commit-every (and --pipeline-depth, --reject-file) options to an argparse parser"""
+    parser.add_argument('--batch-size', type=int, default=batch_size,
+                        help=f'Rows per multi-row INSERT statement (default: {batch_size})')
+    parser.add_argument('--commit-every', type=int, default=commit_every,
+                        help=f'Rows between commits (default: {commit_every})')
+    if pipeline:
+        parser.add_argument('--pipeline-depth', type=int, default=DEFAULT_PIPELINE_DEPTH,
+                            help='Batches queued for the writer thread while the next ones are parsed '
+                                 f'(0 = write inline; default: {DEFAULT_PIPELINE_DEPTH})')
+    if rejects:
+        parser.add_argument('--reject-file', metavar='PATH', default=None,
+                            help='Append the rows the database refuses to this CSV, with the error')
+    return parser
+
+def build_insert_sql(table, columns, row_count, on_duplicate=None):
+    """Build an INSERT statement with row_count value groups"""
+    group = '(' + ', '.join(['%s'] * len(columns)) + ')'
+    sql = f"INSERT INTO {table} ({', '.join(columns)}) VALUES " + ', '.join([group] * row_count)
+    if on_duplicate:
+        sql += f" ON DUPLICATE KEY UPDATE {on_duplicate}"
+    return sql
+
+def update_all_columns(columns, key_columns=()):
+    """ON DUPLICATE KEY UPDATE clause that overwrites every non-key column"""
+    return ', '.join(f"{col} = VALUES({col})" for col in columns if col not in key_columns)
+
+class RejectFile:
+    """CSV of refused rows: the table columns plus reject_reason, opened on the first row"""
+
+    def __init__(self, path, columns):
+        self.path = path
+        self.columns = list(columns)
+        self.rows = 0
+        self._file = None
+        self._writer = None
+
+    def write(self, row, reason):
+        if self._file is None:
+            # Appended to, so a --resume run keeps the rejects of the first one
+            new = not os.path.exists(self.path) or os.path.getsize(self.path) == 0
+            self._file = open(self.path, 'a', encoding='utf-8', newline='')
+            self._writer = csv.writer(self._file)
+            if new:
+                self._writer.writerow(self.columns + ['reject_reason'])
+        self._writer.writerow(['' if value is None else value for value in row] + [reason])
+        self.rows += 1
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+def part_reject_path(path, part):
+    """rejects.csv -> rejects.part<N>.csv, for one writer process of several"""
+    base, ext = os.path.splitext(path)
+    return f"{base}.part{part}{ext}"
+
+def merge_reject_files(path, parts):
+    """Append the rows of the part files to path and delete them; returns the rows moved"""
+    moved = 0
+    for part in parts:
+        if not os.path.exists(part):
+            continue
+        with open(part, encoding='utf-8', newline='') as f:
+            reader = csv.reader(f)
+            header = next(reader, None)
+            rows = list(reader)
+        if rows:
+            new = not os.path.exists(path) or os.path.getsize(path) == 0
+            with open(path, 'a', encoding='utf-8', newline='') as out:
+                writer = csv.writer(out)
+                if new:
+                    writer.writerow(header)
+                writer.writerows(rows)
+            moved += len(rows)
+        os.remove(part)
+    return moved
+
+class BatchWriter:
+    """Collects row tuples and writes them as multi-row INSERT statements"""
+
+    def __init__(self, connection, table, columns, batch_size=DEFAULT_BATCH_SIZE,
+                 commit_every=DEFAULT_COMMIT_EVERY, on_duplicate=None, label='rows',
+                 checkpoint=None, before_flush=None, pipeline_depth=0, metrics=None,
+                 reject_file=None):
+        self.connection = connection
+        self.cursor = connection.cursor()
+        self.table = table
+        self.columns = list(columns)
+        self.batch_size = max(1, batch_size)
+        # None: only commit when commit() is called (e.g. at chunk boundaries)
+        self.commit_every = max(1, commit_every) if commit_every is not None else None
+        self.on_duplicate = on_duplicate
+        self.label = label
+        self.checkpoint = checkpoint
+        self.before_flush = before_flush
+        self.metrics = metrics
+        self.rejects = RejectFile(reject_file, self.columns) if reject_file else None
+
+        self.batch = []
+        self.written = 0
+        self.errors = 0
+        self.batches = 0
+        self.bisections = 0
+        self.commits = 0
+        self._uncommitted = 0
+        # (before_flush rows or None, rows inserted) since the last commit, to write again after a rollback
+        self._pending = []
+        self._retrying = False
+        self.retries = 0
+        self.byte_offset = checkpoint.byte_offset if checkpoint else None
+        self.rows_read = checkpoint.rows_read if checkpoint else 0
+        self.completed = checkpoint.completed if checkpoint else False
+        # Last position saved to the checkpoint (written by the writer side only)
+        self._saved_position = self._position()
+        self._full_sql = build_insert_sql(table, self.columns, self.batch_size, on_duplicate)
+
+        self._queue = None
+        if pipeline_depth and pipeline_depth > 0:
+            self._queue = queue.Queue(maxsize=pipeline_depth)
+            self._failure = None
+            self._aborted = False
+            self._started = time.perf_counter()
+            self._parse_wait = 0.0
+            self._write_busy = 0.0
+            self._write_wait = 0.0
+            self._thread = threading.Thread(target=self._run, name=f'{label} writer', daemon=True)
+            self._thread.start()
+
+    def _position(self):
+        return (self.byte_offset, self.rows_read, self.completed)
+
+    def _submit(self, operation, *args):
+        """Run a write-side operation inline, or queue it for the writer thread"""
+        if self._queue is None:
+            operation(*args)
+            return
+        if self._failure is not None:
+            raise self._failure
+        start = time.perf_counter()
+        self._queue.put((operation, args))
+        self._parse_wait += time.perf_counter() - start
+
+    def _run(self):
+        while True:
+            start = time.perf_counter()
+            item = self._queue.get()
+            self._write_wait += time.perf_counter() - start
+            if item is None:
+                return
+            if self._failure is not None or self._aborted:
+                continue  # keep draining so the producer never blocks
+            operation, args = item
+            start = time.perf_counter()
+            try:
+                operation(*args)
+            except BaseException as e:
+                self._failure = e
+            self._write_busy += time.perf_counter() - start
+
+    def _stop(self):
+        if self._queue is None or not self._thread.is_alive():
+            return
+        self._queue.put(None)
+        self._thread.join()
+
+    def add(self, row):
+        """Queue one row tuple, flushing when the batch is full"""
+        self.batch.append(row)
+        if len(self.batch) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        """Send the buffered rows as one multi-row INSERT"""
+        if not self.batch:
+            return
+        rows = self.batch
+        self.batch = []
+        self._submit(self._write, rows, self._position())
+
+    def _write(self, rows, position):
+        metrics = self.metrics
+        if self.before_flush is not None:
+            start = time.perf_counter()
+            self._run_hook(rows)
+            if metrics is not None:
+                metrics.add_time('trigger', time.perf_counter() - start)
+
+        written = self._execute(rows)
+        self.written += written
+        if metrics is not None:
+            metrics.rows_written += written
+        self.batches += 1
+        self._uncommitted += written
+        if self.commit_every is not None and self._uncommitted >= self.commit_every:
+            self._commit(position)
+
+    def _execute(self, rows):
+        """INSERT rows, bisecting a refused statement down to its bad rows; returns rows written"""
+        if len(rows) == self.batch_size:
+            sql = self._full_sql
+        else:
+            sql = build_insert_sql(self.table, self.columns, len(rows), self.on_duplicate)
+        params = [value for row in rows for value in row]
+
+        start = time.perf_counter()
+        try:
+            self.cursor.execute(sql, params)
+        except Error as e:
+            errno = getattr(e, 'errno', None)
+            if errno in TRANSACTION_ERRORS:
+                return self._retry(e, self._execute, rows)
+            if errno not in ROW_ERRORS:
+                self._abort(e)
+            # A failed statement is rolled back on its own; the transaction carries on
+            if len(rows) == 1:
+                self._reject(rows, e)
+                return 0
+            self.bisections += 1
+            middle = len(rows) // 2
+            return self._execute(rows[:middle]) + self._execute(rows[middle:])
+        self._pending.append((None, rows))
+        if self.metrics is not None:
+            elapsed = time.perf_counter() - start
+            self.metrics.add_time('execute', elapsed)
+            self.metrics.observe_batch(elapsed)
+        return len(rows)
+
+    def _run_hook(self, rows):
+        try:
+            self.before_flush(self.cursor, rows)
+        except Error as e:
+            if getattr(e, 'errno', None) not in TRANSACTION_ERRORS:
+                self._abort(e)
+            self._retry(e, self._run_hook, rows)
+            return
+        self._pending.append((rows, None))
+
+    def _retry(self, error, operation, rows):
+        """After a transaction-level error: roll back, write again what the transaction held, retry once"""
+        if self._retrying:
+            self._abort(error)
+        self._retrying = True
+        self.retries += 1
+        pending = self._pending
+        self._pending = []
+        print(f"  ⚠️  {error}: rolling back and writing {len(pending)} uncommitted statements again...")
+        try:
+            self.connection.rollback()
+            for hooked, inserted in pending:
+                if hooked is not None:
+                    self.before_flush(self.cursor, hooked)
+                else:
+                    self.cursor.execute(
+                        build_insert_sql(self.table, self.columns, len(inserted), self.on_duplicate),
+                        [value for row in inserted for value in row])
+                self._pending.append((hooked, inserted))
+        except Error as e:
+            self._abort(e)
+        try:
+            return operation(rows)
+        finally:
+            self._retrying = False
+
+    def _abort(self, error):
+        """Roll back to the last commit and raise BatchAborted"""
+        try:
+            self.connection.rollback()
+        except Error:
+            pass  # connection lost: the server has rolled back already
+        self._pending = []
+        self.written -= self._uncommitted
+        if self.metrics is not None:
+            self.metrics.rows_written -= self._uncommitted
+        self._uncommitted = 0
+        raise BatchAborted(f"{error}; the {self.label} since the last commit were rolled back "
+                           f"(continue with --resume)") from error
+
+    def _reject(self, rows, error):
+        self.errors += len(rows)
+        reason = str(error)
+        if self.rejects is not None:
+            for row in rows:
+                self.rejects.write(row, reason)
+        if self.metrics is not None:
+            errno = getattr(error, 'errno', None)
+            self.metrics.reject(f"{type(error).__name__} {errno}" if errno else type(error).__name__,
+                                f"{len(rows)} {self.label}: {error}", rows=len(rows))
+        else:
+            print(f"  ✗ Rejected {len(rows)} {self.label}: {error}")
+
+    def advance(self, byte_offset, rows_read=1):
+        """Record the source position after the next row(s); call before add()
+
+        The position is saved by the next commit, which only happens once
+        every added row has been flushed, so it never runs ahead of the data.
+        """
+        self.byte_offset = byte_offset
+        self.rows_read += rows_read
+        if self.metrics is not None:
+            self.metrics.rows_read += rows_read
+
+    def finish(self):
+        """Mark the source as fully read; saved by the final commit"""
+        self.completed = True
+
+    def commit(self):
+        """Commit the rows written since the last commit (and the checkpoint)"""
+        # Rows still buffered are not written yet, so the position cannot be saved
+        self._submit(self._commit, None if self.batch else self._position())
+
+    def _commit(self, position):
+        save_checkpoint = (self.checkpoint is not None and position is not None
+                           and position != self._saved_position)
+        if not self._uncommitted and not save_checkpoint:
+            return
+        start = time.perf_counter()
+        if save_checkpoint:
+            byte_offset, rows_read, completed = position
+            self.checkpoint.save(self.cursor, byte_offset, rows_read,
+                                 self.checkpoint.rows_written + self.written, completed)
+            self._saved_position = position
+        self.connection.commit()
+        self._pending = []
+        if self.metrics is not None:
+            self.metrics.add_time('commit', time.perf_counter() - start)
+        self.commits += 1
+        if self._uncommitted:
+            self._uncommitted = 0
+            print(f"  Imported {self.written} {self.label}...")
+
+    def close(self):
+        """Flush and commit whatever is left, then release the cursor"""
+        try:
+            self.flush()
+            self.commit()
+            self._stop()
+            if self._queue is not None:
+                if self._failure is not None:
+                    raise self._failure
+                self.print_pipeline_report()
+                if self.metrics is not None:
+                    self.metrics.add_time('pipeline wait', self._parse_wait)
+        finally:
+            # Also when the flush or commit re-raises a writer failure, so that
+            # callers without a with block do not leave the thread or cursor behind
+            self._stop()
+            self._queue = None
+            self._release()
+        if self.rejects is not None and self.rejects.rows:
+            print(f"  ⚠️  {self.rejects.rows} rejected {self.label} saved to {self.rejects.path}")
+
+    def _release(self):
+        self.cursor.close()
+        if self.rejects is not None:
+            self.rejects.close()
+
+    def print_pipeline_report(self):
+        """Busy and waiting time of the parsing (caller) and writing sides"""
+        wall = time.perf_counter() - self._started
+        print(f"  Pipeline ({self.label}): {wall:.2f}s wall | "
+              f"parse {wall - self._parse_wait:.2f}s busy, {self._parse_wait:.2f}s waiting on writes | "
+              f"write {self._write_busy:.2f}s busy, {self._write_wait:.2f}s waiting on rows")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            if self._queue is not None:
+                # Drop what is still queued; the last commit (and checkpoint) stands
+                self._aborted = True
+                self._stop()
+            self._release()
+        return False
@@ -0,0 +1,11 @@
+"""
+End-to-end benchmarks for the partner report
+
+    python3 -m benchmarks.run --scale 10k
+    python3 -m benchmarks.compare benchmarks/results/10k-<old>.json benchmarks/results/10k-<new>.json
+
+run.py generates deterministic synthetic data with seed.py, loads it into a
+scratch database through the real importers, times the cube procedures
+and the queries behind api/endpoints/cubes.php, and writes rows/s, latency
+percentiles and peak RSS as JSON. compare.py diffs two such files.
+"""
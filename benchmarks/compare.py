@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+"""
+Compare two benchmark result files from benchmarks/run.py
+
+    python3 -m benchmarks.compare OLD.json NEW.json [--threshold 10]
+
+Prints, for every step present in both files, its throughput (imports:
+rows/s) or p95 latency (procedures and queries) and the change. Exits with
+status 1 if any step regressed by more than --threshold percent.
+"""
+
+import argparse
+import json
+import sys
+
+def step_metric(result):
+    """(label, value, higher_is_better) of one step, or None if it has no measurement"""
+    if result.get('rows_per_s'):
+        return 'rows/s', result['rows_per_s'], True
+    if 'latency_ms' in result:
+        return 'p95 ms', result['latency_ms']['p95'], False
+    return None
+
+def compare(old, new, threshold):
+    """Print the comparison; returns the names of the regressed steps"""
+    old_steps = {(r['kind'], r['name']): r for r in old['results']}
+    regressions = []
+    print(f"{old['scale']}: {old['commit']} -> {new['commit']}")
+    for result in new['results']:
+        key = (result['kind'], result['name'])
+        before, after = old_steps.get(key), step_metric(result)
+        if before is None or after is None or step_metric(before) is None:
+            continue
+        label, value, higher_is_better = after
+        previous = step_metric(before)[1]
+        change = (value - previous) / previous * 100 if previous else 0.0
+        worse = -change if higher_is_better else change
+        flag = ' ✗' if worse > threshold else ''
+        if flag:
+            regressions.append(result['name'])
+        print(f"  {result['kind']:9} {result['name']:32} {label:6} {previous:>12,.2f} -> {value:>12,.2f} "
+              f"({change:+6.1f}%){flag}")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare two benchmark result files')
+    parser.add_argument('old', help='Baseline result JSON')
+    parser.add_argument('new', help='New result JSON')
+    parser.add_argument('--threshold', type=float, default=10.0,
+                        help='Percent change counted as a regression (default: 10)')
+    args = parser.parse_args()
+
+    with open(args.old, encoding='utf-8') as f:
+        old = json.load(f)
+    with open(args.new, encoding='utf-8') as f:
+        new = json.load(f)
+    if old['scale'] != new['scale']:
+        print(f"⚠️  Comparing different scales ({old['scale']} vs {new['scale']})")
+
+    regressions = compare(old, new, args.threshold)
+    if regressions:
+        print(f"✗ {len(regressions)} regressions over {args.threshold:g}%: {', '.join(regressions)}")
+        sys.exit(1)
+    print("✓ No regressions")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+"""
+Run one of the repo's scripts against the benchmark database and report its peak RSS
+
+    python3 -m benchmarks.entry DATABASE RESULT_FILE SCRIPT [ARGS...]
+
+The scripts connect through db.py, so PARTNER_REPORT_DB_NAME is set to
+DATABASE before SCRIPT is run as __main__ (pool workers forked by the script
+inherit it).
+Peak RSS of this process and of its children is written to RESULT_FILE.
+"""
+
+import json
+import os
+import resource
+import runpy
+import sys
+
+def max_rss_mb(who):
+    rss = resource.getrusage(who).ru_maxrss
+    # KB on Linux, bytes on macOS
+    return rss / (1024 * 1024) if sys.platform == 'darwin' else rss / 1024
+
+def use_database(database):
+    """Make every db.connect() in this process and its children use database"""
+    os.environ['PARTNER_REPORT_DB_NAME'] = database
+
+def main():
+    if len(sys.argv) < 4:
+        sys.exit(__doc__)
+    database, result_file, script = sys.argv[1:4]
+    use_database(database)
+    sys.argv = [script] + sys.argv[4:]
+    sys.path.insert(0, os.path.dirname(os.path.abspath(script)))
+    status = 0
+    try:
+        runpy.run_path(script, run_name='__main__')
+    except SystemExit as e:
+        status = e.code if isinstance(e.code, int) else (0 if e.code is None else 1)
+    with open(result_file, 'w', encoding='utf-8') as f:
+        json.dump({
+            'exit_status': status,
+            'peak_rss_mb': round(max_rss_mb(resource.RUSAGE_SELF), 1),
+            'children_peak_rss_mb': round(max_rss_mb(resource.RUSAGE_CHILDREN), 1),
+        }, f)
+    sys.exit(status)
+
+if __name__ == "__main__":
+    main()
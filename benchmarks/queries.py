@@ -0,0 +1,110 @@
+"""
+The per-partner queries behind api/endpoints/cubes.php
+
+Keyed by the endpoint's ?cube= value; each takes the partner ID as its only
+parameter (the endpoint's default limits are inlined). Keep in sync with
+cubes.php when a query there changes.
+"""
+
+CUBE_QUERIES = {
+    'dashboard': "SELECT * FROM cube_partner_dashboard WHERE partner_id = %s",
+    'partner_scorecard': "SELECT * FROM cube_partner_scorecard WHERE partner_id = %s",
+    'monthly_deposits': """
+        SELECT year_month_str as month, total_deposits, deposit_count, avg_deposit_size,
+               unique_depositors, net_deposits
+        FROM cube_monthly_deposits
+        WHERE partner_id = %s
+        ORDER BY year_month_str DESC
+        LIMIT 12
+    """,
+    'client_tiers': """
+        SELECT tier, client_count, percentage
+        FROM cube_client_tiers
+        WHERE partner_id = %s
+        ORDER BY client_count DESC
+    """,
+    'demographics': """
+        SELECT dimension, dimension_value, client_count, percentage
+        FROM cube_client_demographics
+        WHERE partner_id = %s
+        ORDER BY dimension, client_count DESC
+    """,
+    'commissions': """
+        SELECT year_month as date, commission_plan, total_commissions, trade_count
+        FROM cube_commissions_monthly
+        WHERE partner_id = %s
+        ORDER BY year_month DESC
+        LIMIT 12
+    """,
+    'countries': """
+        SELECT country, client_count, total_deposits, total_commissions, total_trades
+        FROM cube_country_performance
+        WHERE partner_id = %s
+        ORDER BY client_count DESC
+    """,
+    'badge_progress': """
+        SELECT total_commissions, total_deposits, badges_earned, last_updated
+        FROM cube_badge_progress
+        WHERE partner_id = %s
+    """,
+    'daily_commissions_plan': """
+        SELECT trade_date, commission_plan, total_commissions, trade_count
+        FROM cube_daily_commissions_plan
+        WHERE partner_id = %s
+        ORDER BY trade_date DESC
+        LIMIT 90
+    """,
+    'daily_commissions_platform': """
+        SELECT trade_date, platform, total_commissions, trade_count
+        FROM cube_daily_commissions_platform
+        WHERE partner_id = %s
+        ORDER BY trade_date DESC
+        LIMIT 90
+    """,
+    'commissions_product': """
+        SELECT asset_type, contract_type, total_commissions, trade_count
+        FROM cube_commissions_product
+        WHERE partner_id = %s
+        ORDER BY total_commissions DESC
+    """,
+    'commissions_symbol': """
+        SELECT asset, total_commissions, trade_count
+        FROM cube_commissions_symbol
+        WHERE partner_id = %s
+        ORDER BY total_commissions DESC
+        LIMIT 20
+    """,
+    'daily_signups': """
+        SELECT signup_date, commission_plan, platform, signup_count
+        FROM cube_daily_signups
+        WHERE partner_id = %s
+        ORDER BY signup_date DESC
+        LIMIT 90
+    """,
+    'daily_funding': """
+        SELECT funding_date, category, total_amount, transaction_count
+        FROM cube_daily_funding
+        WHERE partner_id = %s
+        ORDER BY funding_date DESC
+        LIMIT 90
+    """,
+    'product_volume': """
+        SELECT asset_type, total_volume, trade_count, avg_trade_size, client_count
+        FROM cube_product_volume
+        WHERE partner_id = %s
+        ORDER BY total_volume DESC
+    """,
+    'daily_trends': """
+        SELECT trend_date, signups, deposits, commissions, trades
+        FROM cube_daily_trends
+        WHERE partner_id = %s
+        ORDER BY trend_date DESC
+        LIMIT 30
+    """,
+    'partner_countries': """
+        SELECT country, client_count
+        FROM cube_partner_countries
+        WHERE partner_id = %s
+        ORDER BY client_count DESC
+    """,
+}
@@ -0,0 +1,309 @@
+#!/usr/bin/env python3
+"""
+End-to-end benchmark: ingest, cube refresh and report queries
+
+    python3 -m benchmarks.run --scale 10k
+    python3 -m benchmarks.run --scale 1m --scale 10m --output-dir benchmarks/results
+
+For every scale:
+1. seed.py generates clients1/trades1/deposits1.csv (deterministic by --seed,
+   cached under --data-dir).
+2. The scratch database --database is dropped and rebuilt from SETUP_SQL
+   (through the mysql client, with 'partner_report' renamed), and the
+   generated partners.sql is loaded.
+3. import_clients.py, import_trades1.py and import_deposits.py run as
+   subprocesses against it (benchmarks/entry.py); rows/s and peak RSS are
+   recorded.
+4. The cube procedures in PROCEDURES are called --repeat times, and
+   refresh_partner_cubes for --partners partners (latency percentiles).
+5. Every query in benchmarks/queries.py runs --repeat times for the same
+   partners (latency percentiles).
+
+Results go to <output-dir>/<scale>-<commit>.json; compare two runs with
+benchmarks/compare.py. A step that fails (e.g. a cube table the setup
+scripts did not create) is recorded with its error and the run goes on.
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import re
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+REPO = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(REPO))
+from seed import generate_dataset  # noqa: E402
+from benchmarks.entry import max_rss_mb  # noqa: E402
+from db import Error, config, connect  # noqa: E402
+from benchmarks.queries import CUBE_QUERIES  # noqa: E402
+
+# Database configuration (the benchmark database is created by this script)
+DB_CONFIG = config(database=None)
+
+BENCH_DATABASE = 'partner_report_bench'
+DATA_DIR = REPO / 'benchmarks' / 'data'
+RESULTS_DIR = REPO / 'benchmarks' / 'results'
+
+# (clients, trades, deposits, partners) per scale
+SCALES = {
+    '10k': (2000, 10000, 2000, 50),
+    '1m': (100000, 1000000, 200000, 500),
+    '10m': (1000000, 10000000, 2000000, 2000),
+}
+
+# Loaded in order; later files replace cube tables created by earlier ones
+SETUP_SQL = [
+    'database_schema.sql',
+    'badges_table.sql',
+    'create_comprehensive_cubes.sql',
+    'populate_comprehensive_cubes.sql',
+    'create_data_cubes.sql',
+    'create_monthly_deposits_cube.sql',
+    'create_partner_scorecard_cube.sql',
+]
+
+# (name, script, CSV file, table counted afterwards); clients first for the trades FK
+IMPORTS = [
+    ('import_clients', 'import_clients.py', 'clients1.csv', 'clients'),
+    ('import_trades1', 'import_trades1.py', 'trades1.csv', 'trades'),
+    ('import_deposits', 'import_deposits.py', 'deposits1.csv', 'deposits'),
+]
+
+PROCEDURES = ['populate_all_cubes', 'refresh_all_cubes', 'populate_cube_monthly_deposits',
+              'populate_cube_partner_scorecard']
+
+def percentiles(samples):
+    """p50/p95/p99/max of latencies in seconds, as milliseconds (nearest rank)"""
+    ordered = sorted(samples)
+    def rank(p):
+        return ordered[min(len(ordered) - 1, max(0, int(round(p / 100 * len(ordered))) - 1))]
+    return {f"p{p}": round(rank(p) * 1000, 3) for p in (50, 95, 99)} | {'max': round(ordered[-1] * 1000, 3)}
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+def mysql_client_command(database=None):
+    command = ['mysql', '-h', DB_CONFIG['host'], '-P', str(DB_CONFIG['port']), '-u', DB_CONFIG['user'],
+               '--force']
+    if DB_CONFIG['password']:
+        command.append(f"-p{DB_CONFIG['password']}")
+    return command + ([database] if database else [])
+
+def run_sql_file(path, database):
+    """Pipe a (DELIMITER-using) SQL script through the mysql client, retargeted at database"""
+    sql = re.sub(r'\bpartner_report\b', database, Path(path).read_text(encoding='utf-8'))
+    result = subprocess.run(mysql_client_command(database), input=sql, text=True, capture_output=True)
+    return result.stderr.strip()
+
+def ensure_dataset(scale, seed, data_dir, workers):
+    """Generate (or reuse) the CSVs of one scale; returns (directory, seconds spent generating)"""
+    clients, trades, deposits, partners = SCALES[scale]
+    directory = Path(data_dir) / f"{scale}-seed{seed}"
+    marker = directory / '.complete'
+    if marker.exists():
+        return directory, 0.0
+    start = time.perf_counter()
+    generate_dataset(str(directory), clients, trades, deposits, partners, seed, workers)
+    marker.touch()
+    return directory, time.perf_counter() - start
+
+def reset_database(database, data_dir):
+    """Drop and rebuild the benchmark database from SETUP_SQL plus the generated partners"""
+    conn = connect(database=None)
+    cursor = conn.cursor()
+    cursor.execute(f"DROP DATABASE IF EXISTS {database}")
+    cursor.execute(f"CREATE DATABASE {database}")
+    cursor.close()
+    conn.close()
+    warnings = {}
+    for name in SETUP_SQL:
+        errors = run_sql_file(REPO / name, database)
+        if errors:
+            warnings[name] = errors.splitlines()[:5]
+    errors = run_sql_file(Path(data_dir) / 'partners.sql', database)
+    if errors:
+        warnings['partners.sql'] = errors.splitlines()[:5]
+    return warnings
+
+def count_rows(conn, table):
+    cursor = conn.cursor()
+    cursor.execute(f"SELECT COUNT(*) FROM {table}")
+    count = cursor.fetchone()[0]
+    cursor.close()
+    return count
+
+def run_import(name, script, csv_path, table, database, extra_args):
+    """Run one importer as a subprocess; rows/s from the table's row count"""
+    with tempfile.NamedTemporaryFile(suffix='.json', delete=False) as f:
+        result_file = f.name
+    command = [sys.executable, '-m', 'benchmarks.entry', database, result_file,
+               str(REPO / script), str(csv_path)] + extra_args
+    start = time.perf_counter()
+    process = subprocess.run(command, cwd=REPO, capture_output=True, text=True)
+    elapsed = time.perf_counter() - start
+    result = {'name': name, 'kind': 'import', 'seconds': round(elapsed, 3)}
+    try:
+        with open(result_file, encoding='utf-8') as f:
+            result.update(json.load(f))
+    except (OSError, ValueError):
+        result['exit_status'] = process.returncode
+    finally:
+        os.remove(result_file)
+    if process.returncode != 0:
+        result['error'] = (process.stderr or process.stdout).strip().splitlines()[-5:]
+
+    conn = connect(database=database)
+    rows = count_rows(conn, table)
+    conn.close()
+    result['rows'] = rows
+    result['rows_per_s'] = round(rows / elapsed, 1) if elapsed > 0 else None
+    return result
+
+def call_procedure(conn, name, args=()):
+    cursor = conn.cursor()
+    cursor.callproc(name, args)
+    for result in cursor.stored_results():
+        result.fetchall()
+    cursor.close()
+    conn.commit()
+
+def time_procedure(conn, name, repeat, args_list=None):
+    """Latencies of CALL name(args) for each args in args_list (repeat times)"""
+    samples = []
+    result = {'name': name, 'kind': 'procedure'}
+    try:
+        for _ in range(repeat):
+            for args in args_list or [()]:
+                start = time.perf_counter()
+                call_procedure(conn, name, args)
+                samples.append(time.perf_counter() - start)
+    except Error as e:
+        conn.rollback()
+        result['error'] = str(e)
+    if samples:
+        result['calls'] = len(samples)
+        result['seconds'] = round(sum(samples), 3)
+        result['latency_ms'] = percentiles(samples)
+    return result
+
+def time_query(conn, name, sql, partner_ids, repeat):
+    """Latencies of one cubes.php query over partner_ids, repeat times"""
+    samples = []
+    rows = 0
+    result = {'name': name, 'kind': 'query'}
+    cursor = conn.cursor()
+    try:
+        for _ in range(repeat):
+            for partner_id in partner_ids:
+                start = time.perf_counter()
+                cursor.execute(sql, (partner_id,))
+                rows += len(cursor.fetchall())
+                samples.append(time.perf_counter() - start)
+    except Error as e:
+        result['error'] = str(e)
+    cursor.close()
+    if samples:
+        result['calls'] = len(samples)
+        result['rows'] = rows
+        result['queries_per_s'] = round(len(samples) / sum(samples), 1) if sum(samples) > 0 else None
+        result['latency_ms'] = percentiles(samples)
+    return result
+
+def sample_partners(conn, count, seed):
+    """The largest partner plus a deterministic sample of the others"""
+    cursor = conn.cursor()
+    cursor.execute("""
+        SELECT partnerId FROM clients WHERE partnerId IS NOT NULL
+        GROUP BY partnerId ORDER BY COUNT(*) DESC, partnerId
+    """)
+    partner_ids = [row[0] for row in cursor.fetchall()]
+    cursor.close()
+    if len(partner_ids) <= count:
+        return partner_ids
+    return partner_ids[:1] + random.Random(seed).sample(partner_ids[1:], count - 1)
+
+def run_scale(scale, args):
+    print(f"\n=== Scale {scale} ===")
+    data_dir, generation = ensure_dataset(scale, args.seed, args.data_dir, args.workers)
+    print(f"✓ Data in {data_dir}" + (f" (generated in {generation:.1f}s)" if generation else " (cached)"))
+    warnings = reset_database(args.database, data_dir)
+    for name, lines in warnings.items():
+        print(f"  ⚠️  {name}: {lines[0]}")
+
+    results = []
+    for name, script, csv_name, table in IMPORTS:
+        extra = args.import_arg if name == 'import_trades1' else []
+        result = run_import(name, script, data_dir / csv_name, table, args.database, extra)
+        results.append(result)
+        print(f"  {name:32} {result['rows']:>12,} rows {result['seconds']:>9.2f}s "
+              f"{result['rows_per_s'] or 0:>12,.0f} rows/s  peak RSS {result.get('peak_rss_mb', 0):,.0f} MB"
+              + (f"  ✗ {result['error'][-1]}" if result.get('error') else ''))
+
+    conn = connect(database=args.database)
+    partner_ids = sample_partners(conn, args.partners, args.seed)
+    steps = [time_procedure(conn, name, args.repeat) for name in PROCEDURES]
+    steps.append(time_procedure(conn, 'refresh_partner_cubes', 1, [(p,) for p in partner_ids]))
+    steps += [time_query(conn, name, sql, partner_ids, args.repeat) for name, sql in CUBE_QUERIES.items()]
+    conn.close()
+    for result in steps:
+        if 'latency_ms' in result:
+            latency = result['latency_ms']
+            print(f"  {result['name']:32} {result['calls']:>6} calls  p50 {latency['p50']:>9.2f} ms  "
+                  f"p95 {latency['p95']:>9.2f} ms  p99 {latency['p99']:>9.2f} ms")
+        else:
+            print(f"  {result['name']:32} ✗ {result.get('error')}")
+    results += steps
+
+    clients, trades, deposits, partners = SCALES[scale]
+    return {
+        'scale': scale,
+        'commit': git_commit(),
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'seed': args.seed,
+        'dataset': {'clients': clients, 'trades': trades, 'deposits': deposits, 'partners': partners},
+        'host': {'platform': platform.platform(), 'python': platform.python_version(),
+                 'cpus': os.cpu_count()},
+        'setup_warnings': warnings,
+        'peak_rss_mb': round(max_rss_mb(resource.RUSAGE_SELF), 1),
+        'results': results,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark ingest, cube refresh and report queries')
+    parser.add_argument('--scale', action='append', choices=list(SCALES),
+                        help='Data scale, repeatable (default: 10k)')
+    parser.add_argument('--seed', type=int, default=42, help='Synthetic data seed (default: 42)')
+    parser.add_argument('--database', default=BENCH_DATABASE,
+                        help=f'Scratch database, dropped on every run (default: {BENCH_DATABASE})')
+    parser.add_argument('--data-dir', default=str(DATA_DIR), help=f'Generated data cache (default: {DATA_DIR})')
+    parser.add_argument('--output-dir', default=str(RESULTS_DIR), help=f'Result JSON directory (default: {RESULTS_DIR})')
+    parser.add_argument('--repeat', type=int, default=3, help='Repetitions per procedure/query (default: 3)')
+    parser.add_argument('--partners', type=int, default=20,
+                        help='Partners sampled for refresh_partner_cubes and the queries (default: 20)')
+    parser.add_argument('--workers', type=int, default=None, help='Data generator processes (default: CPU count)')
+    parser.add_argument('--import-arg', action='append', default=[],
+                        help='Extra argument for import_trades1.py, repeatable (e.g. --import-arg=--mode=rows)')
+    args = parser.parse_args()
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    for scale in args.scale or ['10k']:
+        report = run_scale(scale, args)
+        output = Path(args.output_dir) / f"{scale}-{report['commit']}.json"
+        with open(output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        print(f"✓ Results saved to {output}")
+
+if __name__ == "__main__":
+    main()
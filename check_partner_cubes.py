@@ -0,0 +1,337 @@
+#!/usr/bin/env python3
+"""
+Regression check for refresh_partner_cubes
+
+Seeds a scratch database with random partners, clients, trades, deposits and
+badges, then runs both the legacy procedure (refresh_partner_cubes_legacy.sql,
+one clients -> trades -> deposits join) and the current one
+(create_data_cubes.sql, per-client pre-aggregation) for every partner. It
+prints how long each took, and for every cube column how many partners
+differ from the values computed in Python from the seeded rows.
+
+    python3 check_partner_cubes.py --partners 20 --clients 200 --trades 30 --deposits 10
+
+The scratch database is dropped and recreated on every run. Exits with
+status 1 if the current procedure disagrees with the expected values.
+"""
+
+import argparse
+import random
+import re
+import sys
+import time
+from datetime import date, datetime
+from decimal import Decimal
+from pathlib import Path
+from db import connect
+from cube_maintenance import month_key, recent_months
+
+SCRATCH_DATABASE = 'partner_report_cube_check'
+HERE = Path(__file__).parent
+CUBES_SQL = HERE / 'create_data_cubes.sql'
+LEGACY_SQL = HERE / 'refresh_partner_cubes_legacy.sql'
+
+CUBE_TABLES = ['cube_partner_dashboard', 'cube_client_tiers', 'cube_client_demographics',
+               'cube_country_performance', 'cube_badge_progress']
+
+# Only the columns the procedures read, with the indexes of database_schema.sql
+BASE_TABLES = [
+    """CREATE TABLE partners (
+        partner_id VARCHAR(20) PRIMARY KEY,
+        name VARCHAR(255) NOT NULL,
+        tier VARCHAR(50)
+    ) ENGINE=InnoDB""",
+    """CREATE TABLE clients (
+        binary_user_id VARCHAR(50) PRIMARY KEY,
+        country VARCHAR(100),
+        joinDate DATE,
+        partnerId VARCHAR(20),
+        tier VARCHAR(50),
+        gender VARCHAR(20),
+        age INT,
+        commissionPlan VARCHAR(100),
+        lifetimeDeposits DECIMAL(15,2),
+        INDEX idx_partnerId (partnerId),
+        INDEX idx_country (country)
+    ) ENGINE=InnoDB""",
+    """CREATE TABLE trades (
+        id INT AUTO_INCREMENT PRIMARY KEY,
+        date DATE,
+        binary_user_id VARCHAR(50),
+        closed_pnl_usd DECIMAL(15,2),
+        INDEX idx_date (date),
+        INDEX idx_binary_user_id (binary_user_id)
+    ) ENGINE=InnoDB""",
+    """CREATE TABLE deposits (
+        id INT AUTO_INCREMENT PRIMARY KEY,
+        binary_user_id_1 VARCHAR(50),
+        transaction_time DATETIME,
+        amount_usd DECIMAL(15,2),
+        affiliate_id VARCHAR(50),
+        INDEX idx_binary_user_id (binary_user_id_1),
+        INDEX idx_affiliate_id (affiliate_id),
+        INDEX idx_transaction_time (transaction_time)
+    ) ENGINE=InnoDB""",
+    """CREATE TABLE partner_badges (
+        id INT AUTO_INCREMENT PRIMARY KEY,
+        partner_id VARCHAR(20) NOT NULL,
+        badge_name VARCHAR(50) NOT NULL,
+        UNIQUE KEY unique_partner_badge (partner_id, badge_name)
+    ) ENGINE=InnoDB""",
+]
+
+# Cube columns checked against the values computed in Python
+CHECKED_COLUMNS = {
+    'cube_partner_dashboard': ['total_clients', 'total_deposits', 'total_commissions', 'total_trades',
+                               'mtd_clients', 'mtd_deposits', 'mtd_commissions', 'mtd_trades']
+                              + [f"month_{n}_commissions" for n in range(1, 7)],
+    'cube_country_performance': ['client_count', 'total_deposits', 'total_commissions', 'total_trades'],
+    'cube_badge_progress': ['total_commissions', 'total_deposits', 'badges_earned'],
+}
+# Cube keys (besides the table's id)
+CUBE_KEYS = {
+    'cube_partner_dashboard': ['partner_id'],
+    'cube_client_tiers': ['partner_id', 'tier'],
+    'cube_client_demographics': ['partner_id', 'dimension', 'dimension_value'],
+    'cube_country_performance': ['partner_id', 'country'],
+    'cube_badge_progress': ['partner_id'],
+}
+
+def extract_cube_tables(sql):
+    """CREATE TABLE statements of the cubes refresh_partner_cubes writes"""
+    statements = []
+    for table in CUBE_TABLES:
+        match = re.search(rf"CREATE TABLE {table} \(.*?\) ENGINE=InnoDB;", sql, re.S)
+        statements.append(match.group(0)[:-1])
+    return statements
+
+def extract_procedure(sql, name):
+    """CREATE PROCEDURE ... END body of one procedure in a DELIMITER // script"""
+    match = re.search(rf"CREATE PROCEDURE {name}\(.*?\nEND //", sql, re.S)
+    if not match:
+        raise ValueError(f"Procedure {name} not found")
+    return match.group(0)[:-len('//')].rstrip()
+
+def month_day(today, months_back, rng):
+    """A random day in the month months_back before today (never after today)"""
+    year, month = today.year, today.month - months_back
+    while month < 1:
+        year, month = year - 1, month + 12
+    last_day = today.day if months_back == 0 else 28
+    return date(year, month, rng.randint(1, last_day))
+
+def seed(cursor, args, today):
+    """Insert random rows; returns them for the expected values"""
+    rng = random.Random(args.seed)
+    partners = [(f"P-{n:04d}", f"Partner {n}", rng.choice(['Bronze', 'Silver', 'Gold', 'Platinum']))
+                for n in range(1, args.partners + 1)]
+    clients, trades, deposits, badges = [], [], [], []
+    for n in range(args.partners * args.clients):
+        partner_id = partners[n % len(partners)][0]
+        user_id = f"CR{100000 + n}"
+        clients.append((user_id, rng.choice(['Germany', 'India', 'Spain', 'Brazil']),
+                        month_day(today, rng.randint(0, 24), rng), partner_id,
+                        rng.choice(['Bronze', 'Silver', 'Gold']), rng.choice(['Male', 'Female']),
+                        rng.randint(18, 70), rng.choice(['RevShare 30%', 'CPA']),
+                        # Round figures repeat across clients, which SUM(DISTINCT) drops
+                        Decimal(rng.randint(1, 50) * 100)))
+        for _ in range(rng.randint(0, 2 * args.trades)):
+            trades.append((month_day(today, rng.randint(0, 7), rng), user_id,
+                           Decimal(rng.randint(-5000, 20000)) / 100))
+        for _ in range(rng.randint(0, 2 * args.deposits)):
+            # Mostly through the client's partner, sometimes another one
+            affiliate = partner_id if rng.random() < 0.9 else rng.choice(partners)[0]
+            day = month_day(today, rng.randint(0, 3), rng)
+            deposits.append((user_id, datetime(day.year, day.month, day.day, rng.randint(0, 23)),
+                             Decimal(rng.randint(1000, 500000)) / 100, affiliate))
+    for partner_id, _, _ in partners:
+        for badge in rng.sample(['com1', 'com10', 'com100', 'dep1', 'dep10', 'dep100'], rng.randint(0, 4)):
+            badges.append((partner_id, badge))
+
+    cursor.executemany("INSERT INTO partners (partner_id, name, tier) VALUES (%s, %s, %s)", partners)
+    cursor.executemany("""
+        INSERT INTO clients (binary_user_id, country, joinDate, partnerId, tier, gender, age,
+                             commissionPlan, lifetimeDeposits)
+        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
+    """, clients)
+    cursor.executemany("INSERT INTO trades (date, binary_user_id, closed_pnl_usd) VALUES (%s, %s, %s)", trades)
+    cursor.executemany("""
+        INSERT INTO deposits (binary_user_id_1, transaction_time, amount_usd, affiliate_id)
+        VALUES (%s, %s, %s, %s)
+    """, deposits)
+    cursor.executemany("INSERT INTO partner_badges (partner_id, badge_name) VALUES (%s, %s)", badges)
+    return partners, clients, trades, deposits, badges
+
+def expected_values(seeded, today):
+    """The checked cube columns computed directly from the seeded rows"""
+    partners, clients, trades, deposits, badges = seeded
+    months = recent_months(today)
+    zero = Decimal('0')
+
+    client_of = {c[0]: c for c in clients}
+    dashboard = {p[0]: dict.fromkeys(CHECKED_COLUMNS['cube_partner_dashboard'], 0) for p in partners}
+    country = {}
+    badge = {p[0]: {'total_commissions': zero, 'total_deposits': zero, 'badges_earned': 0} for p in partners}
+
+    for user_id, client_country, join_date, partner_id, *_, lifetime in clients:
+        row = dashboard[partner_id]
+        row['total_clients'] += 1
+        row['total_deposits'] += lifetime
+        row['mtd_clients'] += month_key(join_date) == months[0]
+        key = (partner_id, client_country)
+        country.setdefault(key, {'client_count': 0, 'total_deposits': zero,
+                                 'total_commissions': zero, 'total_trades': 0})
+        country[key]['client_count'] += 1
+
+    for trade_date, user_id, pnl in trades:
+        client = client_of[user_id]
+        partner_id = client[3]
+        row = dashboard[partner_id]
+        row['total_commissions'] += pnl
+        row['total_trades'] += 1
+        if month_key(trade_date) == months[0]:
+            row['mtd_commissions'] += pnl
+            row['mtd_trades'] += 1
+        for n, year_month in enumerate(months, 1):
+            if month_key(trade_date) == year_month:
+                row[f"month_{n}_commissions"] += pnl
+        country[(partner_id, client[1])]['total_commissions'] += pnl
+        country[(partner_id, client[1])]['total_trades'] += 1
+        badge[partner_id]['total_commissions'] += pnl
+
+    for user_id, transaction_time, amount, affiliate in deposits:
+        client = client_of[user_id]
+        if affiliate != client[3]:
+            continue
+        if month_key(transaction_time) == months[0]:
+            dashboard[affiliate]['mtd_deposits'] += amount
+        country[(affiliate, client[1])]['total_deposits'] += amount
+        badge[affiliate]['total_deposits'] += amount
+
+    for partner_id, _ in badges:
+        badge[partner_id]['badges_earned'] += 1
+
+    return {
+        'cube_partner_dashboard': {(p,): row for p, row in dashboard.items()},
+        'cube_country_performance': country,
+        'cube_badge_progress': {(p,): row for p, row in badge.items()},
+    }
+
+def snapshot(cursor):
+    """Every cube row, keyed by table and cube key"""
+    cubes = {}
+    for table in CUBE_TABLES:
+        cursor.execute(f"SELECT * FROM {table}")
+        columns = [d[0] for d in cursor.description]
+        rows = {}
+        for values in cursor.fetchall():
+            row = dict(zip(columns, values))
+            row.pop('id', None)
+            row.pop('last_updated', None)
+            rows[tuple(row[k] for k in CUBE_KEYS[table])] = row
+        cubes[table] = rows
+    return cubes
+
+def run_procedure(connection, name, partner_ids):
+    """Empty the cubes, run one procedure for every partner; returns (seconds, snapshot)"""
+    cursor = connection.cursor()
+    for table in CUBE_TABLES:
+        cursor.execute(f"TRUNCATE TABLE {table}")
+    start = time.perf_counter()
+    for partner_id in partner_ids:
+        cursor.callproc(name, (partner_id,))
+    connection.commit()
+    elapsed = time.perf_counter() - start
+    cubes = snapshot(cursor)
+    cursor.close()
+    return elapsed, cubes
+
+def count_mismatches(actual, expected, table, column):
+    """Partners/keys where a cube column differs from the expected value"""
+    mismatches = 0
+    for key, row in expected[table].items():
+        value = actual[table].get(key, {}).get(column)
+        if value is None or Decimal(value) != Decimal(row[column]):
+            mismatches += 1
+    return mismatches
+
+def join_rows(seeded):
+    """Intermediate rows of the legacy client x trade x deposit join vs one row per client"""
+    _, clients, trades, deposits, _ = seeded
+    partner_of = {c[0]: c[3] for c in clients}
+    trade_count, deposit_count = {}, {}
+    for _, user_id, _ in trades:
+        trade_count[user_id] = trade_count.get(user_id, 0) + 1
+    for user_id, _, _, affiliate in deposits:
+        if affiliate == partner_of[user_id]:
+            deposit_count[user_id] = deposit_count.get(user_id, 0) + 1
+    legacy = sum(max(1, trade_count.get(c[0], 0)) * max(1, deposit_count.get(c[0], 0)) for c in clients)
+    return legacy, len(clients)
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare refresh_partner_cubes with the legacy fan-out version')
+    parser.add_argument('--partners', type=int, default=10, help='Partners to seed (default: 10)')
+    parser.add_argument('--clients', type=int, default=100, help='Clients per partner (default: 100)')
+    parser.add_argument('--trades', type=int, default=20, help='Average trades per client (default: 20)')
+    parser.add_argument('--deposits', type=int, default=5, help='Average deposits per client (default: 5)')
+    parser.add_argument('--seed', type=int, default=42, help='Random seed (default: 42)')
+    parser.add_argument('--database', default=SCRATCH_DATABASE,
+                        help=f'Scratch database, dropped and recreated (default: {SCRATCH_DATABASE})')
+    args = parser.parse_args()
+
+    today = date.today()
+    cubes_sql = CUBES_SQL.read_text(encoding='utf-8')
+    legacy_sql = LEGACY_SQL.read_text(encoding='utf-8')
+
+    conn = connect(database=None)
+    cursor = conn.cursor()
+    cursor.execute(f"DROP DATABASE IF EXISTS {args.database}")
+    cursor.execute(f"CREATE DATABASE {args.database}")
+    cursor.execute(f"USE {args.database}")
+    for statement in BASE_TABLES + extract_cube_tables(cubes_sql):
+        cursor.execute(statement)
+    cursor.execute(extract_procedure(legacy_sql, 'refresh_partner_cubes_legacy'))
+    cursor.execute(extract_procedure(cubes_sql, 'refresh_partner_cubes'))
+
+    print(f"Seeding {args.database}...")
+    seeded = seed(cursor, args, today)
+    conn.commit()
+    cursor.close()
+    partner_ids = [p[0] for p in seeded[0]]
+    print(f"  {len(seeded[0])} partners, {len(seeded[1])} clients, {len(seeded[2])} trades, "
+          f"{len(seeded[3])} deposits")
+    legacy_rows, new_rows = join_rows(seeded)
+    print(f"  Join rows: legacy {legacy_rows:,} vs pre-aggregated {new_rows:,} (one per client)")
+
+    legacy_time, legacy = run_procedure(conn, 'refresh_partner_cubes_legacy', partner_ids)
+    new_time, new = run_procedure(conn, 'refresh_partner_cubes', partner_ids)
+    conn.close()
+
+    print(f"\nTiming ({len(partner_ids)} partners):")
+    print(f"  legacy:  {legacy_time:.3f}s")
+    print(f"  current: {new_time:.3f}s"
+          + (f" ({legacy_time / new_time:.1f}x faster)" if new_time > 0 else ""))
+
+    expected = expected_values(seeded, today)
+    failures = 0
+    print(f"\n{'cube.column':<52} {'legacy wrong':>12} {'current wrong':>13}")
+    for table, columns in CHECKED_COLUMNS.items():
+        for column in columns:
+            legacy_wrong = count_mismatches(legacy, expected, table, column)
+            new_wrong = count_mismatches(new, expected, table, column)
+            failures += new_wrong
+            print(f"{table + '.' + column:<52} {legacy_wrong:>12} {new_wrong:>13}")
+
+    # Tiers and demographics never joined trades/deposits: both versions must agree exactly
+    for table in ('cube_client_tiers', 'cube_client_demographics'):
+        same = legacy[table] == new[table]
+        failures += not same
+        print(f"{table:<52} {'identical' if same else 'DIFFERENT':>26}")
+
+    if failures:
+        print(f"\n✗ Current procedure differs from the expected values in {failures} places")
+        sys.exit(1)
+    print("\n✓ Current procedure matches the expected values")
+
+if __name__ == "__main__":
+    main()
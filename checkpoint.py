@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+"""
+Checkpoints for resumable CSV imports
+
+Every importer records its position in the import_checkpoints table after
+each committed batch: the source file fingerprint, the byte offset just past
+the last row read and the number of rows read and written. The checkpoint
+row is written in the same transaction as the batch it describes, so after a
+crash the checkpoint and the imported rows always agree and
+`--resume` continues from the last committed batch without duplicates.
+
+Compressed CSVs (gzip/bz2/zstd, see compressed_io.py) are read the same
+way; offsets then count decompressed bytes, and resuming decompresses the
+file again up to the saved offset.
+"""
+
+import csv
+import hashlib
+import os
+
+from compressed_io import open_input
+
+CHECKPOINT_TABLE = 'import_checkpoints'
+FINGERPRINT_BYTES = 1024 * 1024
+
+CREATE_CHECKPOINT_TABLE = f"""
+    CREATE TABLE IF NOT EXISTS {CHECKPOINT_TABLE} (
+        target_table VARCHAR(64) NOT NULL,
+        source_file VARCHAR(512) NOT NULL,
+        fingerprint CHAR(64) NOT NULL,
+        byte_offset BIGINT NOT NULL DEFAULT 0,
+        rows_read BIGINT NOT NULL DEFAULT 0,
+        rows_written BIGINT NOT NULL DEFAULT 0,
+        completed BOOLEAN NOT NULL DEFAULT FALSE,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+        PRIMARY KEY (target_table, source_file)
+    )
+"""
+
+class CheckpointError(Exception):
+    """The saved checkpoint cannot be used to resume this import"""
+
+def add_resume_argument(parser):
+    """Add the --resume option to an argparse parser"""
+    parser.add_argument('--resume', action='store_true',
+                        help=f'Continue from the last committed batch recorded in {CHECKPOINT_TABLE}')
+    return parser
+
+def file_fingerprint(path):
+    """SHA-256 of the file size and its first and last megabyte"""
+    size = os.path.getsize(path)
+    digest = hashlib.sha256(str(size).encode())
+    with open(path, 'rb') as f:
+        digest.update(f.read(FINGERPRINT_BYTES))
+        if size > FINGERPRINT_BYTES:
+            f.seek(max(FINGERPRINT_BYTES, size - FINGERPRINT_BYTES))
+            digest.update(f.read(FINGERPRINT_BYTES))
+    return digest.hexdigest()
+
+def ensure_checkpoint_table(connection):
+    """Create import_checkpoints if it does not exist yet"""
+    cursor = connection.cursor()
+    cursor.execute(CREATE_CHECKPOINT_TABLE)
+    cursor.close()
+
+def saved_parts(connection, table, source_file):
+    """Byte-range chunks ("start-end") with a saved checkpoint for source_file"""
+    prefix = os.path.abspath(source_file) + '#'
+    cursor = connection.cursor()
+    cursor.execute(f"""
+        SELECT source_file FROM {CHECKPOINT_TABLE}
+        WHERE target_table = %s AND source_file LIKE %s
+    """, (table, prefix.replace('%', '\\%').replace('_', '\\_') + '%'))
+    parts = [row[0][len(prefix):] for row in cursor.fetchall()]
+    cursor.close()
+    return parts
+
+def clear_checkpoints(connection, table, source_file):
+    """Forget every checkpoint of source_file (whole file and chunks)"""
+    path = os.path.abspath(source_file)
+    cursor = connection.cursor()
+    cursor.execute(f"""
+        DELETE FROM {CHECKPOINT_TABLE}
+        WHERE target_table = %s AND (source_file = %s OR source_file LIKE %s)
+    """, (table, path, path.replace('%', '\\%').replace('_', '\\_') + '#%'))
+    connection.commit()
+    cursor.close()
+
+class OffsetLines:
+    """Decoded lines of a file with the byte offset of everything handed out so far"""
+
+    def __init__(self, f, start, end=None):
+        self.f = f
+        self.offset = start
+        self.end = end
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self.end is not None and self.offset >= self.end:
+            raise StopIteration
+        line = self.f.readline()
+        if not line:
+            raise StopIteration
+        self.offset += len(line)
+        return line.decode('utf-8')
+
+def read_csv_fieldnames(csv_file):
+    """Header row and the byte offset of the first data row"""
+    with open_input(csv_file) as f:
+        header = f.readline()
+    return next(csv.reader([header.decode('utf-8')]), []), len(header)
+
+def iter_csv_rows(csv_file, start=None, end=None, fieldnames=None):
+    """Yield (row dict, byte offset after the row) like csv.DictReader
+
+    start/end are byte offsets of line boundaries (default: the first data
+    row and the end of the file). The csv module only pulls the lines one
+    record needs, so the offset after each row is exact even for quoted
+    fields that span lines.
+    """
+    header_names, data_start = read_csv_fieldnames(csv_file)
+    if fieldnames is None:
+        fieldnames = header_names
+    if start is None:
+        start = data_start
+
+    with open_input(csv_file) as f:
+        f.seek(start)
+        lines = OffsetLines(f, start, end)
+        for row in csv.DictReader(lines, fieldnames=fieldnames):
+            yield row, lines.offset
+
+class ImportCheckpoint:
+    """Position of one import of source_file into table (part names a byte-range chunk)"""
+
+    def __init__(self, connection, table, source_file, part=None, fingerprint=None):
+        self.table = table
+        self.path = source_file
+        self.part = part
+        self.source_file = os.path.abspath(source_file) + (f'#{part}' if part else '')
+        self.fingerprint = fingerprint or file_fingerprint(source_file)
+        self.byte_offset = None
+        self.rows_read = 0
+        self.rows_written = 0
+        self.completed = False
+        ensure_checkpoint_table(connection)
+        self.connection = connection
+
+    def load(self):
+        """Saved checkpoint as a dict, or None"""
+        cursor = self.connection.cursor(dictionary=True)
+        cursor.execute(f"""
+            SELECT fingerprint, byte_offset, rows_read, rows_written, completed
+            FROM {CHECKPOINT_TABLE}
+            WHERE target_table = %s AND source_file = %s
+        """, (self.table, self.source_file))
+        saved = cursor.fetchone()
+        cursor.close()
+        return saved
+
+    def start(self, resume=False):
+        """Pick up the saved position; returns the byte offset to start at (None = beginning)
+
+        Without resume any saved checkpoint is discarded (a whole-file
+        checkpoint also discards the chunk checkpoints of a parallel run).
+        """
+        if not resume:
+            if self.part is None:
+                clear_checkpoints(self.connection, self.table, self.path)
+            else:
+                cursor = self.connection.cursor()
+                cursor.execute(f"DELETE FROM {CHECKPOINT_TABLE} WHERE target_table = %s AND source_file = %s",
+                               (self.table, self.source_file))
+                self.connection.commit()
+                cursor.close()
+            return None
+        saved = self.load()
+        if saved is None and self.part is None and saved_parts(self.connection, self.table, self.path):
+            raise CheckpointError(
+                f"{self.source_file} was being imported in parallel chunks; "
+                f"resume it with --workers")
+        if saved is None:
+            print(f"  No checkpoint for {self.source_file}, starting from the beginning")
+            return None
+        if saved['fingerprint'] != self.fingerprint:
+            raise CheckpointError(
+                f"{self.source_file} has changed since the checkpoint was written; "
+                f"import it again without --resume")
+
+        self.byte_offset = saved['byte_offset']
+        self.rows_read = saved['rows_read']
+        self.rows_written = saved['rows_written']
+        self.completed = bool(saved['completed'])
+        if self.completed:
+            print(f"  {self.source_file} was already imported completely ({self.rows_written:,} rows)")
+        elif self.rows_read:
+            print(f"  Resuming {self.source_file} at byte {self.byte_offset:,} "
+                  f"({self.rows_read:,} rows read, {self.rows_written:,} written)")
+        return self.byte_offset
+
+    def save(self, cursor, byte_offset, rows_read, rows_written, completed=False):
+        """Record the position; call inside the transaction that commits the rows"""
+        cursor.execute(f"""
+            INSERT INTO {CHECKPOINT_TABLE}
+                (target_table, source_file, fingerprint, byte_offset, rows_read, rows_written, completed)
+            VALUES (%s, %s, %s, %s, %s, %s, %s)
+            ON DUPLICATE KEY UPDATE
+                fingerprint = VALUES(fingerprint), byte_offset = VALUES(byte_offset),
+                rows_read = VALUES(rows_read), rows_written = VALUES(rows_written),
+                completed = VALUES(completed)
+        """, (self.table, self.source_file, self.fingerprint, byte_offset,
+              rows_read, rows_written, completed))
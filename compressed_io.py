@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+Transparent gzip / bz2 / zstd file access for the importers and generators
+
+open_input() returns a binary stream of the decompressed contents of a CSV
+export, whatever it was compressed with (detected from the magic bytes, so
+exports.csv.gz and a gzip misnamed .csv both work), decompressing on the fly
+without a temporary file. Byte offsets (checkpoints, --resume) are positions
+in the decompressed stream; seeking to one re-reads the file up to it.
+
+CompressedOutput writes text through a compressor picked by name, counting
+the uncompressed bytes so throughput can be reported per codec.
+
+zstd needs the optional `zstandard` package (pip install zstandard).
+"""
+
+import bz2
+import gzip
+import io
+import os
+import time
+
+CODECS = ['gzip', 'bz2', 'zstd']
+EXTENSIONS = {'gzip': '.gz', 'bz2': '.bz2', 'zstd': '.zst'}
+MAGIC = [(b'\x1f\x8b', 'gzip'), (b'BZh', 'bz2'), (b'\x28\xb5\x2f\xfd', 'zstd')]
+READ_BUFFER = 1024 * 1024
+
+def add_compression_argument(parser):
+    """Add --compress to an argparse parser"""
+    parser.add_argument('--compress', choices=CODECS, default=None,
+                        help='Write the output compressed (adds .gz/.bz2/.zst; zstd needs the zstandard package)')
+    return parser
+
+def _zstandard():
+    try:
+        import zstandard
+    except ImportError:
+        raise RuntimeError("zstd files need the zstandard package: pip install zstandard") from None
+    return zstandard
+
+def detect_codec(path):
+    """Codec of a file from its magic bytes, or None for an uncompressed file"""
+    with open(path, 'rb') as f:
+        head = f.read(4)
+    for magic, codec in MAGIC:
+        if head.startswith(magic):
+            return codec
+    return None
+
+def is_compressed(path):
+    return detect_codec(path) is not None
+
+def open_input(path):
+    """Binary stream of the (decompressed) contents of path"""
+    codec = detect_codec(path)
+    if codec == 'gzip':
+        return gzip.open(path, 'rb')
+    if codec == 'bz2':
+        return bz2.open(path, 'rb')
+    if codec == 'zstd':
+        raw = open(path, 'rb')
+        reader = _zstandard().ZstdDecompressor().stream_reader(raw, closefd=True)
+        return io.BufferedReader(reader, buffer_size=READ_BUFFER)
+    return open(path, 'rb')
+
+def open_input_text(path, encoding='utf-8', newline=''):
+    """Text stream of the (decompressed) contents of path"""
+    return io.TextIOWrapper(open_input(path), encoding=encoding, newline=newline)
+
+def output_path(path, codec):
+    """path with the codec's extension added (unless already there)"""
+    extension = EXTENSIONS.get(codec, '')
+    return path if not extension or path.endswith(extension) else path + extension
+
+class _CountingSink(io.RawIOBase):
+    """Counts the uncompressed bytes on their way to the compressor"""
+
+    def __init__(self, target):
+        self.target = target
+        self.bytes = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.bytes += len(data)
+        self.target.write(data)
+        return len(data)
+
+    def close(self):
+        if not self.closed:
+            self.target.close()
+        super().close()
+
+class CompressedOutput:
+    """Text file written through an optional compressor, with throughput stats"""
+
+    def __init__(self, path, codec=None, encoding='utf-8', newline=None, buffering=READ_BUFFER):
+        self.path = output_path(path, codec)
+        self.codec = codec
+        if codec == 'gzip':
+            target = gzip.open(self.path, 'wb', compresslevel=6)
+        elif codec == 'bz2':
+            target = bz2.open(self.path, 'wb')
+        elif codec == 'zstd':
+            target = _zstandard().ZstdCompressor().stream_writer(open(self.path, 'wb'), closefd=True)
+        else:
+            target = open(self.path, 'wb')
+        self.sink = _CountingSink(target)
+        self.file = io.TextIOWrapper(io.BufferedWriter(self.sink, buffer_size=buffering),
+                                     encoding=encoding, newline=newline)
+        self.started = time.perf_counter()
+        self.elapsed = None
+
+    def write(self, text):
+        return self.file.write(text)
+
+    def close(self):
+        if self.elapsed is None:
+            self.file.close()
+            self.elapsed = time.perf_counter() - self.started
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def report(self):
+        """One line: size before/after compression and uncompressed MB/s"""
+        raw = self.sink.bytes
+        written = os.path.getsize(self.path)
+        elapsed = self.elapsed or (time.perf_counter() - self.started)
+        ratio = f", {raw / written:.1f}x" if self.codec and written else ''
+        return (f"{self.path}: {raw / 1e6:,.1f} MB -> {written / 1e6:,.1f} MB ({self.codec or 'none'}{ratio}) "
+                f"in {elapsed:.2f}s, {raw / 1e6 / elapsed if elapsed > 0 else 0:,.1f} MB/s")
@@ -0,0 +1,321 @@
+-- Append-Only Change Log for Incremental Cube Maintenance
+-- Every insert/update/delete on clients, trades and deposits appends one row
+-- per affected version of the row (sign +1 for the new values, -1 for the
+-- old ones). cube_maintenance.py reads the log and applies the differences
+-- to cube_partner_monthly, cube_partner_dashboard, cube_daily_commissions_plan
+-- and cube_monthly_deposits instead of rebuilding them.
+--
+-- Trade and deposit rows carry the client's partner and commission plan as
+-- they were when the row was logged. When a client is inserted, deleted or
+-- moved to another partner/plan, its trades and deposits are logged again
+-- (-1 with the old client values, +1 with the new ones), so every log row
+-- can be applied on its own.
+--
+-- The log triggers are a single INSERT (plus a primary key lookup of the
+-- client) and are NOT suspended by @defer_cube_refresh, so bulk imports
+-- feed the log as well.
+
+USE partner_report;
+
+CREATE TABLE IF NOT EXISTS cube_change_log (
+    id BIGINT AUTO_INCREMENT PRIMARY KEY,
+    source ENUM('client', 'trade', 'deposit') NOT NULL,
+    sign TINYINT NOT NULL,                -- +1 new values, -1 old values
+    binary_user_id VARCHAR(50),
+    partner_id VARCHAR(20),               -- clients.partnerId / trades.affiliated_partner_id / deposits.affiliate_id
+    has_client BOOLEAN NOT NULL DEFAULT TRUE,  -- FALSE if the client did not exist
+    client_partner_id VARCHAR(20),        -- partner of the client when the trade/deposit was logged
+    commission_plan VARCHAR(100),         -- client's commission plan (clients and trades)
+    event_time DATETIME,                  -- joinDate / trade date / transaction_time
+    category VARCHAR(100),                -- deposit category
+    amount DECIMAL(15,2),                 -- lifetimeDeposits / expected_revenue_usd / amount_usd
+    quantity INT,                         -- number_of_trades
+    pnl DECIMAL(15,2),                    -- closed_pnl_usd (trades)
+    logged_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    INDEX idx_binary_user_id (binary_user_id)
+) ENGINE=InnoDB;
+
+-- Additive per-partner, per-month totals behind cube_partner_dashboard,
+-- with the measures of refresh_partner_cubes (create_data_cubes.sql):
+-- clients and their lifetimeDeposits by join month, deposits through the
+-- client's own partner, and closed_pnl_usd / trade rows of the partner's
+-- clients (year_month_str is '' for rows without a date)
+CREATE TABLE IF NOT EXISTS cube_partner_monthly (
+    partner_id VARCHAR(20) NOT NULL,
+    year_month_str VARCHAR(7) NOT NULL,
+    new_clients INT DEFAULT 0,
+    client_deposits DECIMAL(15,2) DEFAULT 0,
+    total_deposits DECIMAL(15,2) DEFAULT 0,
+    total_commissions DECIMAL(15,2) DEFAULT 0,
+    total_trades INT DEFAULT 0,
+    last_updated TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    PRIMARY KEY (partner_id, year_month_str)
+) ENGINE=InnoDB;
+
+-- Engine state (e.g. the month the dashboard's mtd/month_N columns refer to)
+CREATE TABLE IF NOT EXISTS cube_maintenance_state (
+    name VARCHAR(50) PRIMARY KEY,
+    value VARCHAR(255),
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+) ENGINE=InnoDB;
+
+-- ============================================================================
+-- CLIENTS
+-- ============================================================================
+
+-- Re-log a client's existing trades and/or deposits with the old client
+-- values (-1) and the new ones (+1)
+DROP PROCEDURE IF EXISTS log_client_reattribution;
+DELIMITER //
+CREATE PROCEDURE log_client_reattribution(
+    IN p_user_id VARCHAR(50),
+    IN p_old_has_client BOOLEAN, IN p_old_partner_id VARCHAR(20), IN p_old_plan VARCHAR(100),
+    IN p_new_has_client BOOLEAN, IN p_new_partner_id VARCHAR(20), IN p_new_plan VARCHAR(100),
+    IN p_include_trades BOOLEAN, IN p_include_deposits BOOLEAN)
+BEGIN
+    IF p_include_trades THEN
+        INSERT INTO cube_change_log
+            (source, sign, binary_user_id, partner_id, has_client, client_partner_id, commission_plan,
+             event_time, amount, quantity, pnl)
+        SELECT 'trade', v.sign, t.binary_user_id, t.affiliated_partner_id,
+               IF(v.sign < 0, p_old_has_client, p_new_has_client),
+               IF(v.sign < 0, p_old_partner_id, p_new_partner_id),
+               IF(v.sign < 0, p_old_plan, p_new_plan),
+               t.date, t.expected_revenue_usd, t.number_of_trades, t.closed_pnl_usd
+        FROM trades t
+        CROSS JOIN (SELECT -1 AS sign UNION ALL SELECT 1) v
+        WHERE t.binary_user_id = p_user_id;
+    END IF;
+
+    IF p_include_deposits THEN
+        INSERT INTO cube_change_log
+            (source, sign, binary_user_id, partner_id, has_client, client_partner_id,
+             event_time, category, amount)
+        SELECT 'deposit', v.sign, d.binary_user_id_1, d.affiliate_id,
+               IF(v.sign < 0, p_old_has_client, p_new_has_client),
+               IF(v.sign < 0, p_old_partner_id, p_new_partner_id),
+               d.transaction_time, d.category, d.amount_usd
+        FROM deposits d
+        CROSS JOIN (SELECT -1 AS sign UNION ALL SELECT 1) v
+        WHERE d.binary_user_id_1 = p_user_id;
+    END IF;
+END //
+DELIMITER ;
+
+DROP TRIGGER IF EXISTS log_client_insert;
+DELIMITER //
+CREATE TRIGGER log_client_insert
+AFTER INSERT ON clients
+FOR EACH ROW
+BEGIN
+    INSERT INTO cube_change_log (source, sign, binary_user_id, partner_id, commission_plan, event_time, amount)
+    VALUES ('client', 1, NEW.binary_user_id, NEW.partnerId, NEW.commissionPlan, NEW.joinDate,
+            NEW.lifetimeDeposits);
+
+    -- Deposits (and trades loaded with foreign key checks off) can arrive
+    -- before their client: move them from "no client" to the new client
+    CALL log_client_reattribution(NEW.binary_user_id, FALSE, NULL, NULL,
+                                  TRUE, NEW.partnerId, NEW.commissionPlan, TRUE, TRUE);
+END //
+DELIMITER ;
+
+DROP TRIGGER IF EXISTS log_client_update;
+DELIMITER //
+CREATE TRIGGER log_client_update
+AFTER UPDATE ON clients
+FOR EACH ROW
+BEGIN
+    -- Only the columns the cubes use
+    IF NOT (OLD.partnerId <=> NEW.partnerId)
+       OR NOT (OLD.commissionPlan <=> NEW.commissionPlan)
+       OR NOT (OLD.joinDate <=> NEW.joinDate)
+       OR NOT (OLD.lifetimeDeposits <=> NEW.lifetimeDeposits) THEN
+        INSERT INTO cube_change_log (source, sign, binary_user_id, partner_id, commission_plan, event_time, amount)
+        VALUES ('client', -1, OLD.binary_user_id, OLD.partnerId, OLD.commissionPlan, OLD.joinDate,
+                OLD.lifetimeDeposits),
+               ('client', 1, NEW.binary_user_id, NEW.partnerId, NEW.commissionPlan, NEW.joinDate,
+                NEW.lifetimeDeposits);
+    END IF;
+
+    -- The client's trades and deposits follow it to the new partner/plan
+    IF NOT (OLD.partnerId <=> NEW.partnerId) OR NOT (OLD.commissionPlan <=> NEW.commissionPlan) THEN
+        CALL log_client_reattribution(NEW.binary_user_id, TRUE, OLD.partnerId, OLD.commissionPlan,
+                                      TRUE, NEW.partnerId, NEW.commissionPlan,
+                                      TRUE, NOT (OLD.partnerId <=> NEW.partnerId));
+    END IF;
+END //
+DELIMITER ;
+
+-- Deleting a client cascades to its trades without firing their triggers,
+-- so log the trades while they still exist
+DROP TRIGGER IF EXISTS log_client_delete_trades;
+DELIMITER //
+CREATE TRIGGER log_client_delete_trades
+BEFORE DELETE ON clients
+FOR EACH ROW
+BEGIN
+    INSERT INTO cube_change_log
+        (source, sign, binary_user_id, partner_id, client_partner_id, commission_plan, event_time, amount,
+         quantity, pnl)
+    SELECT 'trade', -1, t.binary_user_id, t.affiliated_partner_id, OLD.partnerId, OLD.commissionPlan,
+           t.date, t.expected_revenue_usd, t.number_of_trades, t.closed_pnl_usd
+    FROM trades t
+    WHERE t.binary_user_id = OLD.binary_user_id;
+END //
+DELIMITER ;
+
+DROP TRIGGER IF EXISTS log_client_delete;
+DELIMITER //
+CREATE TRIGGER log_client_delete
+AFTER DELETE ON clients
+FOR EACH ROW
+BEGIN
+    INSERT INTO cube_change_log (source, sign, binary_user_id, partner_id, commission_plan, event_time, amount)
+    VALUES ('client', -1, OLD.binary_user_id, OLD.partnerId, OLD.commissionPlan, OLD.joinDate,
+            OLD.lifetimeDeposits);
+
+    -- Deposits have no foreign key and stay behind without a client
+    -- (trades were removed by the cascade and logged above)
+    CALL log_client_reattribution(OLD.binary_user_id, TRUE, OLD.partnerId, OLD.commissionPlan,
+                                  FALSE, NULL, NULL, FALSE, TRUE);
+END //
+DELIMITER ;
+
+-- ============================================================================
+-- TRADES
+-- ============================================================================
+
+DROP TRIGGER IF EXISTS log_trade_insert;
+DELIMITER //
+CREATE TRIGGER log_trade_insert
+AFTER INSERT ON trades
+FOR EACH ROW
+BEGIN
+    INSERT INTO cube_change_log
+        (source, sign, binary_user_id, partner_id, has_client, client_partner_id, commission_plan,
+         event_time, amount, quantity, pnl)
+    SELECT 'trade', 1, NEW.binary_user_id, NEW.affiliated_partner_id, c.binary_user_id IS NOT NULL,
+           c.partnerId, c.commissionPlan, NEW.date, NEW.expected_revenue_usd, NEW.number_of_trades,
+           NEW.closed_pnl_usd
+    FROM (SELECT 1) one
+    LEFT JOIN clients c ON c.binary_user_id = NEW.binary_user_id;
+END //
+DELIMITER ;
+
+DROP TRIGGER IF EXISTS log_trade_update;
+DELIMITER //
+CREATE TRIGGER log_trade_update
+AFTER UPDATE ON trades
+FOR EACH ROW
+BEGIN
+    IF NOT (OLD.binary_user_id <=> NEW.binary_user_id)
+       OR NOT (OLD.affiliated_partner_id <=> NEW.affiliated_partner_id)
+       OR NOT (OLD.date <=> NEW.date)
+       OR NOT (OLD.expected_revenue_usd <=> NEW.expected_revenue_usd)
+       OR NOT (OLD.number_of_trades <=> NEW.number_of_trades)
+       OR NOT (OLD.closed_pnl_usd <=> NEW.closed_pnl_usd) THEN
+        INSERT INTO cube_change_log
+            (source, sign, binary_user_id, partner_id, has_client, client_partner_id, commission_plan,
+             event_time, amount, quantity, pnl)
+        SELECT 'trade', -1, OLD.binary_user_id, OLD.affiliated_partner_id, c.binary_user_id IS NOT NULL,
+               c.partnerId, c.commissionPlan, OLD.date, OLD.expected_revenue_usd, OLD.number_of_trades,
+               OLD.closed_pnl_usd
+        FROM (SELECT 1) one
+        LEFT JOIN clients c ON c.binary_user_id = OLD.binary_user_id;
+
+        INSERT INTO cube_change_log
+            (source, sign, binary_user_id, partner_id, has_client, client_partner_id, commission_plan,
+             event_time, amount, quantity, pnl)
+        SELECT 'trade', 1, NEW.binary_user_id, NEW.affiliated_partner_id, c.binary_user_id IS NOT NULL,
+               c.partnerId, c.commissionPlan, NEW.date, NEW.expected_revenue_usd, NEW.number_of_trades,
+               NEW.closed_pnl_usd
+        FROM (SELECT 1) one
+        LEFT JOIN clients c ON c.binary_user_id = NEW.binary_user_id;
+    END IF;
+END //
+DELIMITER ;
+
+DROP TRIGGER IF EXISTS log_trade_delete;
+DELIMITER //
+CREATE TRIGGER log_trade_delete
+AFTER DELETE ON trades
+FOR EACH ROW
+BEGIN
+    INSERT INTO cube_change_log
+        (source, sign, binary_user_id, partner_id, has_client, client_partner_id, commission_plan,
+         event_time, amount, quantity, pnl)
+    SELECT 'trade', -1, OLD.binary_user_id, OLD.affiliated_partner_id, c.binary_user_id IS NOT NULL,
+           c.partnerId, c.commissionPlan, OLD.date, OLD.expected_revenue_usd, OLD.number_of_trades,
+           OLD.closed_pnl_usd
+    FROM (SELECT 1) one
+    LEFT JOIN clients c ON c.binary_user_id = OLD.binary_user_id;
+END //
+DELIMITER ;
+
+-- ============================================================================
+-- DEPOSITS
+-- ============================================================================
+
+DROP TRIGGER IF EXISTS log_deposit_insert;
+DELIMITER //
+CREATE TRIGGER log_deposit_insert
+AFTER INSERT ON deposits
+FOR EACH ROW
+BEGIN
+    INSERT INTO cube_change_log
+        (source, sign, binary_user_id, partner_id, has_client, client_partner_id,
+         event_time, category, amount)
+    SELECT 'deposit', 1, NEW.binary_user_id_1, NEW.affiliate_id, c.binary_user_id IS NOT NULL,
+           c.partnerId, NEW.transaction_time, NEW.category, NEW.amount_usd
+    FROM (SELECT 1) one
+    LEFT JOIN clients c ON c.binary_user_id = NEW.binary_user_id_1;
+END //
+DELIMITER ;
+
+DROP TRIGGER IF EXISTS log_deposit_update;
+DELIMITER //
+CREATE TRIGGER log_deposit_update
+AFTER UPDATE ON deposits
+FOR EACH ROW
+BEGIN
+    IF NOT (OLD.binary_user_id_1 <=> NEW.binary_user_id_1)
+       OR NOT (OLD.affiliate_id <=> NEW.affiliate_id)
+       OR NOT (OLD.transaction_time <=> NEW.transaction_time)
+       OR NOT (OLD.category <=> NEW.category)
+       OR NOT (OLD.amount_usd <=> NEW.amount_usd) THEN
+        INSERT INTO cube_change_log
+            (source, sign, binary_user_id, partner_id, has_client, client_partner_id,
+             event_time, category, amount)
+        SELECT 'deposit', -1, OLD.binary_user_id_1, OLD.affiliate_id, c.binary_user_id IS NOT NULL,
+               c.partnerId, OLD.transaction_time, OLD.category, OLD.amount_usd
+        FROM (SELECT 1) one
+        LEFT JOIN clients c ON c.binary_user_id = OLD.binary_user_id_1;
+
+        INSERT INTO cube_change_log
+            (source, sign, binary_user_id, partner_id, has_client, client_partner_id,
+             event_time, category, amount)
+        SELECT 'deposit', 1, NEW.binary_user_id_1, NEW.affiliate_id, c.binary_user_id IS NOT NULL,
+               c.partnerId, NEW.transaction_time, NEW.category, NEW.amount_usd
+        FROM (SELECT 1) one
+        LEFT JOIN clients c ON c.binary_user_id = NEW.binary_user_id_1;
+    END IF;
+END //
+DELIMITER ;
+
+DROP TRIGGER IF EXISTS log_deposit_delete;
+DELIMITER //
+CREATE TRIGGER log_deposit_delete
+AFTER DELETE ON deposits
+FOR EACH ROW
+BEGIN
+    INSERT INTO cube_change_log
+        (source, sign, binary_user_id, partner_id, has_client, client_partner_id,
+         event_time, category, amount)
+    SELECT 'deposit', -1, OLD.binary_user_id_1, OLD.affiliate_id, c.binary_user_id IS NOT NULL,
+           c.partnerId, OLD.transaction_time, OLD.category, OLD.amount_usd
+    FROM (SELECT 1) one
+    LEFT JOIN clients c ON c.binary_user_id = OLD.binary_user_id_1;
+END //
+DELIMITER ;
+
+SELECT 'Cube change log and triggers created. Run: python3 cube_maintenance.py --rebuild' as Status;
@@ -1,5 +1,9 @@
 -- Triggers to Auto-Update Data Cubes on Data Changes
 -- Only refreshes cubes when relevant data is modified
+--
+-- The clients/trades/deposits triggers do nothing while the session variable
+-- @defer_cube_refresh is set: the Python importers set it for bulk loads,
+-- queue the affected partners and refresh each of them once at the end
 
 USE partner_report;
 
@@ -13,7 +17,10 @@ CREATE TRIGGER after_client_insert
 AFTER INSERT ON clients
 FOR EACH ROW
 BEGIN
-    CALL refresh_partner_cubes(NEW.partnerId);
+    -- Skipped while an importer bulk session is open (see cube_refresh.py)
+    IF @defer_cube_refresh IS NULL THEN
+        CALL refresh_partner_cubes(NEW.partnerId);
+    END IF;
 END //
 DELIMITER ;
 
@@ -23,12 +30,15 @@ CREATE TRIGGER after_client_update
 AFTER UPDATE ON clients
 FOR EACH ROW
 BEGIN
-    -- Refresh old partner's cubes if partner changed
-    IF OLD.partnerId != NEW.partnerId THEN
-        CALL refresh_partner_cubes(OLD.partnerId);
+    -- Skipped while an importer bulk session is open (see cube_refresh.py)
+    IF @defer_cube_refresh IS NULL THEN
+        -- Refresh old partner's cubes if partner changed
+        IF OLD.partnerId != NEW.partnerId THEN
+            CALL refresh_partner_cubes(OLD.partnerId);
+        END IF;
+        -- Refresh new partner's cubes
+        CALL refresh_partner_cubes(NEW.partnerId);
     END IF;
-    -- Refresh new partner's cubes
-    CALL refresh_partner_cubes(NEW.partnerId);
 END //
 DELIMITER ;
 
@@ -38,7 +48,10 @@ CREATE TRIGGER after_client_delete
 AFTER DELETE ON clients
 FOR EACH ROW
 BEGIN
-    CALL refresh_partner_cubes(OLD.partnerId);
+    -- Skipped while an importer bulk session is open (see cube_refresh.py)
+    IF @defer_cube_refresh IS NULL THEN
+        CALL refresh_partner_cubes(OLD.partnerId);
+    END IF;
 END //
 DELIMITER ;
 
@@ -54,15 +67,18 @@ FOR EACH ROW
 BEGIN
     DECLARE v_partner_id VARCHAR(20);
     
-    -- Get partner_id from client
-    SELECT partnerId INTO v_partner_id
-    FROM clients
-    WHERE binary_user_id = NEW.binary_user_id
-    LIMIT 1;
+    -- Skipped while an importer bulk session is open (see cube_refresh.py)
+    IF @defer_cube_refresh IS NULL THEN
+        -- Get partner_id from client
+        SELECT partnerId INTO v_partner_id
+        FROM clients
+        WHERE binary_user_id = NEW.binary_user_id
+        LIMIT 1;
     
-    IF v_partner_id IS NOT NULL THEN
-        CALL refresh_partner_cubes(v_partner_id);
-        CALL refresh_commissions_cubes(v_partner_id);
+        IF v_partner_id IS NOT NULL THEN
+            CALL refresh_partner_cubes(v_partner_id);
+            CALL refresh_commissions_cubes(v_partner_id);
+        END IF;
     END IF;
 END //
 DELIMITER ;
@@ -75,15 +91,18 @@ FOR EACH ROW
 BEGIN
     DECLARE v_partner_id VARCHAR(20);
     
-    -- Get partner_id from client
-    SELECT partnerId INTO v_partner_id
-    FROM clients
-    WHERE binary_user_id = NEW.binary_user_id
-    LIMIT 1;
+    -- Skipped while an importer bulk session is open (see cube_refresh.py)
+    IF @defer_cube_refresh IS NULL THEN
+        -- Get partner_id from client
+        SELECT partnerId INTO v_partner_id
+        FROM clients
+        WHERE binary_user_id = NEW.binary_user_id
+        LIMIT 1;
     
-    IF v_partner_id IS NOT NULL THEN
-        CALL refresh_partner_cubes(v_partner_id);
-        CALL refresh_commissions_cubes(v_partner_id);
+        IF v_partner_id IS NOT NULL THEN
+            CALL refresh_partner_cubes(v_partner_id);
+            CALL refresh_commissions_cubes(v_partner_id);
+        END IF;
     END IF;
 END //
 DELIMITER ;
@@ -96,15 +115,18 @@ FOR EACH ROW
 BEGIN
     DECLARE v_partner_id VARCHAR(20);
     
-    -- Get partner_id from client
-    SELECT partnerId INTO v_partner_id
-    FROM clients
-    WHERE binary_user_id = OLD.binary_user_id
-    LIMIT 1;
+    -- Skipped while an importer bulk session is open (see cube_refresh.py)
+    IF @defer_cube_refresh IS NULL THEN
+        -- Get partner_id from client
+        SELECT partnerId INTO v_partner_id
+        FROM clients
+        WHERE binary_user_id = OLD.binary_user_id
+        LIMIT 1;
     
-    IF v_partner_id IS NOT NULL THEN
-        CALL refresh_partner_cubes(v_partner_id);
-        CALL refresh_commissions_cubes(v_partner_id);
+        IF v_partner_id IS NOT NULL THEN
+            CALL refresh_partner_cubes(v_partner_id);
+            CALL refresh_commissions_cubes(v_partner_id);
+        END IF;
     END IF;
 END //
 DELIMITER ;
@@ -119,8 +141,11 @@ CREATE TRIGGER after_deposit_insert
 AFTER INSERT ON deposits
 FOR EACH ROW
 BEGIN
-    IF NEW.affiliate_id IS NOT NULL THEN
-        CALL refresh_partner_cubes(NEW.affiliate_id);
+    -- Skipped while an importer bulk session is open (see cube_refresh.py)
+    IF @defer_cube_refresh IS NULL THEN
+        IF NEW.affiliate_id IS NOT NULL THEN
+            CALL refresh_partner_cubes(NEW.affiliate_id);
+        END IF;
     END IF;
 END //
 DELIMITER ;
@@ -131,15 +156,18 @@ CREATE TRIGGER after_deposit_update
 AFTER UPDATE ON deposits
 FOR EACH ROW
 BEGIN
-    -- Refresh old affiliate if changed
-    IF OLD.affiliate_id != NEW.affiliate_id THEN
-        IF OLD.affiliate_id IS NOT NULL THEN
-            CALL refresh_partner_cubes(OLD.affiliate_id);
+    -- Skipped while an importer bulk session is open (see cube_refresh.py)
+    IF @defer_cube_refresh IS NULL THEN
+        -- Refresh old affiliate if changed
+        IF OLD.affiliate_id != NEW.affiliate_id THEN
+            IF OLD.affiliate_id IS NOT NULL THEN
+                CALL refresh_partner_cubes(OLD.affiliate_id);
+            END IF;
+        END IF;
+        -- Refresh new affiliate
+        IF NEW.affiliate_id IS NOT NULL THEN
+            CALL refresh_partner_cubes(NEW.affiliate_id);
         END IF;
-    END IF;
-    -- Refresh new affiliate
-    IF NEW.affiliate_id IS NOT NULL THEN
-        CALL refresh_partner_cubes(NEW.affiliate_id);
     END IF;
 END //
 DELIMITER ;
@@ -150,8 +178,11 @@ CREATE TRIGGER after_deposit_delete
 AFTER DELETE ON deposits
 FOR EACH ROW
 BEGIN
-    IF OLD.affiliate_id IS NOT NULL THEN
-        CALL refresh_partner_cubes(OLD.affiliate_id);
+    -- Skipped while an importer bulk session is open (see cube_refresh.py)
+    IF @defer_cube_refresh IS NULL THEN
+        IF OLD.affiliate_id IS NOT NULL THEN
+            CALL refresh_partner_cubes(OLD.affiliate_id);
+        END IF;
     END IF;
 END //
 DELIMITER ;
@@ -140,6 +140,9 @@ CREATE TABLE cube_badge_progress (
 -- ============================================================================
 -- Stored Procedure: Refresh All Cubes for a Partner
 -- ============================================================================
+-- Trades and deposits are aggregated per client in derived tables before
+-- they are joined to clients, so each client contributes one row and no
+-- measure is multiplied by the other table's row count
 DROP PROCEDURE IF EXISTS refresh_partner_cubes;
 DELIMITER //
 CREATE PROCEDURE refresh_partner_cubes(IN p_partner_id VARCHAR(20))
@@ -165,28 +168,71 @@ BEGIN
         p.name,
         p.tier,
         -- Lifetime metrics
-        COUNT(DISTINCT c.binary_user_id),
-        COALESCE(SUM(DISTINCT c.lifetimeDeposits), 0),
-        COALESCE(SUM(t.closed_pnl_usd), 0),
-        COUNT(t.id),
+        COALESCE(a.total_clients, 0),
+        COALESCE(a.total_deposits, 0),
+        COALESCE(a.total_commissions, 0),
+        COALESCE(a.total_trades, 0),
         -- MTD metrics
-        COUNT(DISTINCT CASE WHEN c.joinDate >= month_start THEN c.binary_user_id END),
-        COALESCE(SUM(CASE WHEN d.transaction_time >= month_start THEN d.amount_usd ELSE 0 END), 0),
-        COALESCE(SUM(CASE WHEN DATE_FORMAT(t.date, '%Y-%m') = current_month THEN t.closed_pnl_usd ELSE 0 END), 0),
-        COUNT(CASE WHEN DATE_FORMAT(t.date, '%Y-%m') = current_month THEN t.id END),
+        COALESCE(a.mtd_clients, 0),
+        COALESCE(a.mtd_deposits, 0),
+        COALESCE(a.mtd_commissions, 0),
+        COALESCE(a.mtd_trades, 0),
         -- Last 6 months commissions
-        COALESCE(SUM(CASE WHEN DATE_FORMAT(t.date, '%Y-%m') = DATE_FORMAT(DATE_SUB(CURDATE(), INTERVAL 0 MONTH), '%Y-%m') THEN t.closed_pnl_usd ELSE 0 END), 0),
-        COALESCE(SUM(CASE WHEN DATE_FORMAT(t.date, '%Y-%m') = DATE_FORMAT(DATE_SUB(CURDATE(), INTERVAL 1 MONTH), '%Y-%m') THEN t.closed_pnl_usd ELSE 0 END), 0),
-        COALESCE(SUM(CASE WHEN DATE_FORMAT(t.date, '%Y-%m') = DATE_FORMAT(DATE_SUB(CURDATE(), INTERVAL 2 MONTH), '%Y-%m') THEN t.closed_pnl_usd ELSE 0 END), 0),
-        COALESCE(SUM(CASE WHEN DATE_FORMAT(t.date, '%Y-%m') = DATE_FORMAT(DATE_SUB(CURDATE(), INTERVAL 3 MONTH), '%Y-%m') THEN t.closed_pnl_usd ELSE 0 END), 0),
-        COALESCE(SUM(CASE WHEN DATE_FORMAT(t.date, '%Y-%m') = DATE_FORMAT(DATE_SUB(CURDATE(), INTERVAL 4 MONTH), '%Y-%m') THEN t.closed_pnl_usd ELSE 0 END), 0),
-        COALESCE(SUM(CASE WHEN DATE_FORMAT(t.date, '%Y-%m') = DATE_FORMAT(DATE_SUB(CURDATE(), INTERVAL 5 MONTH), '%Y-%m') THEN t.closed_pnl_usd ELSE 0 END), 0)
+        COALESCE(a.month_1_commissions, 0),
+        COALESCE(a.month_2_commissions, 0),
+        COALESCE(a.month_3_commissions, 0),
+        COALESCE(a.month_4_commissions, 0),
+        COALESCE(a.month_5_commissions, 0),
+        COALESCE(a.month_6_commissions, 0)
     FROM partners p
-    LEFT JOIN clients c ON p.partner_id = c.partnerId
-    LEFT JOIN trades t ON c.binary_user_id = t.binary_user_id
-    LEFT JOIN deposits d ON c.binary_user_id = d.binary_user_id_1 AND d.affiliate_id = p.partner_id
+    LEFT JOIN (
+        SELECT 
+            c.partnerId,
+            COUNT(*) as total_clients,
+            SUM(c.lifetimeDeposits) as total_deposits,
+            SUM(t.total_commissions) as total_commissions,
+            SUM(t.total_trades) as total_trades,
+            SUM(c.joinDate >= month_start) as mtd_clients,
+            SUM(d.mtd_deposits) as mtd_deposits,
+            SUM(t.mtd_commissions) as mtd_commissions,
+            SUM(t.mtd_trades) as mtd_trades,
+            SUM(t.month_1_commissions) as month_1_commissions,
+            SUM(t.month_2_commissions) as month_2_commissions,
+            SUM(t.month_3_commissions) as month_3_commissions,
+            SUM(t.month_4_commissions) as month_4_commissions,
+            SUM(t.month_5_commissions) as month_5_commissions,
+            SUM(t.month_6_commissions) as month_6_commissions
+        FROM clients c
+        -- One row per client: its trades
+        LEFT JOIN (
+            SELECT 
+                t.binary_user_id,
+                SUM(t.closed_pnl_usd) as total_commissions,
+                COUNT(*) as total_trades,
+                SUM(CASE WHEN DATE_FORMAT(t.date, '%Y-%m') = current_month THEN t.closed_pnl_usd ELSE 0 END) as mtd_commissions,
+                COUNT(CASE WHEN DATE_FORMAT(t.date, '%Y-%m') = current_month THEN 1 END) as mtd_trades,
+                SUM(CASE WHEN DATE_FORMAT(t.date, '%Y-%m') = DATE_FORMAT(DATE_SUB(CURDATE(), INTERVAL 0 MONTH), '%Y-%m') THEN t.closed_pnl_usd ELSE 0 END) as month_1_commissions,
+                SUM(CASE WHEN DATE_FORMAT(t.date, '%Y-%m') = DATE_FORMAT(DATE_SUB(CURDATE(), INTERVAL 1 MONTH), '%Y-%m') THEN t.closed_pnl_usd ELSE 0 END) as month_2_commissions,
+                SUM(CASE WHEN DATE_FORMAT(t.date, '%Y-%m') = DATE_FORMAT(DATE_SUB(CURDATE(), INTERVAL 2 MONTH), '%Y-%m') THEN t.closed_pnl_usd ELSE 0 END) as month_3_commissions,
+                SUM(CASE WHEN DATE_FORMAT(t.date, '%Y-%m') = DATE_FORMAT(DATE_SUB(CURDATE(), INTERVAL 3 MONTH), '%Y-%m') THEN t.closed_pnl_usd ELSE 0 END) as month_4_commissions,
+                SUM(CASE WHEN DATE_FORMAT(t.date, '%Y-%m') = DATE_FORMAT(DATE_SUB(CURDATE(), INTERVAL 4 MONTH), '%Y-%m') THEN t.closed_pnl_usd ELSE 0 END) as month_5_commissions,
+                SUM(CASE WHEN DATE_FORMAT(t.date, '%Y-%m') = DATE_FORMAT(DATE_SUB(CURDATE(), INTERVAL 5 MONTH), '%Y-%m') THEN t.closed_pnl_usd ELSE 0 END) as month_6_commissions
+            FROM trades t
+            JOIN clients tc ON tc.binary_user_id = t.binary_user_id
+            WHERE tc.partnerId = p_partner_id
+            GROUP BY t.binary_user_id
+        ) t ON t.binary_user_id = c.binary_user_id
+        -- One row per client: its deposits through this partner this month
+        LEFT JOIN (
+            SELECT binary_user_id_1, SUM(amount_usd) as mtd_deposits
+            FROM deposits
+            WHERE affiliate_id = p_partner_id AND transaction_time >= month_start
+            GROUP BY binary_user_id_1
+        ) d ON d.binary_user_id_1 = c.binary_user_id
+        WHERE c.partnerId = p_partner_id
+        GROUP BY c.partnerId
+    ) a ON a.partnerId = p.partner_id
     WHERE p.partner_id = p_partner_id
-    GROUP BY p.partner_id, p.name, p.tier
     ON DUPLICATE KEY UPDATE
         partner_name = VALUES(partner_name),
         partner_tier = VALUES(partner_tier),
@@ -268,13 +314,24 @@ BEGIN
     SELECT 
         c.partnerId,
         c.country,
-        COUNT(DISTINCT c.binary_user_id),
-        COALESCE(SUM(d.amount_usd), 0),
-        COALESCE(SUM(t.closed_pnl_usd), 0),
-        COUNT(t.id)
+        COUNT(*),
+        COALESCE(SUM(d.total_deposits), 0),
+        COALESCE(SUM(t.total_commissions), 0),
+        COALESCE(SUM(t.total_trades), 0)
     FROM clients c
-    LEFT JOIN trades t ON c.binary_user_id = t.binary_user_id
-    LEFT JOIN deposits d ON c.binary_user_id = d.binary_user_id_1 AND d.affiliate_id = c.partnerId
+    LEFT JOIN (
+        SELECT t.binary_user_id, SUM(t.closed_pnl_usd) as total_commissions, COUNT(*) as total_trades
+        FROM trades t
+        JOIN clients tc ON tc.binary_user_id = t.binary_user_id
+        WHERE tc.partnerId = p_partner_id
+        GROUP BY t.binary_user_id
+    ) t ON t.binary_user_id = c.binary_user_id
+    LEFT JOIN (
+        SELECT binary_user_id_1, SUM(amount_usd) as total_deposits
+        FROM deposits
+        WHERE affiliate_id = p_partner_id
+        GROUP BY binary_user_id_1
+    ) d ON d.binary_user_id_1 = c.binary_user_id
     WHERE c.partnerId = p_partner_id
     GROUP BY c.partnerId, c.country;
     
@@ -286,16 +343,19 @@ BEGIN
     )
     SELECT 
         p.partner_id,
-        COALESCE(SUM(t.closed_pnl_usd), 0),
-        COALESCE(SUM(d.amount_usd), 0),
-        COUNT(DISTINCT pb.badge_name)
+        (SELECT COALESCE(SUM(t.closed_pnl_usd), 0)
+         FROM trades t
+         JOIN clients c ON c.binary_user_id = t.binary_user_id
+         WHERE c.partnerId = p.partner_id),
+        (SELECT COALESCE(SUM(d.amount_usd), 0)
+         FROM deposits d
+         JOIN clients c ON c.binary_user_id = d.binary_user_id_1
+         WHERE d.affiliate_id = p.partner_id AND c.partnerId = p.partner_id),
+        (SELECT COUNT(DISTINCT pb.badge_name)
+         FROM partner_badges pb
+         WHERE pb.partner_id = p.partner_id)
     FROM partners p
-    LEFT JOIN clients c ON p.partner_id = c.partnerId
-    LEFT JOIN trades t ON c.binary_user_id = t.binary_user_id
-    LEFT JOIN deposits d ON c.binary_user_id = d.binary_user_id_1 AND d.affiliate_id = p.partner_id
-    LEFT JOIN partner_badges pb ON p.partner_id = pb.partner_id
     WHERE p.partner_id = p_partner_id
-    GROUP BY p.partner_id
     ON DUPLICATE KEY UPDATE
         total_commissions = VALUES(total_commissions),
         total_deposits = VALUES(total_deposits),
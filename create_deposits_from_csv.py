@@ -7,10 +7,12 @@ Drops existing deposits table and creates new one based on CSV structure
 import csv
 import sys
 
+from compressed_io import open_input_text
+
 csv_file = '/Users/michalisphytides/Downloads/deposits1.csv'
 
 # Read CSV to get headers and sample data
-with open(csv_file, 'r', encoding='utf-8') as f:
+with open_input_text(csv_file) as f:
     reader = csv.reader(f)
     headers = next(reader)
     
@@ -2,55 +2,24 @@
 """
 Population Pyramid Generator for Partner Report
 Creates a population pyramid visualization from clients table
+
+Unchanged partners are served from the render cache (pyramid_cache.py)
+unless --no-cache is given.
 """
 
-import mysql.connector
+from db import Error, shared_connection
 import matplotlib.pyplot as plt
 import seaborn as sns
 import pandas as pd
 import numpy as np
 from collections import defaultdict
+from pyramid_data import (FETCH_MODES, client_total, compare_fetch_modes, create_age_bins,
+                          fetch_client_counts, pyramid_counts)
+from pyramid_cache import PyramidCache, add_cache_arguments, fetch_version
 
-# Database configuration
-DB_CONFIG = {
-    'host': 'localhost',
-    'user': 'root',
-    'password': '',
-    'database': 'partner_report'
-}
-
-def get_client_data(partner_id=None):
-    """Fetch client age and gender data from database"""
-    conn = mysql.connector.connect(**DB_CONFIG)
-    cursor = conn.cursor(dictionary=True)
-    
-    if partner_id:
-        query = """
-            SELECT age, gender 
-            FROM clients 
-            WHERE partnerId = %s AND age IS NOT NULL AND gender IS NOT NULL
-        """
-        cursor.execute(query, (partner_id,))
-    else:
-        query = """
-            SELECT age, gender 
-            FROM clients 
-            WHERE age IS NOT NULL AND gender IS NOT NULL
-        """
-        cursor.execute(query)
-    
-    data = cursor.fetchall()
-    cursor.close()
-    conn.close()
-    
-    return pd.DataFrame(data)
-
-def create_age_bins(df):
-    """Create age group bins"""
-    bins = [0, 18, 25, 35, 45, 55, 65, 100]
-    labels = ['Under 18', '18-25', '25-35', '35-45', '45-55', '55-65', '65+']
-    df['age_group'] = pd.cut(df['age'], bins=bins, labels=labels, right=False)
-    return df
+def get_client_data(partner_id=None, mode='aggregate'):
+    """Fetch client age/gender counts (aggregate) or rows (rows) from database"""
+    return fetch_client_counts(shared_connection(), partner_id, mode)
 
 def create_population_pyramid(df, partner_id=None, output_file='population_pyramid.png'):
     """Create population pyramid visualization"""
@@ -60,24 +29,8 @@ def create_population_pyramid(df, partner_id=None, output_file='population_pyram
     plt.rcParams['figure.figsize'] = (12, 8)
     plt.rcParams['font.size'] = 11
     
-    # Normalize gender values to title case
-    df['gender'] = df['gender'].str.title()
-    
-    # Create age bins
-    df = create_age_bins(df)
-    
-    # Group by age_group and gender
-    grouped = df.groupby(['age_group', 'gender'], observed=True).size().unstack(fill_value=0)
-    
-    # Ensure we have both male and female columns
-    if 'Male' not in grouped.columns:
-        grouped['Male'] = 0
-    if 'Female' not in grouped.columns:
-        grouped['Female'] = 0
-    
-    # Sort by age group index
-    age_order = ['Under 18', '18-25', '25-35', '35-45', '45-55', '55-65', '65+']
-    grouped = grouped.reindex([ag for ag in age_order if ag in grouped.index])
+    # Male/Female counts per age group
+    grouped = pyramid_counts(df)
     
     # Prepare data for plotting
     age_groups = grouped.index.tolist()
@@ -181,26 +134,48 @@ def create_population_pyramid(df, partner_id=None, output_file='population_pyram
 
 def main():
     """Main execution"""
-    import sys
-    
-    # Get partner ID from command line if provided
-    partner_id = sys.argv[1] if len(sys.argv) > 1 else None
-    output_file = sys.argv[2] if len(sys.argv) > 2 else 'population_pyramid.png'
+    import argparse
+    
+    parser = argparse.ArgumentParser(description='Create a client population pyramid')
+    parser.add_argument('partner_id', nargs='?', default=None, help='Partner ID (default: all partners)')
+    parser.add_argument('output_file', nargs='?', default='population_pyramid.png', help='Output image')
+    parser.add_argument('--fetch', choices=FETCH_MODES, default='aggregate',
+                        help='aggregate = age groups counted by MySQL, rows = every client binned with pandas')
+    parser.add_argument('--compare', action='store_true',
+                        help='Fetch with both modes, check they agree and exit')
+    add_cache_arguments(parser)
+    args = parser.parse_args()
+    partner_id, output_file = args.partner_id, args.output_file
+    cache = PyramidCache.from_args('create', args)
+    
+    if args.compare:
+        compare_fetch_modes(shared_connection(), partner_id)
+        return
     
     print(f"Fetching client data{f' for partner {partner_id}' if partner_id else ' for all partners'}...")
     
     try:
-        # Fetch data
-        df = get_client_data(partner_id)
+        stats = version = None
+        if cache is not None:
+            version = fetch_version(shared_connection(), partner_id)
+            stats = cache.get(partner_id, version, output_file)
         
-        if df.empty:
-            print("⚠️  No client data found with age and gender information")
-            return
-        
-        print(f"✓ Found {len(df)} clients with age and gender data")
-        
-        # Create pyramid
-        stats = create_population_pyramid(df, partner_id, output_file)
+        if stats is not None:
+            print(f"✓ Clients unchanged since the last render, reused cached pyramid for {output_file}")
+        else:
+            # Fetch data
+            df = get_client_data(partner_id, args.fetch)
+            
+            if df.empty:
+                print("⚠️  No client data found with age and gender information")
+                return
+            
+            print(f"✓ Found {client_total(df)} clients with age and gender data")
+            
+            # Create pyramid
+            stats = create_population_pyramid(df, partner_id, output_file)
+            if cache is not None:
+                cache.put(partner_id, version, output_file, stats)
         
         # Print summary
         print("\n" + "="*50)
@@ -217,7 +192,7 @@ def main():
             print("No client data available")
         print("="*50)
         
-    except mysql.connector.Error as e:
+    except Error as e:
         print(f"❌ Database error: {e}")
         return
     except Exception as e:
@@ -225,6 +200,10 @@ def main():
         import traceback
         traceback.print_exc()
         return
+    finally:
+        if cache is not None:
+            cache.save()
+            cache.report()
 
 if __name__ == "__main__":
     main()
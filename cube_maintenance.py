@@ -0,0 +1,448 @@
+#!/usr/bin/env python3
+"""
+Incremental cube maintenance driven by cube_change_log
+
+The triggers in create_cube_change_log.sql append a -1 row (old values) and
+a +1 row (new values) to cube_change_log for every change to clients, trades
+and deposits. This script reads the log in id order and applies the signed
+differences to the cubes, so a refresh costs time proportional to the new
+rows instead of the whole history:
+
+- cube_partner_monthly: clients, deposits, commissions and trades per
+  partner and month (additive, kept only for this engine)
+- cube_partner_dashboard: recomputed for the touched partners from
+  cube_partner_monthly, with the same measures as refresh_partner_cubes
+  (create_data_cubes.sql): the partner's clients and their lifetimeDeposits,
+  closed_pnl_usd and trade rows of those clients, and this month's deposits
+  made through the client's own partner; when the month changes every
+  partner is recomputed so the mtd/month_N columns move with it
+- cube_daily_commissions_plan: additive
+- cube_monthly_deposits: the sums and counts are additive; averages,
+  min/max and the depositor counts are recomputed for the touched
+  partner/months only
+
+Each batch of log rows is applied and deleted in one transaction, so an
+interrupted run never applies a row twice. Only the ids read are deleted:
+log rows of an import that commits later with lower ids are applied by the
+next run.
+
+    python3 cube_maintenance.py              # apply pending changes
+    python3 cube_maintenance.py --interval 60  # keep applying every minute
+    python3 cube_maintenance.py --rebuild    # full rebuild, then clear the log
+
+first_time_depositors can drift for months that are not touched (a back-dated
+first deposit moves a user's first month); --rebuild corrects it, as it does
+after partners are deleted (ON DELETE SET NULL on clients fires no trigger).
+Run --rebuild while no imports are running.
+"""
+
+import argparse
+import calendar
+import time
+from datetime import date, datetime
+from decimal import Decimal
+from db import connect
+from batch_writer import build_insert_sql
+
+LOG_TABLE = 'cube_change_log'
+MONTHLY_TABLE = 'cube_partner_monthly'
+STATE_TABLE = 'cube_maintenance_state'
+DASHBOARD_TABLE = 'cube_partner_dashboard'
+DAILY_PLAN_TABLE = 'cube_daily_commissions_plan'
+MONTHLY_DEPOSITS_TABLE = 'cube_monthly_deposits'
+
+DASHBOARD_MONTHS = 6
+DEFAULT_BATCH_SIZE = 10000
+UPSERT_CHUNK = 1000
+ZERO = Decimal('0')
+
+LOG_COLUMNS = ['id', 'source', 'sign', 'binary_user_id', 'partner_id', 'has_client',
+               'client_partner_id', 'commission_plan', 'event_time', 'category', 'amount', 'quantity', 'pnl']
+
+def month_key(value):
+    """'YYYY-MM' of a date/datetime, '' when missing"""
+    return value.strftime('%Y-%m') if value else ''
+
+def month_bounds(year_month):
+    """First day of the month and of the next month for 'YYYY-MM'"""
+    year, month = map(int, year_month.split('-'))
+    start = date(year, month, 1)
+    end = date(year + 1, 1, 1) if month == 12 else date(year, month + 1, 1)
+    return start, end
+
+def recent_months(today, count=DASHBOARD_MONTHS):
+    """['YYYY-MM' of this month, last month, ...]"""
+    months = []
+    year, month = today.year, today.month
+    for _ in range(count):
+        months.append(f"{year:04d}-{month:02d}")
+        year, month = (year - 1, 12) if month == 1 else (year, month - 1)
+    return months
+
+def placeholders(values):
+    return ', '.join(['%s'] * len(values))
+
+def add_up(totals, key, *values):
+    """Element-wise add values to totals[key]"""
+    current = totals.get(key)
+    totals[key] = list(values) if current is None else [a + b for a, b in zip(current, values)]
+
+def upsert_additive(cursor, table, key_columns, value_columns, rows, extra_columns=()):
+    """INSERT rows, adding value_columns onto existing rows with the same key"""
+    columns = list(key_columns) + list(extra_columns) + list(value_columns)
+    on_duplicate = ', '.join(f"{col} = {col} + VALUES({col})" for col in value_columns)
+    for start in range(0, len(rows), UPSERT_CHUNK):
+        chunk = rows[start:start + UPSERT_CHUNK]
+        cursor.execute(build_insert_sql(table, columns, len(chunk), on_duplicate),
+                       [value for row in chunk for value in row])
+
+class CubeDeltas:
+    """Signed differences of one batch of log rows, grouped by cube key"""
+
+    def __init__(self):
+        self.monthly = {}           # (partner, 'YYYY-MM') -> [clients, client deposits, deposits, commissions, trades]
+        self.daily_plan = {}        # (partner, date, plan) -> [commissions, trades]
+        self.monthly_deposits = {}  # (partner, 'YYYY-MM') -> [deposits, count, withdrawals, count]
+        self.retracted_plan = set()
+        self.retracted_deposits = set()
+        self.deposit_users = set()
+
+    def add(self, row):
+        (_, source, sign, user_id, partner_id, has_client, client_partner_id,
+         commission_plan, event_time, category, amount, quantity, pnl) = row
+        amount = (amount or ZERO) * sign
+        quantity = (quantity or 0) * sign
+        # Deposits count on the dashboard only when their client belongs to the same partner
+        own_client = bool(has_client) and partner_id is not None and client_partner_id == partner_id
+
+        if source == 'client':
+            if partner_id is not None:
+                # amount is the client's lifetimeDeposits
+                add_up(self.monthly, (partner_id, month_key(event_time)), sign, amount, ZERO, ZERO, 0)
+
+        elif source == 'trade':
+            # Dashboard trades belong to the client's partner (refresh_partner_cubes)
+            if has_client and client_partner_id is not None:
+                add_up(self.monthly, (client_partner_id, month_key(event_time)),
+                       0, ZERO, ZERO, (pnl or ZERO) * sign, sign)
+            if partner_id is not None and event_time is not None:
+                key = (partner_id, event_time.date() if isinstance(event_time, datetime) else event_time,
+                       commission_plan if has_client and commission_plan is not None else 'Unknown')
+                add_up(self.daily_plan, key, amount, quantity)
+                if sign < 0:
+                    self.retracted_plan.add(key)
+
+        elif source == 'deposit':
+            if own_client:
+                add_up(self.monthly, (partner_id, month_key(event_time)), 0, ZERO, amount, ZERO, 0)
+            # cube_monthly_deposits groups by COALESCE(c.partnerId, d.affiliate_id)
+            group_partner = client_partner_id if has_client and client_partner_id is not None else partner_id
+            if group_partner is not None and event_time is not None:
+                key = (group_partner, month_key(event_time))
+                kind = (category or '').lower()
+                add_up(self.monthly_deposits, key,
+                       amount if kind == 'deposit' else ZERO, sign if kind == 'deposit' else 0,
+                       amount if kind == 'withdrawal' else ZERO, sign if kind == 'withdrawal' else 0)
+                if sign < 0:
+                    self.retracted_deposits.add(key)
+                if user_id is not None:
+                    self.deposit_users.add(user_id)
+
+    def touched_partners(self):
+        return sorted({partner for partner, _ in self.monthly})
+
+    def apply(self, cursor):
+        """Write the differences to the cubes (inside the caller's transaction)"""
+        if self.monthly:
+            upsert_additive(cursor, MONTHLY_TABLE, ['partner_id', 'year_month_str'],
+                            ['new_clients', 'client_deposits', 'total_deposits', 'total_commissions',
+                             'total_trades'],
+                            [key + tuple(values) for key, values in self.monthly.items()])
+
+        if self.daily_plan:
+            upsert_additive(cursor, DAILY_PLAN_TABLE, ['partner_id', 'trade_date', 'commission_plan'],
+                            ['total_commissions', 'trade_count'],
+                            [key + tuple(values) for key, values in self.daily_plan.items()])
+            for key in self.retracted_plan:
+                cursor.execute(f"""
+                    DELETE FROM {DAILY_PLAN_TABLE}
+                    WHERE partner_id = %s AND trade_date = %s AND commission_plan = %s
+                      AND total_commissions = 0 AND trade_count = 0
+                """, key)
+
+        if self.monthly_deposits:
+            rows = []
+            for (partner_id, year_month), (deposits, deposit_count, withdrawals, withdrawal_count) \
+                    in self.monthly_deposits.items():
+                year, month = map(int, year_month.split('-'))
+                rows.append((partner_id, year_month, year, month, calendar.month_name[month],
+                             deposits, deposit_count, withdrawals, withdrawal_count, deposits - withdrawals))
+            upsert_additive(cursor, MONTHLY_DEPOSITS_TABLE, ['partner_id', 'year_month_str'],
+                            ['total_deposits', 'deposit_count', 'total_withdrawals', 'withdrawal_count',
+                             'net_deposits'],
+                            rows, extra_columns=['year_val', 'month_val', 'month_name'])
+            recompute_deposit_stats(cursor, sorted(self.monthly_deposits))
+            for partner_id, year_month in self.retracted_deposits:
+                cursor.execute(f"""
+                    DELETE FROM {MONTHLY_DEPOSITS_TABLE}
+                    WHERE partner_id = %s AND year_month_str = %s
+                      AND deposit_count = 0 AND withdrawal_count = 0
+                """, (partner_id, year_month))
+
+def recompute_deposit_stats(cursor, groups):
+    """Recompute the non-additive cube_monthly_deposits columns for (partner, 'YYYY-MM') groups"""
+    by_month = {}
+    for partner_id, year_month in groups:
+        by_month.setdefault(year_month, []).append(partner_id)
+
+    for year_month, partner_ids in by_month.items():
+        start, end = month_bounds(year_month)
+        cursor.execute(f"""
+            SELECT COALESCE(c.partnerId, d.affiliate_id), d.binary_user_id_1,
+                   COUNT(*), SUM(d.amount_usd), MAX(d.amount_usd),
+                   MIN(CASE WHEN d.amount_usd > 0 THEN d.amount_usd END)
+            FROM deposits d
+            LEFT JOIN clients c ON c.binary_user_id = d.binary_user_id_1
+            WHERE d.category = 'deposit'
+              AND d.transaction_time >= %s AND d.transaction_time < %s
+              AND COALESCE(c.partnerId, d.affiliate_id) IN ({placeholders(partner_ids)})
+            GROUP BY COALESCE(c.partnerId, d.affiliate_id), d.binary_user_id_1
+        """, [start, end] + partner_ids)
+        per_user = cursor.fetchall()
+
+        # Users whose first deposit ever falls in this month
+        users = sorted({user for _, user, *_ in per_user if user is not None})
+        first_month_users = set()
+        if users:
+            cursor.execute(f"""
+                SELECT binary_user_id_1 FROM deposits
+                WHERE category = 'deposit' AND binary_user_id_1 IN ({placeholders(users)})
+                GROUP BY binary_user_id_1
+                HAVING MIN(transaction_time) >= %s AND MIN(transaction_time) < %s
+            """, users + [start, end])
+            first_month_users = {user for (user,) in cursor.fetchall()}
+
+        stats = {partner_id: [0, ZERO, None, None, 0, 0, 0] for partner_id in partner_ids}
+        for partner_id, user, count, total, largest, smallest in per_user:
+            entry = stats[partner_id]
+            entry[0] += count
+            entry[1] += total or ZERO
+            if largest is not None and (entry[2] is None or largest > entry[2]):
+                entry[2] = largest
+            if smallest is not None and (entry[3] is None or smallest < entry[3]):
+                entry[3] = smallest
+            if user is not None:
+                entry[4] += 1
+                entry[5] += count > 1
+                entry[6] += user in first_month_users
+
+        cursor.executemany(f"""
+            UPDATE {MONTHLY_DEPOSITS_TABLE}
+            SET avg_deposit_size = %s, max_deposit = %s, min_deposit = %s,
+                unique_depositors = %s, repeat_depositors = %s, first_time_depositors = %s
+            WHERE partner_id = %s AND year_month_str = %s
+        """, [(total / count if count else None, largest if largest is not None else ZERO, smallest,
+               unique, repeat, first_time, partner_id, year_month)
+              for partner_id, (count, total, largest, smallest, unique, repeat, first_time) in stats.items()])
+
+def refresh_dashboard(cursor, partner_ids=None, today=None):
+    """Recompute cube_partner_dashboard rows from cube_partner_monthly (all partners if None)"""
+    if partner_ids is not None and not partner_ids:
+        return
+    months = recent_months(today or date.today())
+    month_columns = ',\n'.join(
+        f"COALESCE(SUM(CASE WHEN m.year_month_str = %s THEN m.total_commissions ELSE 0 END), 0)"
+        for _ in months)
+    where = f"WHERE p.partner_id IN ({placeholders(partner_ids)})" if partner_ids is not None else ""
+    window_names = [f"month_{n}_commissions" for n in range(1, len(months) + 1)]
+    columns = ['total_clients', 'total_deposits', 'total_commissions', 'total_trades',
+               'mtd_clients', 'mtd_deposits', 'mtd_commissions', 'mtd_trades'] + window_names
+
+    cursor.execute(f"""
+        INSERT INTO {DASHBOARD_TABLE} (partner_id, partner_name, partner_tier, {', '.join(columns)})
+        SELECT
+            p.partner_id, p.name, p.tier,
+            COALESCE(SUM(m.new_clients), 0),
+            COALESCE(SUM(m.client_deposits), 0),
+            COALESCE(SUM(m.total_commissions), 0),
+            COALESCE(SUM(m.total_trades), 0),
+            COALESCE(SUM(CASE WHEN m.year_month_str = %s THEN m.new_clients ELSE 0 END), 0),
+            COALESCE(SUM(CASE WHEN m.year_month_str = %s THEN m.total_deposits ELSE 0 END), 0),
+            COALESCE(SUM(CASE WHEN m.year_month_str = %s THEN m.total_commissions ELSE 0 END), 0),
+            COALESCE(SUM(CASE WHEN m.year_month_str = %s THEN m.total_trades ELSE 0 END), 0),
+            {month_columns}
+        FROM partners p
+        LEFT JOIN {MONTHLY_TABLE} m ON m.partner_id = p.partner_id
+        {where}
+        GROUP BY p.partner_id, p.name, p.tier
+        ON DUPLICATE KEY UPDATE
+            partner_name = VALUES(partner_name),
+            partner_tier = VALUES(partner_tier),
+            {', '.join(f"{col} = VALUES({col})" for col in columns)}
+    """, [months[0]] * 4 + months + (list(partner_ids) if partner_ids is not None else []))
+
+def get_state(cursor, name):
+    cursor.execute(f"SELECT value FROM {STATE_TABLE} WHERE name = %s", (name,))
+    row = cursor.fetchone()
+    return row[0] if row else None
+
+def set_state(cursor, name, value):
+    cursor.execute(f"INSERT INTO {STATE_TABLE} (name, value) VALUES (%s, %s) "
+                   "ON DUPLICATE KEY UPDATE value = VALUES(value)", (name, value))
+
+def delete_applied(cursor, ids):
+    """Delete exactly the log rows that were applied
+
+    Not a range: an import transaction that commits later can hold a lower
+    id than rows already read, and its log rows must wait for the next batch.
+    """
+    for start in range(0, len(ids), UPSERT_CHUNK):
+        chunk = ids[start:start + UPSERT_CHUNK]
+        cursor.execute(f"DELETE FROM {LOG_TABLE} WHERE id IN ({placeholders(chunk)})", chunk)
+
+def apply_changes(connection, batch_size=DEFAULT_BATCH_SIZE):
+    """Apply and delete every log row present now; returns the number of rows applied"""
+    cursor = connection.cursor()
+    cursor.execute(f"SELECT MAX(id) FROM {LOG_TABLE}")
+    last_id = cursor.fetchone()[0]
+    connection.commit()
+
+    applied = 0
+    start = time.perf_counter()
+    after_id = 0
+    while last_id is not None:
+        cursor.execute(f"""
+            SELECT {', '.join(LOG_COLUMNS)} FROM {LOG_TABLE}
+            WHERE id > %s AND id <= %s ORDER BY id LIMIT %s
+        """, (after_id, last_id, batch_size))
+        rows = cursor.fetchall()
+        if not rows:
+            break
+
+        deltas = CubeDeltas()
+        for row in rows:
+            deltas.add(row)
+        deltas.apply(cursor)
+        refresh_dashboard(cursor, deltas.touched_partners())
+
+        after_id = rows[-1][0]
+        delete_applied(cursor, [row[0] for row in rows])
+        connection.commit()
+        applied += len(rows)
+        print(f"  Applied {applied} changes...")
+
+    # mtd/month_N are relative to the current month: shift every partner when it changes
+    this_month = month_key(date.today())
+    if get_state(cursor, 'dashboard_month') != this_month:
+        refresh_dashboard(cursor)
+        set_state(cursor, 'dashboard_month', this_month)
+        connection.commit()
+        print(f"  Dashboard moved to {this_month}")
+
+    cursor.close()
+    if applied:
+        print(f"  ✓ Applied {applied} changes in {time.perf_counter() - start:.2f}s")
+    return applied
+
+def ensure_daily_plan_key(cursor):
+    """The additive upsert needs the (partner, date, plan) unique key of create_comprehensive_cubes.sql"""
+    cursor.execute("""
+        SELECT COUNT(*) FROM information_schema.statistics
+        WHERE table_schema = DATABASE() AND table_name = %s AND index_name = 'uk_partner_date_plan'
+    """, (DAILY_PLAN_TABLE,))
+    if not cursor.fetchone()[0]:
+        cursor.execute(f"ALTER TABLE {DAILY_PLAN_TABLE} "
+                       "ADD UNIQUE KEY uk_partner_date_plan (partner_id, trade_date, commission_plan)")
+
+def rebuild(connection):
+    """Rebuild the maintained cubes from the base tables and discard the log up to now"""
+    cursor = connection.cursor()
+    cursor.execute(f"SELECT MAX(id) FROM {LOG_TABLE}")
+    last_id = cursor.fetchone()[0]
+    start = time.perf_counter()
+
+    print(f"\n🔄 Rebuilding {MONTHLY_TABLE}...")
+    cursor.execute(f"TRUNCATE TABLE {MONTHLY_TABLE}")
+    cursor.execute(f"""
+        INSERT INTO {MONTHLY_TABLE} (partner_id, year_month_str, new_clients, client_deposits)
+        SELECT partnerId, COALESCE(DATE_FORMAT(joinDate, '%Y-%m'), ''), COUNT(*),
+               COALESCE(SUM(lifetimeDeposits), 0)
+        FROM clients
+        WHERE partnerId IS NOT NULL
+        GROUP BY partnerId, COALESCE(DATE_FORMAT(joinDate, '%Y-%m'), '')
+    """)
+    cursor.execute(f"""
+        INSERT INTO {MONTHLY_TABLE} (partner_id, year_month_str, total_deposits)
+        SELECT d.affiliate_id, COALESCE(DATE_FORMAT(d.transaction_time, '%Y-%m'), ''), SUM(d.amount_usd)
+        FROM deposits d
+        JOIN clients c ON c.binary_user_id = d.binary_user_id_1 AND c.partnerId = d.affiliate_id
+        GROUP BY d.affiliate_id, COALESCE(DATE_FORMAT(d.transaction_time, '%Y-%m'), '')
+        ON DUPLICATE KEY UPDATE total_deposits = VALUES(total_deposits)
+    """)
+    cursor.execute(f"""
+        INSERT INTO {MONTHLY_TABLE} (partner_id, year_month_str, total_commissions, total_trades)
+        SELECT c.partnerId, COALESCE(DATE_FORMAT(t.date, '%Y-%m'), ''),
+               COALESCE(SUM(t.closed_pnl_usd), 0), COUNT(*)
+        FROM trades t
+        JOIN clients c ON c.binary_user_id = t.binary_user_id
+        WHERE c.partnerId IS NOT NULL
+        GROUP BY c.partnerId, COALESCE(DATE_FORMAT(t.date, '%Y-%m'), '')
+        ON DUPLICATE KEY UPDATE total_commissions = VALUES(total_commissions),
+                                total_trades = VALUES(total_trades)
+    """)
+
+    print(f"🔄 Rebuilding {DAILY_PLAN_TABLE}...")
+    cursor.execute(f"TRUNCATE TABLE {DAILY_PLAN_TABLE}")
+    ensure_daily_plan_key(cursor)
+    cursor.execute(f"""
+        INSERT INTO {DAILY_PLAN_TABLE} (partner_id, trade_date, commission_plan, total_commissions, trade_count)
+        SELECT t.affiliated_partner_id, t.date, COALESCE(c.commissionPlan, 'Unknown'),
+               SUM(t.expected_revenue_usd), SUM(t.number_of_trades)
+        FROM trades t
+        LEFT JOIN clients c ON t.binary_user_id = c.binary_user_id
+        WHERE t.affiliated_partner_id IS NOT NULL AND t.date IS NOT NULL
+        GROUP BY t.affiliated_partner_id, t.date, COALESCE(c.commissionPlan, 'Unknown')
+    """)
+
+    print(f"🔄 Rebuilding {MONTHLY_DEPOSITS_TABLE}...")
+    cursor.callproc('populate_cube_monthly_deposits')
+    for result in cursor.stored_results():
+        result.fetchall()
+
+    print(f"🔄 Rebuilding {DASHBOARD_TABLE}...")
+    refresh_dashboard(cursor)
+    set_state(cursor, 'dashboard_month', month_key(date.today()))
+    if last_id is not None:
+        cursor.execute(f"DELETE FROM {LOG_TABLE} WHERE id <= %s", (last_id,))
+    connection.commit()
+    cursor.close()
+
+    print(f"  ✓ Rebuilt cubes in {time.perf_counter() - start:.2f}s")
+
+def main():
+    parser = argparse.ArgumentParser(description=f'Apply {LOG_TABLE} to the cubes incrementally')
+    parser.add_argument('--rebuild', action='store_true',
+                        help='Rebuild the maintained cubes from the base tables and clear the log')
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE,
+                        help=f'Log rows applied per transaction (default: {DEFAULT_BATCH_SIZE})')
+    parser.add_argument('--interval', type=float, default=None,
+                        help='Keep running and apply new changes every INTERVAL seconds')
+    args = parser.parse_args()
+
+    conn = connect()
+    if args.rebuild:
+        rebuild(conn)
+
+    try:
+        while True:
+            apply_changes(conn, max(1, args.batch_size))
+            if args.interval is None:
+                break
+            time.sleep(args.interval)
+    except KeyboardInterrupt:
+        print("\nStopped")
+    finally:
+        conn.close()
+
+if __name__ == "__main__":
+    main()
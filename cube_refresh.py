@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""
+Deferred cube refresh for bulk imports
+
+The clients/trades/deposits triggers in create_cube_triggers.sql call
+refresh_partner_cubes (and refresh_commissions_cubes) for every row. Inside
+a BulkCubeSession the importer's connection sets @defer_cube_refresh so the
+triggers do nothing; instead every written batch queues its partners in
+cube_refresh_queue (in the same transaction as the rows), and finish()
+refreshes each queued partner once.
+
+The queue survives a crash, so partners queued by committed batches are
+still refreshed by the next session or by running this script directly:
+    python3 cube_refresh.py
+"""
+
+import argparse
+import time
+from db import connect, prepared_cursor
+
+QUEUE_TABLE = 'cube_refresh_queue'
+
+CREATE_QUEUE_TABLE = f"""
+    CREATE TABLE IF NOT EXISTS {QUEUE_TABLE} (
+        partner_id VARCHAR(20) PRIMARY KEY,
+        refresh_commissions BOOLEAN NOT NULL DEFAULT FALSE,
+        queued_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+"""
+
+QUEUE_UPSERT = "ON DUPLICATE KEY UPDATE refresh_commissions = refresh_commissions OR VALUES(refresh_commissions)"
+
+def add_cube_arguments(parser):
+    """Add --defer-cubes / --no-defer-cubes to an argparse parser"""
+    parser.add_argument('--defer-cubes', action=argparse.BooleanOptionalAction, default=True,
+                        help='Suspend the per-row cube triggers and refresh each affected partner '
+                             'once at the end (default: on)')
+    return parser
+
+def placeholders(values):
+    return ', '.join(['%s'] * len(values))
+
+class BulkCubeSession:
+    """Suspends per-row cube triggers on one connection and queues affected partners"""
+
+    def __init__(self, connection):
+        self.connection = connection
+        cursor = connection.cursor()
+        cursor.execute(CREATE_QUEUE_TABLE)
+        cursor.execute("SET @defer_cube_refresh = 1")
+        cursor.close()
+
+    def queue_partners(self, cursor, partner_ids, refresh_commissions=False):
+        """Queue partner IDs taken straight from the rows"""
+        partner_ids = sorted({p for p in partner_ids if p})
+        if not partner_ids:
+            return
+        cursor.execute(
+            f"INSERT INTO {QUEUE_TABLE} (partner_id, refresh_commissions) VALUES "
+            + ', '.join(['(%s, %s)'] * len(partner_ids)) + f" {QUEUE_UPSERT}",
+            [value for p in partner_ids for value in (p, refresh_commissions)])
+
+    def queue_client_partners(self, cursor, user_ids, refresh_commissions=False):
+        """Queue the current partners of these clients (as the trades triggers look them up)"""
+        user_ids = sorted({u for u in user_ids if u})
+        if not user_ids:
+            return
+        cursor.execute(f"""
+            INSERT INTO {QUEUE_TABLE} (partner_id, refresh_commissions)
+            SELECT DISTINCT partnerId, %s FROM clients
+            WHERE binary_user_id IN ({placeholders(user_ids)}) AND partnerId IS NOT NULL
+            {QUEUE_UPSERT}
+        """, [refresh_commissions] + user_ids)
+
+    def queue_staged_trades(self, cursor, staging_table):
+        """Queue the partners of every client in a trades staging table (one statement)"""
+        cursor.execute(f"""
+            INSERT INTO {QUEUE_TABLE} (partner_id, refresh_commissions)
+            SELECT DISTINCT c.partnerId, TRUE
+            FROM (SELECT DISTINCT binary_user_id FROM {staging_table}) s
+            JOIN clients c ON c.binary_user_id = s.binary_user_id
+            WHERE c.partnerId IS NOT NULL
+            {QUEUE_UPSERT}
+        """)
+
+    # BatchWriter before_flush hooks: run in the batch's transaction, before its INSERT
+
+    def trade_hook(self, user_id_index):
+        """Queue the partners of the clients in a batch of trades"""
+        def hook(cursor, rows):
+            self.queue_client_partners(cursor, [row[user_id_index] for row in rows], True)
+        return hook
+
+    def partner_hook(self, partner_map, user_id_index):
+        """Queue the partners of a batch of trades from a partner_map.PartnerMap (no clients lookup)"""
+        def hook(cursor, rows):
+            self.queue_partners(cursor, [partner_map.get(row[user_id_index]) for row in rows], True)
+        return hook
+
+    def client_hook(self, user_id_index, partner_index):
+        """Queue the old partner (before the upsert) and the new partner of each client"""
+        def hook(cursor, rows):
+            self.queue_client_partners(cursor, [row[user_id_index] for row in rows])
+            self.queue_partners(cursor, [row[partner_index] for row in rows])
+        return hook
+
+    def deposit_hook(self, affiliate_index):
+        """Queue the affiliates of a batch of deposits"""
+        def hook(cursor, rows):
+            self.queue_partners(cursor, [row[affiliate_index] for row in rows])
+        return hook
+
+    def finish(self):
+        """Re-enable the triggers and refresh every queued partner once"""
+        cursor = self.connection.cursor()
+        cursor.execute("SET @defer_cube_refresh = NULL")
+        cursor.close()
+        return refresh_queued_partners(self.connection)
+
+def refresh_queued_partners(connection):
+    """Run the cube procedures once per queued partner, removing each when done"""
+    cursor = connection.cursor()
+    cursor.execute(CREATE_QUEUE_TABLE)
+    cursor.execute(f"SELECT partner_id, refresh_commissions FROM {QUEUE_TABLE} ORDER BY partner_id")
+    queued = cursor.fetchall()
+    # Prepared once, executed once per partner
+    dequeue = prepared_cursor(connection)
+
+    print(f"\n🔄 Refreshing cubes for {len(queued)} partners...")
+    start = time.perf_counter()
+    for partner_id, refresh_commissions in queued:
+        cursor.callproc('refresh_partner_cubes', (partner_id,))
+        if refresh_commissions:
+            cursor.callproc('refresh_commissions_cubes', (partner_id,))
+        dequeue.execute(f"DELETE FROM {QUEUE_TABLE} WHERE partner_id = %s", (partner_id,))
+        connection.commit()
+    elapsed = time.perf_counter() - start
+    dequeue.close()
+    cursor.close()
+
+    print(f"  ✓ Refreshed {len(queued)} partners in {elapsed:.2f}s")
+    return len(queued)
+
+def main():
+    parser = argparse.ArgumentParser(description=f'Refresh the cubes of every partner in {QUEUE_TABLE}')
+    parser.parse_args()
+
+    conn = connect()
+    refresh_queued_partners(conn)
+    conn.close()
+
+if __name__ == "__main__":
+    main()
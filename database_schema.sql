@@ -79,6 +79,11 @@ CREATE TABLE trades (
     is_financial BOOLEAN,
     app_markup_usd DECIMAL(15,2),
     affiliated_partner_id VARCHAR(20),
+    -- From the symbols table at import time (import_trades1.py)
+    unified_symbol VARCHAR(100),
+    unified_asset_type VARCHAR(100),
+    unified_asset_sub_type VARCHAR(100),
+    unified_category VARCHAR(50),
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
     FOREIGN KEY (binary_user_id) REFERENCES clients(binary_user_id) ON DELETE CASCADE,
@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+"""
+Shared database access for the scripts
+
+Connection settings come from the environment, defaulting to the local
+development server the scripts have always used:
+    PARTNER_REPORT_DB_HOST      (localhost)
+    PARTNER_REPORT_DB_PORT      (3306)
+    PARTNER_REPORT_DB_USER      (root)
+    PARTNER_REPORT_DB_PASSWORD  ('')
+    PARTNER_REPORT_DB_NAME      (partner_report)
+    PARTNER_REPORT_DB_BACKEND   mysql (default), mariadb or sqlite
+    PARTNER_REPORT_DB_PATH      database file of the sqlite backend (:memory:)
+    PARTNER_REPORT_DB_PURE      1 = pure-Python mysql connector even if the
+                                C extension is installed
+
+connect(**overrides) opens a connection (overrides replace settings, None
+drops one, e.g. database=None to connect without a default schema).
+shared_connection() is one connection per process, kept open between calls
+and reopened if it drops, for pool workers and batch renderers that would
+otherwise reconnect for every task (the scripts parallelise with processes,
+so this is their connection pool).
+
+Error is the tuple of the base exception classes of the installed drivers
+(mysql.connector, mariadb, sqlite3), so `except Error` catches a database
+error whichever backend raised it.
+
+prepared_cursor() gives a cursor with server-side prepared statements for
+statements run many times with different parameters. Multi-row INSERTs
+(BatchWriter) should keep using plain cursors: a prepared executemany()
+sends one round trip per row.
+
+The sqlite backend accepts the scripts' %s placeholders and dictionary
+cursors so data-access code can be exercised without a server; MySQL-only
+SQL (ON DUPLICATE KEY UPDATE, LOAD DATA, procedures) still needs MySQL or
+MariaDB. Other backends can be added with register_backend().
+"""
+
+import importlib
+import os
+import sqlite3
+
+ENV_PREFIX = 'PARTNER_REPORT_DB_'
+DEFAULT_BACKEND = 'mysql'
+
+def _driver_errors():
+    """Base exception class of every installed driver"""
+    errors = []
+    for module in ('mysql.connector', 'mariadb'):
+        try:
+            errors.append(importlib.import_module(module).Error)
+        except ImportError:
+            pass
+    errors.append(sqlite3.Error)
+    return tuple(errors)
+
+Error = _driver_errors()
+
+def env(name, default=None):
+    return os.environ.get(ENV_PREFIX + name, default)
+
+def config(**overrides):
+    """Connection settings from the environment, with overrides applied"""
+    settings = {
+        'host': env('HOST', 'localhost'),
+        'port': int(env('PORT', '3306')),
+        'user': env('USER', 'root'),
+        'password': env('PASSWORD', ''),
+        'database': env('NAME', 'partner_report'),
+    }
+    settings.update(overrides)
+    return {key: value for key, value in settings.items() if value is not None}
+
+def _connect_mysql(settings):
+    import mysql.connector
+    # The C extension parses result sets several times faster than the pure connector
+    settings.setdefault('use_pure', env('PURE') == '1' or not getattr(mysql.connector, 'HAVE_CEXT', False))
+    return mysql.connector.connect(**settings)
+
+def _connect_mariadb(settings):
+    import mariadb
+    if 'allow_local_infile' in settings:
+        settings['local_infile'] = settings.pop('allow_local_infile')
+    settings.pop('collation', None)
+    return mariadb.connect(**settings)
+
+class _SQLiteCursor:
+    """sqlite3 cursor taking %s placeholders and returning dicts on request"""
+
+    def __init__(self, cursor, dictionary=False):
+        self._cursor = cursor
+        self._dictionary = dictionary
+
+    def _row(self, row):
+        if row is None or not self._dictionary:
+            return row
+        return dict(zip([column[0] for column in self._cursor.description], row))
+
+    def execute(self, sql, params=()):
+        self._cursor.execute(sql.replace('%s', '?'), tuple(params or ()))
+
+    def executemany(self, sql, seq_params):
+        self._cursor.executemany(sql.replace('%s', '?'), [tuple(p) for p in seq_params])
+
+    def fetchone(self):
+        return self._row(self._cursor.fetchone())
+
+    def fetchmany(self, size=1):
+        return [self._row(row) for row in self._cursor.fetchmany(size)]
+
+    def fetchall(self):
+        return [self._row(row) for row in self._cursor.fetchall()]
+
+    def __iter__(self):
+        return (self._row(row) for row in self._cursor)
+
+    @property
+    def rowcount(self):
+        return self._cursor.rowcount
+
+    @property
+    def lastrowid(self):
+        return self._cursor.lastrowid
+
+    @property
+    def description(self):
+        return self._cursor.description
+
+    def close(self):
+        self._cursor.close()
+
+class _SQLiteConnection:
+    """The part of the mysql.connector connection API the scripts use"""
+
+    def __init__(self, path):
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._open = True
+
+    def cursor(self, dictionary=False, prepared=False, buffered=False):
+        # sqlite3 caches compiled statements itself, so prepared needs no handling
+        return _SQLiteCursor(self._conn.cursor(), dictionary)
+
+    def commit(self):
+        self._conn.commit()
+
+    def rollback(self):
+        self._conn.rollback()
+
+    def is_connected(self):
+        return self._open
+
+    def close(self):
+        self._conn.close()
+        self._open = False
+
+def _connect_sqlite(settings):
+    return _SQLiteConnection(settings.get('path') or env('PATH', ':memory:'))
+
+BACKENDS = {
+    'mysql': _connect_mysql,
+    'mariadb': _connect_mariadb,
+    'sqlite': _connect_sqlite,
+}
+
+def register_backend(name, connect_function):
+    """Add a backend: connect_function(settings dict) returns a DB-API connection
+
+    `except Error` only catches its exceptions if they derive from one of
+    the driver classes in Error.
+    """
+    BACKENDS[name] = connect_function
+
+def connect(backend=None, **overrides):
+    """New connection to the configured (or given) backend"""
+    backend = backend or env('BACKEND', DEFAULT_BACKEND)
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown database backend {backend!r} (expected one of {', '.join(BACKENDS)})")
+    return BACKENDS[backend](config(**overrides))
+
+def is_alive(conn):
+    try:
+        return conn.is_connected()
+    except Exception:
+        return False
+
+_shared = {}
+
+def shared_connection(backend=None, **overrides):
+    """This process's connection for these settings, reconnecting if it was dropped
+
+    Do not close it; it is closed when the process exits. Forked children
+    get their own (the parent's socket is never reused across processes).
+    """
+    key = (os.getpid(), backend, tuple(sorted(overrides.items())))
+    conn = _shared.get(key)
+    if conn is None or not is_alive(conn):
+        conn = _shared[key] = connect(backend, **overrides)
+    return conn
+
+def prepared_cursor(conn):
+    """Cursor whose statements are prepared on the server once and then re-executed"""
+    return conn.cursor(prepared=True)
@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+Delta mode for the daily clients/symbols re-imports
+
+Keeps a content hash per key in the import_row_hashes table. On a delta
+import every parsed row is hashed and only rows whose hash changed (or
+whose key is new) are sent to MySQL; keys that were imported before but are
+missing from the new file are deleted. Unchanged rows never reach the
+database, so they do not fire the clients triggers or cube refreshes.
+"""
+
+import hashlib
+from db import Error
+from batch_writer import BatchWriter
+
+HASH_TABLE = 'import_row_hashes'
+KEY_SEPARATOR = '\x1f'
+DELETE_BATCH_SIZE = 1000
+
+CREATE_HASH_TABLE = f"""
+    CREATE TABLE IF NOT EXISTS {HASH_TABLE} (
+        target_table VARCHAR(64) NOT NULL,
+        row_key VARCHAR(255) NOT NULL,
+        row_hash CHAR(32) NOT NULL,
+        PRIMARY KEY (target_table, row_key)
+    )
+"""
+
+def add_delta_argument(parser):
+    """Add the --delta option to an argparse parser"""
+    parser.add_argument('--delta', action='store_true',
+                        help=f'Only write rows whose content changed since the last delta import '
+                             f'and delete keys missing from the file (hashes kept in {HASH_TABLE})')
+    return parser
+
+def row_hash(values):
+    """Stable 128-bit hash of a parsed row tuple"""
+    return hashlib.blake2b(repr(values).encode('utf-8'), digest_size=16).hexdigest()
+
+class DeltaTracker:
+    """Compares parsed rows against the hashes saved by the previous delta import"""
+
+    def __init__(self, connection, table, columns, key_columns):
+        self.connection = connection
+        self.table = table
+        self.key_columns = list(key_columns)
+        self.key_indexes = [list(columns).index(col) for col in key_columns]
+
+        cursor = connection.cursor()
+        cursor.execute(CREATE_HASH_TABLE)
+        cursor.execute(f"SELECT row_key, row_hash FROM {HASH_TABLE} WHERE target_table = %s", (table,))
+        self.saved = dict(cursor.fetchall())
+        cursor.close()
+
+        self.changed_hashes = {}
+        self.seen = set()
+        self.new = 0
+        self.updated = 0
+        self.unchanged = 0
+        self.deleted = 0
+
+    def row_key(self, values):
+        return KEY_SEPARATOR.join(str(values[i]) for i in self.key_indexes)
+
+    def changed(self, values):
+        """True if the row is new or differs from the last import (call once per row)"""
+        key = self.row_key(values)
+        digest = row_hash(values)
+        self.seen.add(key)
+
+        previous = self.changed_hashes.get(key, self.saved.get(key))
+        if previous == digest:
+            self.unchanged += 1
+            return False
+        if previous is None:
+            self.new += 1
+        else:
+            self.updated += 1
+        self.changed_hashes[key] = digest
+        return True
+
+    def delete_missing(self):
+        """Delete rows whose key was imported before but is not in this file"""
+        missing = [key for key in self.saved if key not in self.seen]
+        cursor = self.connection.cursor()
+        group = '(' + ', '.join(['%s'] * len(self.key_columns)) + ')'
+        failed = set()
+
+        for i in range(0, len(missing), DELETE_BATCH_SIZE):
+            keys = missing[i:i + DELETE_BATCH_SIZE]
+            params = [part for key in keys for part in key.split(KEY_SEPARATOR)]
+            try:
+                cursor.execute(
+                    f"DELETE FROM {self.table} WHERE ({', '.join(self.key_columns)}) IN "
+                    f"({', '.join([group] * len(keys))})", params)
+                self.deleted += cursor.rowcount
+            except Error as e:
+                # e.g. a client still referenced by trades; try again next time
+                failed.update(keys)
+                print(f"  Error deleting {len(keys)} missing {self.table} rows: {e}")
+
+        removed = [key for key in missing if key not in failed]
+        for i in range(0, len(removed), DELETE_BATCH_SIZE):
+            keys = removed[i:i + DELETE_BATCH_SIZE]
+            cursor.execute(
+                f"DELETE FROM {HASH_TABLE} WHERE target_table = %s AND row_key IN "
+                f"({', '.join(['%s'] * len(keys))})", [self.table] + keys)
+        self.connection.commit()
+        cursor.close()
+        return self.deleted
+
+    def save_hashes(self):
+        """Store the hashes of the rows written by this import"""
+        with BatchWriter(self.connection, HASH_TABLE, ['target_table', 'row_key', 'row_hash'],
+                         on_duplicate='row_hash = VALUES(row_hash)', label='row hashes') as writer:
+            for key, digest in self.changed_hashes.items():
+                writer.add((self.table, key, digest))
+        return writer.written
+
+    def finish(self, write_ok=True):
+        """Apply deletes and save hashes; hashes are only saved if every batch was written"""
+        self.delete_missing()
+        if write_ok:
+            self.save_hashes()
+        else:
+            print("  Some batches failed, not saving row hashes (changed rows will be sent again)")
+
+        print(f"\n🔁 Delta Import:")
+        print(f"  New rows: {self.new}")
+        print(f"  Changed rows: {self.updated}")
+        print(f"  Unchanged rows skipped: {self.unchanged}")
+        print(f"  Rows deleted: {self.deleted}")
@@ -1,76 +1,106 @@
 #!/usr/bin/env python3
 """
 Generate SQL INSERT statements from clients CSV file
+
+    python3 generate_clients_sql.py [CSV_FILE] [OUTPUT_FILE] [--shards N] [--format tsv] [--compress zstd]
+
+Statements are sized by bytes and streamed out by sql_dump.SQLDumpWriter;
+--shards writes N scripts for parallel loading, --format tsv writes TSV
+files loaded with LOAD DATA instead of INSERTs, --compress gzip|bz2|zstd
+writes the scripts compressed. The CSV itself may be gzip/bz2/zstd.
 """
 
+import argparse
 import csv
+import os
 from datetime import datetime
 import sys
+from compressed_io import open_input_text
+from sql_dump import (DEFAULT_STATEMENT_BYTES, SQLDumpWriter, add_dump_arguments,
+                      check_dump_arguments, print_load_instructions)
+
+CLIENT_COLUMNS = [
+    'customer_id', 'name', 'country', 'join_date', 'account_type', 'account_number',
+    'lifetime_deposits', 'commission_plan', 'tracking_link_used', 'tier', 'sub_partner',
+    'partner_id', 'email', 'preferred_language', 'gender', 'age'
+]
 
-def escape_sql_string(value):
-    """Escape string for SQL"""
-    if value is None or value == '':
-        return 'NULL'
-    # Escape single quotes and backslashes
-    value = str(value).replace('\\', '\\\\').replace("'", "\\'")
-    return f"'{value}'"
+ON_DUPLICATE = ',\n    '.join(f"{col} = VALUES({col})"
+                              for col in ['name', 'country', 'lifetime_deposits', 'email', 'gender', 'age'])
+
+def text(value):
+    """Stripped string, or None (NULL) when empty"""
+    value = (value or '').strip()
+    return value or None
 
 def parse_date(date_str):
     """Parse date from CSV format"""
     if not date_str or date_str.strip() == '':
-        return 'NULL'
+        return None
     try:
         dt = datetime.strptime(date_str, '%Y-%m-%d')
-        return f"'{dt.strftime('%Y-%m-%d')}'"
+        return dt.strftime('%Y-%m-%d')
     except:
-        return 'NULL'
+        return None
 
 def parse_boolean(bool_str):
     """Parse boolean from CSV"""
     if not bool_str or bool_str.strip() == '':
-        return '0'
-    return '1' if bool_str.strip().upper() == 'TRUE' else '0'
+        return 0
+    return 1 if bool_str.strip().upper() == 'TRUE' else 0
 
 def parse_decimal(dec_str):
     """Parse decimal from CSV"""
     if not dec_str or dec_str.strip() == '':
-        return '0.00'
+        return 0.0
     try:
-        return str(float(dec_str))
+        return float(dec_str)
     except:
-        return '0.00'
+        return 0.0
 
 def parse_int(int_str):
     """Parse integer from CSV"""
     if not int_str or int_str.strip() == '':
-        return 'NULL'
+        return None
     try:
-        return str(int(float(int_str)))
+        return int(float(int_str))
     except:
-        return 'NULL'
+        return None
+
+def client_values(row):
+    """Values in CLIENT_COLUMNS order for one CSV row"""
+    return (
+        text(str(row['binary_user_id'])),
+        text(row.get('name')),
+        text(row.get('country')),
+        parse_date(row.get('joinDate', '')),
+        text(row.get('account_type')),
+        text(row.get('accountNumber')),
+        parse_decimal(row.get('lifetimeDeposits', '0')),
+        text(row.get('commissionPlan')),
+        text(row.get('trackingLinkUsed')),
+        text(row.get('tier')),
+        parse_boolean(row.get('sub-partner', 'FALSE')),
+        text(row.get('partnerId')),
+        text(row.get('email')),
+        text(row.get('preferredLanguage')),
+        text(row.get('gender')),
+        parse_int(row.get('age', ''))
+    )
 
-def generate_sql(csv_file_path, output_file):
+def generate_sql(csv_file_path, output_file, fmt='insert', shards=1,
+                 max_statement_bytes=DEFAULT_STATEMENT_BYTES, compress=None):
     """Generate SQL from CSV file"""
     print(f"Reading CSV file: {csv_file_path}")
     
-    with open(csv_file_path, 'r', encoding='utf-8') as file:
+    with open_input_text(csv_file_path) as file:
         csv_reader = csv.DictReader(file)
+        header = ["-- Clients Data Import", f"-- Generated from {os.path.basename(csv_file_path)}"]
         
-        # Open output file
-        with open(output_file, 'w', encoding='utf-8') as sql_file:
-            # Write header
-            sql_file.write("-- Clients Data Import\n")
-            sql_file.write("-- Generated from clients1.csv\n\n")
-            sql_file.write("USE partner_report;\n\n")
-            sql_file.write("-- Disable checks for faster import\n")
-            sql_file.write("SET FOREIGN_KEY_CHECKS = 0;\n")
-            sql_file.write("SET UNIQUE_CHECKS = 0;\n")
-            sql_file.write("SET AUTOCOMMIT = 0;\n\n")
-            
+        with SQLDumpWriter(output_file, 'clients', CLIENT_COLUMNS, header, ON_DUPLICATE, fmt,
+                           shards, max_statement_bytes, compress=compress) as writer:
             count = 0
             skipped = 0
-            batch_size = 100
-            values = []
             
             for row in csv_reader:
                 # Skip rows without customer ID
@@ -78,72 +108,35 @@ def generate_sql(csv_file_path, output_file):
                     skipped += 1
                     continue
                 
-                # Extract and transform data
-                customer_id = escape_sql_string(str(row['binary_user_id']).strip())
-                name = escape_sql_string(row.get('name', '').strip())
-                country = escape_sql_string(row.get('country', '').strip())
-                join_date = parse_date(row.get('joinDate', ''))
-                account_type = escape_sql_string(row.get('account_type', '').strip())
-                account_number = escape_sql_string(row.get('accountNumber', '').strip())
-                lifetime_deposits = parse_decimal(row.get('lifetimeDeposits', '0'))
-                commission_plan = escape_sql_string(row.get('commissionPlan', '').strip())
-                tracking_link_used = escape_sql_string(row.get('trackingLinkUsed', '').strip())
-                tier = escape_sql_string(row.get('tier', '').strip())
-                sub_partner = parse_boolean(row.get('sub-partner', 'FALSE'))
-                partner_id = escape_sql_string(row.get('partnerId', '').strip()) if row.get('partnerId', '').strip() else 'NULL'
-                email = escape_sql_string(row.get('email', '').strip())
-                preferred_language = escape_sql_string(row.get('preferredLanguage', '').strip())
-                gender = escape_sql_string(row.get('gender', '').strip())
-                age = parse_int(row.get('age', ''))
-                
-                # Build value tuple
-                value_tuple = f"({customer_id}, {name}, {country}, {join_date}, {account_type}, {account_number}, {lifetime_deposits}, {commission_plan}, {tracking_link_used}, {tier}, {sub_partner}, {partner_id}, {email}, {preferred_language}, {gender}, {age})"
-                
-                values.append(value_tuple)
+                writer.add(client_values(row))
                 count += 1
-                
-                # Write in batches
-                if len(values) >= batch_size:
-                    sql_file.write("INSERT INTO clients (customer_id, name, country, join_date, account_type, account_number, lifetime_deposits, commission_plan, tracking_link_used, tier, sub_partner, partner_id, email, preferred_language, gender, age) VALUES\n")
-                    sql_file.write(',\n'.join(values))
-                    sql_file.write("\nON DUPLICATE KEY UPDATE\n")
-                    sql_file.write("    name = VALUES(name),\n")
-                    sql_file.write("    country = VALUES(country),\n")
-                    sql_file.write("    lifetime_deposits = VALUES(lifetime_deposits),\n")
-                    sql_file.write("    email = VALUES(email),\n")
-                    sql_file.write("    gender = VALUES(gender),\n")
-                    sql_file.write("    age = VALUES(age);\n\n")
-                    values = []
-                    print(f"  Generated {count} INSERT statements...", end='\r')
-            
-            # Write remaining values
-            if values:
-                sql_file.write("INSERT INTO clients (customer_id, name, country, join_date, account_type, account_number, lifetime_deposits, commission_plan, tracking_link_used, tier, sub_partner, partner_id, email, preferred_language, gender, age) VALUES\n")
-                sql_file.write(',\n'.join(values))
-                sql_file.write("\nON DUPLICATE KEY UPDATE\n")
-                sql_file.write("    name = VALUES(name),\n")
-                sql_file.write("    country = VALUES(country),\n")
-                sql_file.write("    lifetime_deposits = VALUES(lifetime_deposits),\n")
-                sql_file.write("    email = VALUES(email),\n")
-                sql_file.write("    gender = VALUES(gender),\n")
-                sql_file.write("    age = VALUES(age);\n\n")
+                if count % 10000 == 0:
+                    print(f"  Generated {count} rows...", end='\r')
             
             # Write footer
-            sql_file.write("COMMIT;\n")
-            sql_file.write("SET FOREIGN_KEY_CHECKS = 1;\n")
-            sql_file.write("SET UNIQUE_CHECKS = 1;\n")
-            sql_file.write("SET AUTOCOMMIT = 1;\n\n")
-            sql_file.write(f"-- Total records: {count}\n")
-            sql_file.write(f"-- Skipped records: {skipped}\n")
+            paths = writer.close([f"-- Total records: {count}", f"-- Skipped records: {skipped}"])
             
-            print(f"\n✓ Generated {count} INSERT statements")
+            print(f"\n✓ Generated {count} rows in {writer.statements} statements")
             if skipped > 0:
                 print(f"  Skipped {skipped} rows (no customer ID)")
-            print(f"✓ SQL file created: {output_file}")
+            for path in paths:
+                print(f"✓ File created: {path}")
+            if compress:
+                for line in writer.report():
+                    print(f"  {line}")
+    return paths
 
 if __name__ == "__main__":
-    csv_file = '/Users/michalisphytides/Downloads/clients1.csv'
-    output_file = '/Users/michalisphytides/Desktop/partner-report/clients_data.sql'
+    parser = argparse.ArgumentParser(description='Generate a clients SQL dump from CSV')
+    parser.add_argument('csv_file', nargs='?', default='/Users/michalisphytides/Downloads/clients1.csv',
+                        help='Path to clients CSV')
+    parser.add_argument('output_file', nargs='?',
+                        default='/Users/michalisphytides/Desktop/partner-report/clients_data.sql',
+                        help='SQL file to write')
+    add_dump_arguments(parser)
+    args = parser.parse_args()
+    check_dump_arguments(parser, args)
+    csv_file, output_file = args.csv_file, args.output_file
     
     print("=" * 60)
     print("Clients SQL Generator")
@@ -151,13 +144,13 @@ if __name__ == "__main__":
     print()
     
     try:
-        generate_sql(csv_file, output_file)
+        paths = generate_sql(csv_file, output_file, args.format, args.shards, args.max_statement_bytes,
+                             args.compress)
         
         print("\n" + "=" * 60)
         print("SQL file generated successfully!")
         print("=" * 60)
-        print("\nTo import into MySQL, run:")
-        print(f"  mysql -u root -p partner_report < {output_file}")
+        print_load_instructions(paths, args.format)
         print()
         
     except FileNotFoundError:
@@ -2,98 +2,101 @@
 """
 Generate Population Pyramid Chart for Partner Report
 Replaces the Population Distribution graph on the clients page
+
+    python3 generate_population_pyramid.py [PARTNER_ID] [OUTPUT_FILE]
+    python3 generate_population_pyramid.py --all-partners --output-dir pyramids/
+    python3 generate_population_pyramid.py --format json [PARTNER_ID] [OUTPUT_FILE]
+
+--all-partners fetches the counts of every partner with one grouped query
+and renders them across a process pool; each worker reuses one figure.
+It writes population_pyramid_<partner>.png and population_pyramids.json
+(the stats of every partner).
+
+Rendered pyramids are kept in a render cache (pyramid_cache.py): a partner
+whose clients are unchanged since the last run is copied from the cache
+without querying its counts or rendering. --no-cache disables it.
+
+--format json writes only the binned series and totals as compact JSON and
+--format svg a small SVG drawn without matplotlib (pyramid_svg.py). Neither
+imports pandas, matplotlib or seaborn, which are loaded only for PNGs; the
+render cache is used for PNGs only. With --all-partners, json writes just
+the combined stats file and svg one population_pyramid_<partner>.svg each.
 """
 
-import matplotlib.pyplot as plt
-import seaborn as sns
-import pandas as pd
-import mysql.connector
-from mysql.connector import Error
+from db import Error, shared_connection
 import os
 import sys
 import json
+import multiprocessing
+import time
+from pyramid_data import (FETCH_MODES, client_total, compare_fetch_modes, create_age_bins,
+                          fetch_all_partner_count_rows, fetch_all_partner_counts, fetch_client_counts,
+                          fetch_pyramid_series, pyramid_counts, pyramid_series)
+from pyramid_cache import PyramidCache, add_cache_arguments, fetch_version, fetch_versions
 
-# Database configuration
-DB_CONFIG = {
-    'host': 'localhost',
-    'database': 'partner_report',
-    'user': 'root',
-    'password': ''  # Assuming no password for local root
-}
+OUTPUT_FORMATS = ['png', 'json', 'svg']
 
 def get_db_connection():
-    """Establishes and returns a database connection."""
+    """Returns the process's database connection (opened once, reused by every fetch)."""
     try:
-        conn = mysql.connector.connect(**DB_CONFIG)
+        conn = shared_connection()
         if conn.is_connected():
             return conn
     except Error as e:
         print(f"Error connecting to MySQL: {e}")
         return None
 
-def fetch_client_data(partner_id=None):
-    """Fetches client data from the database."""
+def fetch_client_data(partner_id=None, mode='aggregate'):
+    """Fetches client age/gender counts (aggregate) or rows (rows) from the database."""
+    import pandas as pd
     conn = get_db_connection()
     if conn is None:
         return pd.DataFrame()
 
-    query = "SELECT age, gender FROM clients WHERE age IS NOT NULL AND gender IS NOT NULL"
-    params = []
-    if partner_id:
-        query += " AND partnerId = %s"
-        params.append(partner_id)
-
     try:
-        df = pd.read_sql(query, conn, params=params)
-        return df
+        return fetch_client_counts(conn, partner_id, mode)
     except Error as e:
         print(f"Error fetching data: {e}")
         return pd.DataFrame()
-    finally:
-        if conn.is_connected():
-            conn.close()
 
-def create_age_bins(df):
-    """Creates age bins for the DataFrame."""
-    bins = [0, 18, 25, 35, 45, 55, 65, 100]
-    labels = ['Under 18', '18-25', '25-35', '35-45', '45-55', '55-65', '65+']
-    df['age_group'] = pd.cut(df['age'], bins=bins, labels=labels, right=False)
-    return df
+def fetch_series_data(partner_id=None, mode='aggregate'):
+    """Fetches the pyramid's stats dict without pandas (aggregate mode); None if unavailable."""
+    conn = get_db_connection()
+    if conn is None:
+        return None
 
-def create_population_pyramid(df, partner_id=None, output_file='population_pyramid.png'):
-    """Create population pyramid visualization"""
-    
-    # Set style
+    try:
+        return fetch_pyramid_series(conn, partner_id, mode)
+    except Error as e:
+        print(f"Error fetching data: {e}")
+        return None
+
+def write_series(stats, partner_id, output_file, fmt):
+    """Write the stats dict as compact JSON or as an SVG"""
+    with open(output_file, 'w', encoding='utf-8') as f:
+        if fmt == 'json':
+            json.dump(stats, f, separators=(',', ':'))
+        else:
+            from pyramid_svg import render_svg
+            f.write(render_svg(stats, partner_id))
+
+def load_plotting():
+    """Import matplotlib/seaborn (PNG output only) and set the chart style"""
+    import matplotlib.pyplot as plt
+    import seaborn as sns
     sns.set_style("whitegrid")
     plt.rcParams['figure.figsize'] = (12, 8)
     plt.rcParams['font.size'] = 11
-    
-    # Normalize gender values to title case
-    df['gender'] = df['gender'].str.title()
-    
-    # Create age bins
-    df = create_age_bins(df)
-    
-    # Group by age_group and gender
-    grouped = df.groupby(['age_group', 'gender'], observed=True).size().unstack(fill_value=0)
-    
-    # Ensure we have both male and female columns
-    if 'Male' not in grouped.columns:
-        grouped['Male'] = 0
-    if 'Female' not in grouped.columns:
-        grouped['Female'] = 0
-    
-    # Sort by age group index
-    age_order = ['Under 18', '18-25', '25-35', '35-45', '45-55', '55-65', '65+']
-    grouped = grouped.reindex([ag for ag in age_order if ag in grouped.index])
-    
+    return plt
+
+def draw_population_pyramid(fig, ax, grouped, partner_id=None):
+    """Draw a pyramid of pyramid_counts() on an existing figure/Axes; returns its stats"""
     # Prepare data for plotting
     male_counts = grouped['Male']
     female_counts = grouped['Female']
     age_groups = grouped.index
     
-    # Create the plot
-    fig, ax = plt.subplots()
+    ax.clear()
     
     # Plot males (negative values for left side)
     ax.barh(age_groups, -male_counts, color='#38bdf8', label='Male')
@@ -107,6 +110,7 @@ def create_population_pyramid(df, partner_id=None, output_file='population_pyram
     
     # Format x-axis labels to be positive
     ticks = ax.get_xticks()
+    ax.set_xticks(ticks)
     ax.set_xticklabels([f'{abs(int(tick)):,}' for tick in ticks])
     
     # Add legend
@@ -151,10 +155,6 @@ def create_population_pyramid(df, partner_id=None, output_file='population_pyram
            verticalalignment='top',
            bbox=dict(boxstyle='round', facecolor='white', alpha=0.8, edgecolor='#475569'))
     
-    plt.tight_layout()
-    plt.savefig(output_file, dpi=300, bbox_inches='tight', facecolor=fig.get_facecolor())
-    plt.close(fig) # Close the figure to free memory
-    
     return {
         'total_clients': total_clients,
         'male_count': total_male,
@@ -164,26 +164,198 @@ def create_population_pyramid(df, partner_id=None, output_file='population_pyram
         'female_by_age': female_counts.tolist()
     }
 
-def main():
-    partner_id = os.getenv('PARTNER_ID')
-    output_file = os.getenv('OUTPUT_FILE', 'population_pyramid.png')
+def save_population_pyramid(fig, output_file):
+    """Write the current pyramid to a PNG"""
+    fig.tight_layout()
+    fig.savefig(output_file, dpi=300, bbox_inches='tight', facecolor=fig.get_facecolor())
+
+def create_population_pyramid(df, partner_id=None, output_file='population_pyramid.png'):
+    """Create population pyramid visualization"""
     
-    if len(sys.argv) > 1:
-        partner_id = sys.argv[1]
-    if len(sys.argv) > 2:
-        output_file = sys.argv[2]
+    # Set style
+    plt = load_plotting()
+    
+    # Male/Female counts per age group
+    grouped = pyramid_counts(df)
+    
+    # Create the plot
+    fig, ax = plt.subplots()
+    stats = draw_population_pyramid(fig, ax, grouped, partner_id)
+    save_population_pyramid(fig, output_file)
+    plt.close(fig) # Close the figure to free memory
+    
+    return stats
+
+# Batch mode: each pool worker keeps one figure/Axes and redraws it per partner
+_worker_figure = None
+
+def init_render_worker():
+    """Pool initializer: set the style and create the worker's figure once"""
+    global _worker_figure
+    _worker_figure = load_plotting().subplots()
+
+def render_partner(task):
+    """Render one partner's pyramid on the worker's figure; returns (partner_id, stats)"""
+    partner_id, df, output_file = task
+    fig, ax = _worker_figure
+    stats = draw_population_pyramid(fig, ax, pyramid_counts(df), partner_id)
+    save_population_pyramid(fig, output_file)
+    return partner_id, stats
+
+def partner_output_file(output_dir, partner_id, fmt='png'):
+    return os.path.join(output_dir, f'population_pyramid_{partner_id}.{fmt}')
+
+def export_all_partners(output_dir='.', fmt='json', stats_file=None):
+    """Fetch every partner's counts in one query and write their series (json) or SVGs (svg)"""
+    conn = get_db_connection()
+    if conn is None:
+        return {}
+    start = time.perf_counter()
+    rows = fetch_all_partner_count_rows(conn)
+    results = {partner_id: pyramid_series(partner_rows) for partner_id, partner_rows in rows.items()}
+    print(f"✓ Fetched counts for {len(results)} partners in {time.perf_counter() - start:.2f}s")
+    if not results:
+        return {}
+
+    os.makedirs(output_dir, exist_ok=True)
+    if fmt == 'svg':
+        for partner_id, stats in results.items():
+            write_series(stats, partner_id, partner_output_file(output_dir, partner_id, 'svg'), 'svg')
+        print(f"✓ Wrote {len(results)} SVG pyramids to {output_dir}")
+
+    stats_file = stats_file or os.path.join(output_dir, 'population_pyramids.json')
+    with open(stats_file, 'w', encoding='utf-8') as f:
+        json.dump({partner_id: results[partner_id] for partner_id in sorted(results)}, f, separators=(',', ':'))
+    print(f"✓ Stats for all partners saved to {stats_file}")
+    return results
+
+def render_all_partners(output_dir='.', workers=None, stats_file=None, cache=None):
+    """Fetch every partner's counts in one query and render them across a process pool
+
+    With a cache, partners whose data version is unchanged are copied from it
+    and only the remaining partners are queried and rendered.
+    """
+    conn = get_db_connection()
+    if conn is None:
+        return {}
+    os.makedirs(output_dir, exist_ok=True)
+    results = {}
+    start = time.perf_counter()
+    if cache is None:
+        counts = fetch_all_partner_counts(conn)
+    else:
+        versions = fetch_versions(conn)
+        for partner_id, version in versions.items():
+            stats = cache.get(partner_id, version, partner_output_file(output_dir, partner_id))
+            if stats is not None:
+                results[partner_id] = stats
+        counts = fetch_all_partner_counts(conn, [p for p in versions if p not in results])
+    if cache is not None:
+        print(f"✓ Reused {len(results)} cached pyramids")
+    print(f"✓ Fetched counts for {len(counts)} partners in {time.perf_counter() - start:.2f}s")
+
+    tasks = [(partner_id, df, partner_output_file(output_dir, partner_id))
+             for partner_id, df in counts.items()]
+    if tasks:
+        workers = max(1, min(workers or os.cpu_count() or 1, len(tasks)))
+        start = time.perf_counter()
+        with multiprocessing.Pool(processes=workers, initializer=init_render_worker) as pool:
+            rendered = dict(pool.imap_unordered(render_partner, tasks, chunksize=max(1, len(tasks) // (workers * 4))))
+        print(f"✓ Rendered {len(rendered)} pyramids with {workers} workers in {time.perf_counter() - start:.2f}s")
+        if cache is not None:
+            for partner_id, stats in rendered.items():
+                cache.put(partner_id, versions[partner_id], partner_output_file(output_dir, partner_id), stats)
+        results.update(rendered)
+    if not results:
+        return {}
+
+    stats_file = stats_file or os.path.join(output_dir, 'population_pyramids.json')
+    with open(stats_file, 'w', encoding='utf-8') as f:
+        json.dump({partner_id: results[partner_id] for partner_id in sorted(results)}, f, indent=2)
+    print(f"✓ Stats for all partners saved to {stats_file}")
+    return results
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Generate the client population pyramid chart')
+    parser.add_argument('partner_id', nargs='?', default=os.getenv('PARTNER_ID'),
+                        help='Partner ID (default: $PARTNER_ID or all partners)')
+    parser.add_argument('output_file', nargs='?', default=os.getenv('OUTPUT_FILE'),
+                        help='Output file (default: $OUTPUT_FILE or population_pyramid.<format>)')
+    parser.add_argument('--format', choices=OUTPUT_FORMATS, default='png',
+                        help='png = matplotlib chart, json = binned series only, svg = small chart without matplotlib')
+    parser.add_argument('--fetch', choices=FETCH_MODES, default='aggregate',
+                        help='aggregate = age groups counted by MySQL, rows = every client binned with pandas')
+    parser.add_argument('--compare', action='store_true',
+                        help='Fetch with both modes, check they agree and exit')
+    parser.add_argument('--all-partners', action='store_true',
+                        help='Render population_pyramid_<partner>.png for every partner from one query')
+    parser.add_argument('--output-dir', default='.',
+                        help='Directory for --all-partners images and stats (default: .)')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='Rendering processes for --all-partners (default: CPU count)')
+    parser.add_argument('--stats-file', default=None,
+                        help='Combined stats JSON for --all-partners (default: <output-dir>/population_pyramids.json)')
+    add_cache_arguments(parser)
+    args = parser.parse_args()
+    partner_id = args.partner_id
+    output_file = args.output_file or f'population_pyramid.{args.format}'
+    cache = PyramidCache.from_args('generate', args) if args.format == 'png' else None
+
+    if args.all_partners and args.format != 'png':
+        try:
+            export_all_partners(args.output_dir, args.format, args.stats_file)
+        except Error as e:
+            print(f"❌ Database error: {e}")
+        return
+
+    if args.all_partners:
+        try:
+            render_all_partners(args.output_dir, args.workers, args.stats_file, cache)
+        except Error as e:
+            print(f"❌ Database error: {e}")
+        finally:
+            if cache is not None:
+                cache.save()
+                cache.report()
+        return
+
+    if args.compare:
+        conn = get_db_connection()
+        if conn is not None:
+            compare_fetch_modes(conn, partner_id)
+        return
     
     print(f"Fetching client data for partner {partner_id if partner_id else 'All Partners'}...")
     try:
-        df = fetch_client_data(partner_id)
-        if df.empty:
-            print("❌ No client data found for the specified partner or in the database.")
-            return
+        stats = version = None
+        if cache is not None:
+            conn = get_db_connection()
+            if conn is not None:
+                version = fetch_version(conn, partner_id)
+                stats = cache.get(partner_id, version, output_file)
         
-        print(f"✓ Found {len(df)} clients with age and gender data")
-        
-        # Create pyramid
-        stats = create_population_pyramid(df, partner_id, output_file)
+        if args.format != 'png':
+            stats = fetch_series_data(partner_id, args.fetch)
+            if not stats or not stats['age_groups']:
+                print("❌ No client data found for the specified partner or in the database.")
+                return
+            write_series(stats, partner_id, output_file, args.format)
+        elif stats is not None:
+            print("✓ Clients unchanged since the last render, reusing the cached pyramid")
+        else:
+            df = fetch_client_data(partner_id, args.fetch)
+            if df.empty:
+                print("❌ No client data found for the specified partner or in the database.")
+                return
+            
+            print(f"✓ Found {client_total(df)} clients with age and gender data")
+            
+            # Create pyramid
+            stats = create_population_pyramid(df, partner_id, output_file)
+            if version is not None:
+                cache.put(partner_id, version, output_file, stats)
         
         # Print summary
         print("\n" + "="*50)
@@ -202,12 +374,16 @@ def main():
         
         print(f"✓ Population pyramid saved to {output_file}")
         
-    except mysql.connector.Error as e:
+    except Error as e:
         print(f"❌ Database error: {e}")
         return
     except Exception as e:
         print(f"❌ Error: {e}")
         return
+    finally:
+        if cache is not None:
+            cache.save()
+            cache.report()
 
 if __name__ == "__main__":
     main()
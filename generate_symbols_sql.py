@@ -2,85 +2,92 @@
 """
 Generate SQL INSERT statements from symbols CSV file
 This creates a .sql file that can be imported into MySQL
+
+    python3 generate_symbols_sql.py [CSV_FILE] [OUTPUT_FILE] [--shards N] [--format tsv] [--compress zstd]
+
+See sql_dump.py for statement sizing, --shards, --format tsv and --compress.
+The CSV itself may be gzip/bz2/zstd.
 """
 
+import argparse
 import csv
+import os
 import sys
+from compressed_io import open_input_text
+from sql_dump import (DEFAULT_STATEMENT_BYTES, SQLDumpWriter, add_dump_arguments,
+                      check_dump_arguments, print_load_instructions)
+
+SYMBOL_COLUMNS = [
+    'platform', 'symbol', 'unified_symbol', 'unified_asset_type', 'unified_asset_sub_type',
+    'unified_category', 'platform_symbol_unified_symbol', 'duplicate_check', 'validation_check'
+]
+
+def text(value):
+    """String, or None (NULL) when empty"""
+    return value if value else None
 
-def escape_sql_string(value):
-    """Escape string for SQL"""
-    if value is None or value == '':
-        return 'NULL'
-    # Escape single quotes and backslashes
-    value = str(value).replace('\\', '\\\\').replace("'", "\\'")
-    return f"'{value}'"
+def check_value(value):
+    """Duplicate/validation check column (0 when empty)"""
+    try:
+        return int(float(value)) if value else 0
+    except ValueError:
+        return 0
+
+def symbol_values(row):
+    """Values in SYMBOL_COLUMNS order for one CSV row"""
+    return (
+        text(row['platform']),
+        text(row['symbol']),
+        text(row['unified_symbol']),
+        text(row['unified_asset_type']),
+        text(row['unified_asset_sub_type']),
+        text(row['unified_category']),
+        text(row['platform_symbol_unified_symbol']),
+        check_value(row['Duplicate check']),
+        check_value(row['Validation check'])
+    )
 
-def generate_sql(csv_file_path, output_file):
+def generate_sql(csv_file_path, output_file, fmt='insert', shards=1,
+                 max_statement_bytes=DEFAULT_STATEMENT_BYTES, compress=None):
     """Generate SQL from CSV file"""
     print(f"Reading CSV file: {csv_file_path}")
     
-    with open(csv_file_path, 'r', encoding='utf-8') as file:
+    with open_input_text(csv_file_path) as file:
         csv_reader = csv.DictReader(file)
+        header = ["-- Symbols Data Import", f"-- Generated from {os.path.basename(csv_file_path)}"]
         
-        # Open output file
-        with open(output_file, 'w', encoding='utf-8') as sql_file:
-            # Write header
-            sql_file.write("-- Symbols Data Import\n")
-            sql_file.write("-- Generated from symbols.csv\n\n")
-            sql_file.write("USE partner_report;\n\n")
-            sql_file.write("-- Disable foreign key checks for faster import\n")
-            sql_file.write("SET FOREIGN_KEY_CHECKS = 0;\n")
-            sql_file.write("SET UNIQUE_CHECKS = 0;\n")
-            sql_file.write("SET AUTOCOMMIT = 0;\n\n")
-            
+        with SQLDumpWriter(output_file, 'symbols', SYMBOL_COLUMNS, header, None, fmt,
+                           shards, max_statement_bytes, compress=compress) as writer:
             count = 0
-            batch_size = 100
-            values = []
             
             for row in csv_reader:
-                # Build value tuple
-                value_tuple = (
-                    escape_sql_string(row['platform']),
-                    escape_sql_string(row['symbol']),
-                    escape_sql_string(row['unified_symbol']),
-                    escape_sql_string(row['unified_asset_type']),
-                    escape_sql_string(row['unified_asset_sub_type']),
-                    escape_sql_string(row['unified_category']),
-                    escape_sql_string(row['platform_symbol_unified_symbol']),
-                    row['Duplicate check'] if row['Duplicate check'] else '0',
-                    row['Validation check'] if row['Validation check'] else '0'
-                )
-                
-                values.append(f"({', '.join(value_tuple)})")
+                writer.add(symbol_values(row))
                 count += 1
-                
-                # Write in batches
-                if len(values) >= batch_size:
-                    sql_file.write("INSERT INTO symbols (platform, symbol, unified_symbol, unified_asset_type, unified_asset_sub_type, unified_category, platform_symbol_unified_symbol, duplicate_check, validation_check) VALUES\n")
-                    sql_file.write(',\n'.join(values))
-                    sql_file.write(";\n\n")
-                    values = []
-                    print(f"  Generated {count} INSERT statements...", end='\r')
-            
-            # Write remaining values
-            if values:
-                sql_file.write("INSERT INTO symbols (platform, symbol, unified_symbol, unified_asset_type, unified_asset_sub_type, unified_category, platform_symbol_unified_symbol, duplicate_check, validation_check) VALUES\n")
-                sql_file.write(',\n'.join(values))
-                sql_file.write(";\n\n")
+                if count % 10000 == 0:
+                    print(f"  Generated {count} rows...", end='\r')
             
             # Write footer
-            sql_file.write("COMMIT;\n")
-            sql_file.write("SET FOREIGN_KEY_CHECKS = 1;\n")
-            sql_file.write("SET UNIQUE_CHECKS = 1;\n")
-            sql_file.write("SET AUTOCOMMIT = 1;\n\n")
-            sql_file.write(f"-- Total records: {count}\n")
+            paths = writer.close([f"-- Total records: {count}"])
             
-            print(f"\n✓ Generated {count} INSERT statements")
-            print(f"✓ SQL file created: {output_file}")
+            print(f"\n✓ Generated {count} rows in {writer.statements} statements")
+            for path in paths:
+                print(f"✓ File created: {path}")
+            if compress:
+                for line in writer.report():
+                    print(f"  {line}")
+    return paths
 
 if __name__ == "__main__":
-    csv_file = '/Users/michalisphytides/Downloads/symbols.csv'
-    output_file = '/Users/michalisphytides/Desktop/partner-report/symbols_data.sql'
+    parser = argparse.ArgumentParser(description='Generate a symbols SQL dump from CSV')
+    parser.add_argument('csv_file', nargs='?', default='/Users/michalisphytides/Downloads/symbols.csv',
+                        help='Path to symbols CSV')
+    parser.add_argument('output_file', nargs='?',
+                        default='/Users/michalisphytides/Desktop/partner-report/symbols_data.sql',
+                        help='SQL file to write')
+    add_dump_arguments(parser)
+    args = parser.parse_args()
+    check_dump_arguments(parser, args)
+    csv_file, output_file = args.csv_file, args.output_file
     
     print("=" * 60)
     print("Symbol SQL Generator")
@@ -88,13 +95,13 @@ if __name__ == "__main__":
     print()
     
     try:
-        generate_sql(csv_file, output_file)
+        paths = generate_sql(csv_file, output_file, args.format, args.shards, args.max_statement_bytes,
+                             args.compress)
         
         print("\n" + "=" * 60)
         print("SQL file generated successfully!")
         print("=" * 60)
-        print("\nTo import into MySQL, run:")
-        print(f"  mysql -u root -p partner_report < {output_file}")
+        print_load_instructions(paths, args.format)
         print()
         
     except FileNotFoundError:
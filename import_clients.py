@@ -1,26 +1,34 @@
 #!/usr/bin/env python3
 """
 Import clients from CSV file into MySQL database
+
+Writes the legacy clients layout (customer_id, partner_id). The cube
+triggers and cube_refresh.BulkCubeSession work on the current layout
+(binary_user_id, partnerId), so there is no --defer-cubes here; use
+import_clients2.py --defer-cubes for a database with the cubes.
 """
 
-import csv
-import mysql.connector
-from mysql.connector import Error
+import argparse
+from db import Error, connect
 from datetime import datetime
 import sys
+from batch_writer import BatchWriter, add_batch_arguments, update_all_columns
+from checkpoint import ImportCheckpoint, add_resume_argument, iter_csv_rows
+from delta_ingest import DeltaTracker, add_delta_argument
+from import_stats import ImportStats, add_verify_argument
+from ingest_metrics import IngestMetrics, add_metrics_arguments
 
-# Database configuration
-DB_CONFIG = {
-    'host': 'localhost',
-    'database': 'partner_report',
-    'user': 'root',
-    'password': ''  # Update if you have a password
-}
+CLIENT_COLUMNS = [
+    'customer_id', 'name', 'country', 'join_date', 'account_type',
+    'account_number', 'lifetime_deposits', 'commission_plan',
+    'tracking_link_used', 'tier', 'sub_partner', 'partner_id',
+    'email', 'preferred_language', 'gender', 'age'
+]
 
 def create_connection():
     """Create database connection"""
     try:
-        connection = mysql.connector.connect(**DB_CONFIG)
+        connection = connect()
         if connection.is_connected():
             print("✓ Connected to MySQL database")
             return connection
@@ -61,156 +69,163 @@ def parse_int(int_str):
     except:
         return None
 
-def import_clients(csv_file_path):
+def print_import_statistics(stats):
+    """Statistics of the rows read in this run, collected while importing"""
+    print(f"\n📊 Import Statistics (rows read this run):")
+    print(f"  Clients: {stats.rows:,}")
+    print(f"  Unique countries: {stats.distinct('country')}")
+    print(f"  Unique partners: {stats.distinct('partner_id')}")
+    print(f"  Total lifetime deposits: ${stats.sum('lifetime_deposits'):,.2f}")
+    
+    print(f"\n🌍 Top 5 Countries by Clients:")
+    for country, count in stats.most_common('country', 5):
+        print(f"  {country}: {count}")
+    
+    print(f"\n👥 Gender Distribution:")
+    for gender, count in stats.most_common('gender', skip_empty=True):
+        print(f"  {gender}: {count}")
+
+def print_database_statistics(cursor):
+    """Statistics of the whole clients table (--verify; full table scans)"""
+    cursor.execute("SELECT COUNT(*) FROM clients")
+    total = cursor.fetchone()[0]
+    
+    cursor.execute("SELECT COUNT(DISTINCT country) FROM clients")
+    countries = cursor.fetchone()[0]
+    
+    cursor.execute("SELECT COUNT(DISTINCT partner_id) FROM clients WHERE partner_id IS NOT NULL")
+    partners = cursor.fetchone()[0]
+    
+    cursor.execute("SELECT SUM(lifetime_deposits) FROM clients")
+    total_deposits = cursor.fetchone()[0] or 0
+    
+    print(f"\n📊 Database Statistics (--verify):")
+    print(f"  Total clients: {total}")
+    print(f"  Unique countries: {countries}")
+    print(f"  Unique partners: {partners}")
+    print(f"  Total lifetime deposits: ${total_deposits:,.2f}")
+    
+    # Show top countries
+    print(f"\n🌍 Top 5 Countries by Clients:")
+    cursor.execute("""
+        SELECT country, COUNT(*) as count 
+        FROM clients 
+        GROUP BY country 
+        ORDER BY count DESC 
+        LIMIT 5
+    """)
+    for country, count in cursor.fetchall():
+        print(f"  {country}: {count}")
+    
+    # Show gender distribution
+    print(f"\n👥 Gender Distribution:")
+    cursor.execute("""
+        SELECT gender, COUNT(*) as count 
+        FROM clients 
+        WHERE gender IS NOT NULL AND gender != ''
+        GROUP BY gender 
+        ORDER BY count DESC
+    """)
+    for gender, count in cursor.fetchall():
+        print(f"  {gender}: {count}")
+
+def import_clients(csv_file_path, batch_size=1000, commit_every=10000, resume=False,
+                   delta=False, verify=False, pipeline_depth=0, metrics=None,
+                   reject_file=None):
     """Import clients from CSV file"""
+    metrics = metrics or IngestMetrics('clients', csv_file_path)
     connection = create_connection()
     cursor = connection.cursor()
     
     try:
         # Read CSV file
         print(f"\nReading CSV file: {csv_file_path}")
-        with open(csv_file_path, 'r', encoding='utf-8') as file:
-            csv_reader = csv.DictReader(file)
-            
-            # Prepare insert statement (with ON DUPLICATE KEY UPDATE)
-            insert_query = """
-                INSERT INTO clients (
-                    customer_id, name, country, join_date, account_type, 
-                    account_number, lifetime_deposits, commission_plan, 
-                    tracking_link_used, tier, sub_partner, partner_id, 
-                    email, preferred_language, gender, age
-                ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-                ON DUPLICATE KEY UPDATE
-                    name = VALUES(name),
-                    country = VALUES(country),
-                    join_date = VALUES(join_date),
-                    account_type = VALUES(account_type),
-                    account_number = VALUES(account_number),
-                    lifetime_deposits = VALUES(lifetime_deposits),
-                    commission_plan = VALUES(commission_plan),
-                    tracking_link_used = VALUES(tracking_link_used),
-                    tier = VALUES(tier),
-                    sub_partner = VALUES(sub_partner),
-                    partner_id = VALUES(partner_id),
-                    email = VALUES(email),
-                    preferred_language = VALUES(preferred_language),
-                    gender = VALUES(gender),
-                    age = VALUES(age)
-            """
-            
-            # Import data
-            count = 0
-            skipped = 0
-            updated = 0
-            batch = []
-            batch_size = 100
-            
-            for row in csv_reader:
-                # Skip rows without customer ID
-                if not row.get('binary_user_id'):
-                    skipped += 1
-                    continue
-                
-                # Extract and transform data
-                customer_id = str(row['binary_user_id']).strip()
-                name = row.get('name', '').strip()
-                country = row.get('country', '').strip()
-                join_date = parse_date(row.get('joinDate', ''))
-                account_type = row.get('account_type', '').strip()
-                account_number = row.get('accountNumber', '').strip()
-                lifetime_deposits = parse_decimal(row.get('lifetimeDeposits', '0'))
-                commission_plan = row.get('commissionPlan', '').strip()
-                tracking_link_used = row.get('trackingLinkUsed', '').strip()
-                tier = row.get('tier', '').strip()
-                sub_partner = parse_boolean(row.get('sub-partner', 'FALSE'))
-                partner_id = row.get('partnerId', '').strip() or None
-                email = row.get('email', '').strip()
-                preferred_language = row.get('preferredLanguage', '').strip()
-                gender = row.get('gender', '').strip()
-                age = parse_int(row.get('age', ''))
-                
-                # Prepare data tuple
-                data = (
-                    customer_id,
-                    name,
-                    country,
-                    join_date,
-                    account_type,
-                    account_number,
-                    lifetime_deposits,
-                    commission_plan,
-                    tracking_link_used,
-                    tier,
-                    sub_partner,
-                    partner_id,
-                    email,
-                    preferred_language,
-                    gender,
-                    age
-                )
-                
-                batch.append(data)
-                count += 1
-                
-                # Insert in batches for better performance
-                if len(batch) >= batch_size:
-                    cursor.executemany(insert_query, batch)
-                    connection.commit()
-                    print(f"  Imported {count} clients...", end='\r')
-                    batch = []
-            
-            # Insert remaining records
-            if batch:
-                cursor.executemany(insert_query, batch)
-                connection.commit()
-            
-            print(f"\n✓ Successfully imported {count} clients")
-            if skipped > 0:
-                print(f"  Skipped {skipped} rows (no customer ID)")
-            
-            # Get statistics
-            cursor.execute("SELECT COUNT(*) FROM clients")
-            total = cursor.fetchone()[0]
-            
-            cursor.execute("SELECT COUNT(DISTINCT country) FROM clients")
-            countries = cursor.fetchone()[0]
-            
-            cursor.execute("SELECT COUNT(DISTINCT partner_id) FROM clients WHERE partner_id IS NOT NULL")
-            partners = cursor.fetchone()[0]
+        checkpoint = ImportCheckpoint(connection, 'clients', csv_file_path)
+        start = checkpoint.start(resume)
+        csv_reader = [] if checkpoint.completed else iter_csv_rows(csv_file_path, start)
+        csv_reader = metrics.timed_iter('read', csv_reader)
+        tracker = DeltaTracker(connection, 'clients', CLIENT_COLUMNS, ('customer_id',)) if delta else None
+        
+        # Import data
+        skipped = 0
+        stats = ImportStats(CLIENT_COLUMNS, distinct=('country', 'partner_id'),
+                            sums=('lifetime_deposits',), groups=('country', 'gender'))
+        writer = BatchWriter(
+            connection, 'clients', CLIENT_COLUMNS, batch_size, commit_every,
+            on_duplicate=update_all_columns(CLIENT_COLUMNS, key_columns=('customer_id',)),
+            label='clients', checkpoint=checkpoint, pipeline_depth=pipeline_depth,
+            metrics=metrics, reject_file=reject_file
+        )
+        
+        for row, offset in csv_reader:
+            writer.advance(offset)
+            # Skip rows without customer ID
+            if not row.get('binary_user_id'):
+                skipped += 1
+                continue
             
-            cursor.execute("SELECT SUM(lifetime_deposits) FROM clients")
-            total_deposits = cursor.fetchone()[0] or 0
+            # Extract and transform data
+            customer_id = str(row['binary_user_id']).strip()
+            name = row.get('name', '').strip()
+            country = row.get('country', '').strip()
+            join_date = parse_date(row.get('joinDate', ''))
+            account_type = row.get('account_type', '').strip()
+            account_number = row.get('accountNumber', '').strip()
+            lifetime_deposits = parse_decimal(row.get('lifetimeDeposits', '0'))
+            commission_plan = row.get('commissionPlan', '').strip()
+            tracking_link_used = row.get('trackingLinkUsed', '').strip()
+            tier = row.get('tier', '').strip()
+            sub_partner = parse_boolean(row.get('sub-partner', 'FALSE'))
+            partner_id = row.get('partnerId', '').strip() or None
+            email = row.get('email', '').strip()
+            preferred_language = row.get('preferredLanguage', '').strip()
+            gender = row.get('gender', '').strip()
+            age = parse_int(row.get('age', ''))
             
-            print(f"\n📊 Database Statistics:")
-            print(f"  Total clients: {total}")
-            print(f"  Unique countries: {countries}")
-            print(f"  Unique partners: {partners}")
-            print(f"  Total lifetime deposits: ${total_deposits:,.2f}")
+            # Prepare data tuple
+            data = (
+                customer_id,
+                name,
+                country,
+                join_date,
+                account_type,
+                account_number,
+                lifetime_deposits,
+                commission_plan,
+                tracking_link_used,
+                tier,
+                sub_partner,
+                partner_id,
+                email,
+                preferred_language,
+                gender,
+                age
+            )
             
-            # Show top countries
-            print(f"\n🌍 Top 5 Countries by Clients:")
-            cursor.execute("""
-                SELECT country, COUNT(*) as count 
-                FROM clients 
-                GROUP BY country 
-                ORDER BY count DESC 
-                LIMIT 5
-            """)
-            for country, count in cursor.fetchall():
-                print(f"  {country}: {count}")
+            stats.add(data)
             
-            # Show gender distribution
-            print(f"\n👥 Gender Distribution:")
-            cursor.execute("""
-                SELECT gender, COUNT(*) as count 
-                FROM clients 
-                WHERE gender IS NOT NULL AND gender != ''
-                GROUP BY gender 
-                ORDER BY count DESC
-            """)
-            for gender, count in cursor.fetchall():
-                print(f"  {gender}: {count}")
+            # Delta mode: skip rows identical to the last import
+            if tracker is not None and not tracker.changed(data):
+                continue
             
+            writer.add(data)
+        
+        # Insert remaining records
+        writer.finish()
+        writer.close()
+        if tracker is not None:
+            tracker.finish(writer.errors == 0)
+        
+        print(f"\n✓ Successfully imported {writer.written} clients")
+        if writer.errors > 0:
+            print(f"  Failed to write {writer.errors} rows")
+        if skipped > 0:
+            print(f"  Skipped {skipped} rows (no customer ID)")
+        
+        print_import_statistics(stats)
+        if verify:
+            print_database_statistics(cursor)
+        
     except FileNotFoundError:
         print(f"✗ Error: File not found: {csv_file_path}")
         sys.exit(1)
@@ -231,13 +246,26 @@ def import_clients(csv_file_path):
             print("\n✓ Database connection closed")
 
 if __name__ == "__main__":
-    csv_file = '/Users/michalisphytides/Downloads/clients1.csv'
+    parser = argparse.ArgumentParser(description='Import clients CSV into the clients table')
+    parser.add_argument('csv_file', nargs='?', default='/Users/michalisphytides/Downloads/clients1.csv',
+                        help='Path to clients CSV')
+    add_batch_arguments(parser, pipeline=True, rejects=True)
+    add_resume_argument(parser)
+    add_delta_argument(parser)
+    add_verify_argument(parser)
+    add_metrics_arguments(parser)
+    args = parser.parse_args()
+    if args.delta and args.resume:
+        parser.error('--delta reads the whole file to find deleted keys and cannot be combined with --resume')
     
     print("=" * 60)
     print("Client Import Tool")
     print("=" * 60)
     
-    import_clients(csv_file)
+    metrics = IngestMetrics('clients', args.csv_file)
+    import_clients(args.csv_file, args.batch_size, args.commit_every, args.resume, args.delta, args.verify,
+                   args.pipeline_depth, metrics, args.reject_file)
+    metrics.finish(args)
     
     print("\n" + "=" * 60)
     print("Import completed successfully!")
@@ -3,124 +3,170 @@
 Import clients2.csv into MySQL clients table
 """
 
-import csv
-import mysql.connector
+import argparse
+import time
+from db import connect
 from datetime import datetime
+from batch_writer import BatchAborted, BatchWriter, add_batch_arguments
+from checkpoint import CheckpointError, ImportCheckpoint, add_resume_argument, iter_csv_rows
+from cube_refresh import BulkCubeSession, add_cube_arguments
+from ingest_metrics import IngestMetrics, add_metrics_arguments
 
-# Database connection
-conn = mysql.connector.connect(
-    host='localhost',
-    user='root',
-    password='',
-    database='partner_report'
-)
+CSV_FILE = '/Users/michalisphytides/Downloads/clients2.csv'
 
-cursor = conn.cursor()
+CLIENT_COLUMNS = [
+    'binary_user_id', 'name', 'email', 'country', 'joinDate', 'partnerId',
+    'tier', 'gender', 'age', 'account_type', 'accountNumber', 'sub_partner',
+    'preferredLanguage', 'commissionPlan', 'trackingLinkUsed',
+    'total_trades', 'lifetimeDeposits', 'PNL'
+]
 
-# Read CSV file
-csv_file = '/Users/michalisphytides/Downloads/clients2.csv'
-imported = 0
-errors = 0
+def parse_client_row(row):
+    """Convert a CSV row into a tuple in CLIENT_COLUMNS order (None to skip the row)"""
+    # Clean and prepare data
+    binary_user_id = row.get('binary_user_id', '').strip()
+    name = row.get('name', '').strip()
+    email = row.get('email', '').strip() or None
+    country = row.get('country', '').strip() or None
 
-print(f"Starting import from {csv_file}...")
-
-with open(csv_file, 'r', encoding='utf-8') as f:
-    reader = csv.DictReader(f)
-    
-    for row in reader:
+    # Parse date
+    joinDate = row.get('joinDate', '').strip()
+    if joinDate:
         try:
-            # Clean and prepare data
-            binary_user_id = row.get('binary_user_id', '').strip()
-            name = row.get('name', '').strip()
-            email = row.get('email', '').strip() or None
-            country = row.get('country', '').strip() or None
-            
-            # Parse date
-            joinDate = row.get('joinDate', '').strip()
-            if joinDate:
-                try:
-                    joinDate = datetime.strptime(joinDate, '%Y-%m-%d').date()
-                except:
-                    joinDate = None
-            else:
-                joinDate = None
-            
-            partnerId = row.get('partnerId', '').strip() or None
-            tier = row.get('tier', '').strip() or None
-            gender = row.get('gender', '').strip() or None
-            
-            # Age
-            age_str = row.get('age', '').strip()
-            age = int(age_str) if age_str and age_str.isdigit() else None
-            
-            account_type = row.get('account_type', '').strip() or None
-            accountNumber = row.get('accountNumber\t', '').strip() or row.get('accountNumber', '').strip() or None
-            
-            # Boolean
-            sub_partner_str = row.get('sub-partner\t', '').strip() or row.get('sub-partner', '').strip() or 'FALSE'
-            sub_partner = 1 if sub_partner_str.upper() == 'TRUE' else 0
-            
-            preferredLanguage = row.get('preferredLanguage\t', '').strip() or row.get('preferredLanguage', '').strip() or None
-            commissionPlan = row.get('commissionPlan', '').strip() or None
-            trackingLinkUsed = row.get('trackingLinkUsed', '').strip() or None
-            
-            # Numeric fields
-            total_trades_str = row.get('total_trades', '').strip()
-            total_trades = int(total_trades_str) if total_trades_str and total_trades_str.isdigit() else None
-            
-            lifetimeDeposits_str = row.get('lifetimeDeposits\t', '').strip() or row.get('lifetimeDeposits', '').strip()
-            try:
-                lifetimeDeposits = float(lifetimeDeposits_str) if lifetimeDeposits_str else None
-            except:
-                lifetimeDeposits = None
-            
-            PNL_str = row.get('PNL', '').strip()
+            joinDate = datetime.strptime(joinDate, '%Y-%m-%d').date()
+        except:
+            joinDate = None
+    else:
+        joinDate = None
+
+    partnerId = row.get('partnerId', '').strip() or None
+    tier = row.get('tier', '').strip() or None
+    gender = row.get('gender', '').strip() or None
+
+    # Age
+    age_str = row.get('age', '').strip()
+    age = int(age_str) if age_str and age_str.isdigit() else None
+
+    account_type = row.get('account_type', '').strip() or None
+    accountNumber = row.get('accountNumber\t', '').strip() or row.get('accountNumber', '').strip() or None
+
+    # Boolean
+    sub_partner_str = row.get('sub-partner\t', '').strip() or row.get('sub-partner', '').strip() or 'FALSE'
+    sub_partner = 1 if sub_partner_str.upper() == 'TRUE' else 0
+
+    preferredLanguage = row.get('preferredLanguage\t', '').strip() or row.get('preferredLanguage', '').strip() or None
+    commissionPlan = row.get('commissionPlan', '').strip() or None
+    trackingLinkUsed = row.get('trackingLinkUsed', '').strip() or None
+
+    # Numeric fields
+    total_trades_str = row.get('total_trades', '').strip()
+    total_trades = int(total_trades_str) if total_trades_str and total_trades_str.isdigit() else None
+
+    lifetimeDeposits_str = row.get('lifetimeDeposits\t', '').strip() or row.get('lifetimeDeposits', '').strip()
+    try:
+        lifetimeDeposits = float(lifetimeDeposits_str) if lifetimeDeposits_str else None
+    except:
+        lifetimeDeposits = None
+
+    PNL_str = row.get('PNL', '').strip()
+    try:
+        PNL = float(PNL_str) if PNL_str else None
+    except:
+        PNL = None
+
+    # Skip if no binary_user_id
+    if not binary_user_id:
+        return None
+
+    return (
+        binary_user_id, name, email, country, joinDate, partnerId,
+        tier, gender, age, account_type, accountNumber, sub_partner,
+        preferredLanguage, commissionPlan, trackingLinkUsed,
+        total_trades, lifetimeDeposits, PNL
+    )
+
+def import_clients(conn, csv_file, batch_size=1000, commit_every=10000, resume=False,
+                   cubes=None, pipeline_depth=0, metrics=None, reject_file=None):
+    """Import clients with batched multi-row INSERT statements"""
+    metrics = metrics or IngestMetrics('clients', csv_file)
+    checkpoint = ImportCheckpoint(conn, 'clients', csv_file)
+    start = checkpoint.start(resume)
+    if checkpoint.completed:
+        return 0, 0
+
+    errors = 0
+    parse = metrics.timed('parse', parse_client_row)
+
+    before_flush = None
+    if cubes:
+        before_flush = cubes.client_hook(CLIENT_COLUMNS.index('binary_user_id'),
+                                         CLIENT_COLUMNS.index('partnerId'))
+
+    with BatchWriter(conn, 'clients', CLIENT_COLUMNS, batch_size, commit_every, label='clients',
+                     checkpoint=checkpoint, before_flush=before_flush,
+                     pipeline_depth=pipeline_depth, metrics=metrics,
+                     reject_file=reject_file) as writer:
+        for row, offset in metrics.timed_iter('read', iter_csv_rows(csv_file, start)):
+            writer.advance(offset)
             try:
-                PNL = float(PNL_str) if PNL_str else None
-            except:
-                PNL = None
-            
-            # Skip if no binary_user_id
-            if not binary_user_id:
+                values = parse(row)
+            except Exception as e:
+                errors += 1
+                metrics.reject(type(e).__name__, f"client {row.get('binary_user_id', 'unknown')}: {e}")
                 continue
-            
-            # Insert into database
-            sql = """
-                INSERT INTO clients (
-                    binary_user_id, name, email, country, joinDate, partnerId,
-                    tier, gender, age, account_type, accountNumber, sub_partner,
-                    preferredLanguage, commissionPlan, trackingLinkUsed,
-                    total_trades, lifetimeDeposits, PNL
-                ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-            """
-            
-            cursor.execute(sql, (
-                binary_user_id, name, email, country, joinDate, partnerId,
-                tier, gender, age, account_type, accountNumber, sub_partner,
-                preferredLanguage, commissionPlan, trackingLinkUsed,
-                total_trades, lifetimeDeposits, PNL
-            ))
-            
-            imported += 1
-            if imported % 50 == 0:
-                print(f"  Imported {imported} clients...")
-            
-        except Exception as e:
-            errors += 1
-            print(f"  Error importing client {row.get('binary_user_id', 'unknown')}: {e}")
-
-# Commit changes
-conn.commit()
-
-print(f"\n✓ Import completed!")
-print(f"  Total imported: {imported}")
-print(f"  Total errors: {errors}")
-
-# Verify
-cursor.execute("SELECT COUNT(*) FROM clients")
-count = cursor.fetchone()[0]
-print(f"  Clients in database: {count}")
-
-cursor.close()
-conn.close()
+            if values is not None:
+                writer.add(values)
+        writer.finish()
+
+    return writer.written, errors + writer.errors
+
+def main():
+    parser = argparse.ArgumentParser(description='Import clients2 CSV into the clients table')
+    parser.add_argument('csv_file', nargs='?', default=CSV_FILE, help='Path to clients CSV')
+    add_batch_arguments(parser, pipeline=True, rejects=True)
+    add_resume_argument(parser)
+    add_cube_arguments(parser)
+    add_metrics_arguments(parser)
+    args = parser.parse_args()
+
+    # Database connection
+    conn = connect()
+    metrics = IngestMetrics('clients', args.csv_file)
+    cubes = BulkCubeSession(conn) if args.defer_cubes else None
+
+    print(f"Starting import from {args.csv_file}...")
+
+    try:
+        imported, errors = import_clients(conn, args.csv_file, args.batch_size,
+                                          args.commit_every, args.resume, cubes,
+                                          args.pipeline_depth, metrics, args.reject_file)
+    except CheckpointError as e:
+        print(f"✗ Cannot resume: {e}")
+        conn.close()
+        return
+    except BatchAborted as e:
+        print(f"✗ Import stopped: {e}")
+        conn.close()
+        return
+
+    if cubes:
+        start = time.perf_counter()
+        cubes.finish()
+        metrics.add_time('cube refresh', time.perf_counter() - start)
+
+    print(f"\n✓ Import completed!")
+    print(f"  Total imported: {imported}")
+    print(f"  Total errors: {errors}")
+    metrics.finish(args)
+
+    # Verify
+    cursor = conn.cursor()
+    cursor.execute("SELECT COUNT(*) FROM clients")
+    count = cursor.fetchone()[0]
+    print(f"  Clients in database: {count}")
+
+    cursor.close()
+    conn.close()
 
+if __name__ == "__main__":
+    main()
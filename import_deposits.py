@@ -3,108 +3,166 @@
 Import deposits1.csv into the deposits table
 """
 
-import csv
-import mysql.connector
-from datetime import datetime
+import argparse
+import time
+from db import connect
+from batch_writer import BatchAborted, BatchWriter, add_batch_arguments
+from checkpoint import (CheckpointError, ImportCheckpoint, add_resume_argument,
+                        iter_csv_rows, read_csv_fieldnames)
+from cube_refresh import BulkCubeSession, add_cube_arguments
+from ingest_metrics import IngestMetrics, add_metrics_arguments
 
-# Database connection
-db = mysql.connector.connect(
-    host="localhost",
-    user="root",
-    password="",
-    database="partner_report"
-)
+CSV_FILE = '/Users/michalisphytides/Downloads/deposits1.csv'
 
-cursor = db.cursor()
+def parse_deposit_row(headers, row):
+    """Convert a CSV row into a tuple in header order"""
+    # Convert empty strings to None
+    values = []
+    for header in headers:
+        value = row[header]
 
-csv_file = '/Users/michalisphytides/Downloads/deposits1.csv'
+        # Handle empty values
+        if value == '' or value == 'NULL':
+            values.append(None)
+        # Handle boolean-like values
+        elif value in ('TRUE', 'FALSE'):
+            values.append(value)
+        # Handle datetime
+        elif header == 'transaction_time' and value:
+            # Parse: 2025-07-01 03:33:11.481401 UTC
+            try:
+                dt_str = value.replace(' UTC', '')
+                # MySQL doesn't need microseconds precision beyond 6 digits
+                values.append(dt_str)
+            except:
+                values.append(None)
+        else:
+            values.append(value)
+    return tuple(values)
 
-print("Starting CSV import...")
+def import_deposits(db, csv_file, batch_size=1000, commit_every=10000, parser='rows',
+                    resume=False, max_errors=10, cubes=None, pipeline_depth=0, metrics=None,
+                    reject_file=None):
+    """Import deposits with batched multi-row INSERT statements"""
+    metrics = metrics or IngestMetrics('deposits', csv_file)
+    checkpoint = ImportCheckpoint(db, 'deposits', csv_file)
+    start = checkpoint.start(resume)
+    if checkpoint.completed:
+        return 0, 0
 
-# Read and import CSV
-with open(csv_file, 'r', encoding='utf-8') as f:
-    reader = csv.DictReader(f)
-    headers = reader.fieldnames
-    
+    headers, _ = read_csv_fieldnames(csv_file)
     print(f"CSV headers: {headers}")
-    
-    # Prepare INSERT statement
-    columns = ', '.join(headers)
-    placeholders = ', '.join(['%s'] * len(headers))
-    insert_query = f"INSERT INTO deposits ({columns}) VALUES ({placeholders})"
-    
-    batch = []
-    batch_size = 1000
-    total_imported = 0
+    before_flush = None
+    if cubes and 'affiliate_id' in headers:
+        before_flush = cubes.deposit_hook(headers.index('affiliate_id'))
+
     errors = 0
-    
-    for row_num, row in enumerate(reader, start=2):
-        try:
-            # Convert empty strings to None
-            values = []
-            for header in headers:
-                value = row[header]
-                
-                # Handle empty values
-                if value == '' or value == 'NULL':
-                    values.append(None)
-                # Handle boolean-like values
-                elif value in ('TRUE', 'FALSE'):
-                    values.append(value)
-                # Handle datetime
-                elif header == 'transaction_time' and value:
-                    # Parse: 2025-07-01 03:33:11.481401 UTC
-                    try:
-                        dt_str = value.replace(' UTC', '')
-                        # MySQL doesn't need microseconds precision beyond 6 digits
-                        values.append(dt_str)
-                    except:
-                        values.append(None)
-                else:
-                    values.append(value)
-            
-            batch.append(tuple(values))
-            
-            # Execute batch insert
-            if len(batch) >= batch_size:
-                cursor.executemany(insert_query, batch)
-                db.commit()
-                total_imported += len(batch)
-                print(f"Imported {total_imported} rows...")
-                batch = []
-                
-        except Exception as e:
-            errors += 1
-            print(f"Error on row {row_num}: {e}")
-            print(f"Row data: {row}")
-            if errors > 10:
-                print("Too many errors, stopping...")
-                break
-    
-    # Insert remaining batch
-    if batch:
-        try:
-            cursor.executemany(insert_query, batch)
-            db.commit()
-            total_imported += len(batch)
-        except Exception as e:
-            print(f"Error inserting final batch: {e}")
-
-print(f"\n✓ Import complete!")
-print(f"Total rows imported: {total_imported}")
-print(f"Errors encountered: {errors}")
-
-# Show summary
-cursor.execute("SELECT COUNT(*) FROM deposits")
-count = cursor.fetchone()[0]
-print(f"Total rows in deposits table: {count}")
-
-# Show sample data
-cursor.execute("SELECT * FROM deposits LIMIT 5")
-print("\nSample data:")
-for row in cursor.fetchall():
-    print(row)
-
-cursor.close()
-db.close()
 
+    def reject(row, e):
+        nonlocal errors
+        errors += 1
+        metrics.reject(type(e).__name__, f"{e} (row data: {row})")
+
+    if parser == 'vector':
+        from vector_parser import iter_deposit_blocks
+        # Commit once per parsed chunk so the checkpoint lands on a chunk boundary
+        with BatchWriter(db, 'deposits', headers, batch_size, None, label='rows',
+                         checkpoint=checkpoint, before_flush=before_flush,
+                         pipeline_depth=pipeline_depth, metrics=metrics,
+                         reject_file=reject_file) as writer:
+            blocks = iter_deposit_blocks(csv_file, start=start, on_error=reject)
+            for rows, read, end in metrics.timed_iter('parse', blocks):
+                for values in rows:
+                    writer.add(values)
+                writer.advance(end, read)
+                writer.flush()
+                writer.commit()
+            writer.finish()
+        return writer.written, errors + writer.errors
+
+    parse = metrics.timed('parse', parse_deposit_row)
+
+    with BatchWriter(db, 'deposits', headers, batch_size, commit_every, label='rows',
+                     checkpoint=checkpoint, before_flush=before_flush,
+                     pipeline_depth=pipeline_depth, metrics=metrics,
+                     reject_file=reject_file) as writer:
+        for row, offset in metrics.timed_iter('read', iter_csv_rows(csv_file, start)):
+            # Rows that fail to parse are reported here and not retried on --resume
+            writer.advance(offset)
+            try:
+                values = parse(headers, row)
+            except Exception as e:
+                errors += 1
+                metrics.reject(type(e).__name__, f"row {writer.rows_read}: {e} (row data: {row})")
+                if max_errors and errors > max_errors:
+                    print("Too many errors, stopping (continue with --resume)...")
+                    break
+                continue
+            writer.add(values)
+        else:
+            writer.finish()
+
+    return writer.written, errors + writer.errors
+
+def main():
+    parser = argparse.ArgumentParser(description='Import deposits CSV into the deposits table')
+    parser.add_argument('csv_file', nargs='?', default=CSV_FILE, help='Path to deposits CSV')
+    parser.add_argument('--parser', choices=['rows', 'vector'], default='rows',
+                        help='rows = csv.DictReader per row, vector = pandas column kernels (vector_parser.py)')
+    parser.add_argument('--max-errors', type=int, default=10,
+                        help='Stop after this many unparseable rows (0 = never stop, default: 10)')
+    add_batch_arguments(parser, pipeline=True, rejects=True)
+    add_resume_argument(parser)
+    add_cube_arguments(parser)
+    add_metrics_arguments(parser)
+    args = parser.parse_args()
+
+    # Database connection
+    db = connect()
+    metrics = IngestMetrics('deposits', args.csv_file)
+    cubes = BulkCubeSession(db) if args.defer_cubes else None
+
+    print("Starting CSV import...")
+
+    try:
+        total_imported, errors = import_deposits(db, args.csv_file, args.batch_size,
+                                                 args.commit_every, args.parser,
+                                                 args.resume, args.max_errors, cubes,
+                                                 args.pipeline_depth, metrics,
+                                                 args.reject_file)
+    except CheckpointError as e:
+        print(f"✗ Cannot resume: {e}")
+        db.close()
+        return
+    except BatchAborted as e:
+        print(f"✗ Import stopped: {e}")
+        db.close()
+        return
+
+    if cubes:
+        start = time.perf_counter()
+        cubes.finish()
+        metrics.add_time('cube refresh', time.perf_counter() - start)
+
+    print(f"\n✓ Import complete!")
+    print(f"Total rows imported: {total_imported}")
+    print(f"Errors encountered: {errors}")
+    metrics.finish(args)
+
+    # Show summary
+    cursor = db.cursor()
+    cursor.execute("SELECT COUNT(*) FROM deposits")
+    count = cursor.fetchone()[0]
+    print(f"Total rows in deposits table: {count}")
+
+    # Show sample data
+    cursor.execute("SELECT * FROM deposits LIMIT 5")
+    print("\nSample data:")
+    for row in cursor.fetchall():
+        print(row)
+
+    cursor.close()
+    db.close()
+
+if __name__ == "__main__":
+    main()
@@ -3,23 +3,25 @@
 Import symbols from CSV file into MySQL database
 """
 
-import csv
-import mysql.connector
-from mysql.connector import Error
+import argparse
+from db import Error, connect
 import sys
+from batch_writer import BatchWriter, add_batch_arguments, update_all_columns
+from checkpoint import ImportCheckpoint, add_resume_argument, iter_csv_rows
+from delta_ingest import DeltaTracker, add_delta_argument
+from import_stats import ImportStats, add_verify_argument
+from ingest_metrics import IngestMetrics, add_metrics_arguments
 
-# Database configuration
-DB_CONFIG = {
-    'host': 'localhost',
-    'database': 'partner_report',
-    'user': 'root',
-    'password': ''  # Update if you have a password
-}
+SYMBOL_COLUMNS = [
+    'platform', 'symbol', 'unified_symbol', 'unified_asset_type',
+    'unified_asset_sub_type', 'unified_category',
+    'platform_symbol_unified_symbol', 'duplicate_check', 'validation_check'
+]
 
 def create_connection():
     """Create database connection"""
     try:
-        connection = mysql.connector.connect(**DB_CONFIG)
+        connection = connect()
         if connection.is_connected():
             print("✓ Connected to MySQL database")
             return connection
@@ -27,112 +29,129 @@ def create_connection():
         print(f"✗ Error connecting to MySQL: {e}")
         sys.exit(1)
 
-def import_symbols(csv_file_path):
+def print_import_statistics(stats):
+    """Statistics of the rows read in this run, collected while importing"""
+    print(f"\n📊 Import Statistics (rows read this run):")
+    print(f"  Symbols: {stats.rows:,}")
+    print(f"  Unique platforms: {stats.distinct('platform')}")
+    print(f"  Unique asset types: {stats.distinct('unified_asset_type')}")
+    print(f"  Unique categories: {stats.distinct('unified_category')}")
+    
+    print(f"\n📈 Symbols by Platform:")
+    for platform, count in stats.most_common('platform'):
+        print(f"  {platform}: {count}")
+    
+    print(f"\n🏷️  Symbols by Category:")
+    for category, count in stats.most_common('unified_category', skip_empty=True):
+        print(f"  {category}: {count}")
+
+def print_database_statistics(cursor):
+    """Statistics of the whole symbols table (--verify; full table scans)"""
+    cursor.execute("SELECT COUNT(*) FROM symbols")
+    total = cursor.fetchone()[0]
+    
+    cursor.execute("SELECT COUNT(DISTINCT platform) FROM symbols")
+    platforms = cursor.fetchone()[0]
+    
+    cursor.execute("SELECT COUNT(DISTINCT unified_asset_type) FROM symbols")
+    asset_types = cursor.fetchone()[0]
+    
+    cursor.execute("SELECT COUNT(DISTINCT unified_category) FROM symbols")
+    categories = cursor.fetchone()[0]
+    
+    print(f"\n📊 Database Statistics (--verify):")
+    print(f"  Total symbols: {total}")
+    print(f"  Unique platforms: {platforms}")
+    print(f"  Unique asset types: {asset_types}")
+    print(f"  Unique categories: {categories}")
+    
+    # Show platform breakdown
+    print(f"\n📈 Symbols by Platform:")
+    cursor.execute("""
+        SELECT platform, COUNT(*) as count 
+        FROM symbols 
+        GROUP BY platform 
+        ORDER BY count DESC
+    """)
+    for platform, count in cursor.fetchall():
+        print(f"  {platform}: {count}")
+    
+    # Show category breakdown
+    print(f"\n🏷️  Symbols by Category:")
+    cursor.execute("""
+        SELECT unified_category, COUNT(*) as count 
+        FROM symbols 
+        WHERE unified_category IS NOT NULL AND unified_category != ''
+        GROUP BY unified_category 
+        ORDER BY count DESC
+    """)
+    for category, count in cursor.fetchall():
+        print(f"  {category}: {count}")
+
+def import_symbols(csv_file_path, batch_size=1000, commit_every=10000, resume=False,
+                   delta=False, verify=False, pipeline_depth=0, metrics=None,
+                   reject_file=None):
     """Import symbols from CSV file"""
+    metrics = metrics or IngestMetrics('symbols', csv_file_path)
     connection = create_connection()
     cursor = connection.cursor()
     
     try:
         # Read CSV file
         print(f"\nReading CSV file: {csv_file_path}")
-        with open(csv_file_path, 'r', encoding='utf-8') as file:
-            csv_reader = csv.DictReader(file)
-            
-            # Prepare insert statement
-            insert_query = """
-                INSERT INTO symbols (
-                    platform, symbol, unified_symbol, unified_asset_type, 
-                    unified_asset_sub_type, unified_category, 
-                    platform_symbol_unified_symbol, duplicate_check, validation_check
-                ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
-                ON DUPLICATE KEY UPDATE
-                    unified_symbol = VALUES(unified_symbol),
-                    unified_asset_type = VALUES(unified_asset_type),
-                    unified_asset_sub_type = VALUES(unified_asset_sub_type),
-                    unified_category = VALUES(unified_category),
-                    platform_symbol_unified_symbol = VALUES(platform_symbol_unified_symbol),
-                    duplicate_check = VALUES(duplicate_check),
-                    validation_check = VALUES(validation_check)
-            """
-            
-            # Import data
-            count = 0
-            batch = []
-            batch_size = 100
-            
-            for row in csv_reader:
-                # Extract data from CSV
-                data = (
-                    row['platform'],
-                    row['symbol'],
-                    row['unified_symbol'],
-                    row['unified_asset_type'],
-                    row['unified_asset_sub_type'],
-                    row['unified_category'],
-                    row['platform_symbol_unified_symbol'],
-                    int(row['Duplicate check']) if row['Duplicate check'] else 0,
-                    int(row['Validation check']) if row['Validation check'] else 0
-                )
-                
-                batch.append(data)
-                count += 1
-                
-                # Insert in batches for better performance
-                if len(batch) >= batch_size:
-                    cursor.executemany(insert_query, batch)
-                    connection.commit()
-                    print(f"  Imported {count} symbols...", end='\r')
-                    batch = []
-            
-            # Insert remaining records
-            if batch:
-                cursor.executemany(insert_query, batch)
-                connection.commit()
-            
-            print(f"\n✓ Successfully imported {count} symbols")
-            
-            # Get statistics
-            cursor.execute("SELECT COUNT(*) FROM symbols")
-            total = cursor.fetchone()[0]
-            
-            cursor.execute("SELECT COUNT(DISTINCT platform) FROM symbols")
-            platforms = cursor.fetchone()[0]
-            
-            cursor.execute("SELECT COUNT(DISTINCT unified_asset_type) FROM symbols")
-            asset_types = cursor.fetchone()[0]
-            
-            cursor.execute("SELECT COUNT(DISTINCT unified_category) FROM symbols")
-            categories = cursor.fetchone()[0]
-            
-            print(f"\n📊 Database Statistics:")
-            print(f"  Total symbols: {total}")
-            print(f"  Unique platforms: {platforms}")
-            print(f"  Unique asset types: {asset_types}")
-            print(f"  Unique categories: {categories}")
+        checkpoint = ImportCheckpoint(connection, 'symbols', csv_file_path)
+        start = checkpoint.start(resume)
+        csv_reader = [] if checkpoint.completed else iter_csv_rows(csv_file_path, start)
+        csv_reader = metrics.timed_iter('read', csv_reader)
+        tracker = DeltaTracker(connection, 'symbols', SYMBOL_COLUMNS, ('platform', 'symbol')) if delta else None
+        
+        # Import data
+        stats = ImportStats(SYMBOL_COLUMNS, distinct=('platform', 'unified_asset_type', 'unified_category'),
+                            groups=('platform', 'unified_category'))
+        writer = BatchWriter(
+            connection, 'symbols', SYMBOL_COLUMNS, batch_size, commit_every,
+            on_duplicate=update_all_columns(SYMBOL_COLUMNS, key_columns=('platform', 'symbol')),
+            label='symbols', checkpoint=checkpoint, pipeline_depth=pipeline_depth,
+            metrics=metrics, reject_file=reject_file
+        )
+        
+        for row, offset in csv_reader:
+            writer.advance(offset)
+            # Extract data from CSV
+            data = (
+                row['platform'],
+                row['symbol'],
+                row['unified_symbol'],
+                row['unified_asset_type'],
+                row['unified_asset_sub_type'],
+                row['unified_category'],
+                row['platform_symbol_unified_symbol'],
+                int(row['Duplicate check']) if row['Duplicate check'] else 0,
+                int(row['Validation check']) if row['Validation check'] else 0
+            )
             
-            # Show platform breakdown
-            print(f"\n📈 Symbols by Platform:")
-            cursor.execute("""
-                SELECT platform, COUNT(*) as count 
-                FROM symbols 
-                GROUP BY platform 
-                ORDER BY count DESC
-            """)
-            for platform, count in cursor.fetchall():
-                print(f"  {platform}: {count}")
+            stats.add(data)
             
-            # Show category breakdown
-            print(f"\n🏷️  Symbols by Category:")
-            cursor.execute("""
-                SELECT unified_category, COUNT(*) as count 
-                FROM symbols 
-                WHERE unified_category IS NOT NULL AND unified_category != ''
-                GROUP BY unified_category 
-                ORDER BY count DESC
-            """)
-            for category, count in cursor.fetchall():
-                print(f"  {category}: {count}")
+            # Delta mode: skip rows identical to the last import
+            if tracker is not None and not tracker.changed(data):
+                continue
             
+            writer.add(data)
+        
+        # Insert remaining records
+        writer.finish()
+        writer.close()
+        if tracker is not None:
+            tracker.finish(writer.errors == 0)
+        
+        print(f"\n✓ Successfully imported {writer.written} symbols")
+        if writer.errors > 0:
+            print(f"  Failed to write {writer.errors} rows")
+        
+        print_import_statistics(stats)
+        if verify:
+            print_database_statistics(cursor)
+        
     except FileNotFoundError:
         print(f"✗ Error: File not found: {csv_file_path}")
         sys.exit(1)
@@ -151,13 +170,26 @@ def import_symbols(csv_file_path):
             print("\n✓ Database connection closed")
 
 if __name__ == "__main__":
-    csv_file = '/Users/michalisphytides/Downloads/symbols.csv'
+    parser = argparse.ArgumentParser(description='Import symbols CSV into the symbols table')
+    parser.add_argument('csv_file', nargs='?', default='/Users/michalisphytides/Downloads/symbols.csv',
+                        help='Path to symbols CSV')
+    add_batch_arguments(parser, pipeline=True, rejects=True)
+    add_resume_argument(parser)
+    add_delta_argument(parser)
+    add_verify_argument(parser)
+    add_metrics_arguments(parser)
+    args = parser.parse_args()
+    if args.delta and args.resume:
+        parser.error('--delta reads the whole file to find deleted keys and cannot be combined with --resume')
     
     print("=" * 60)
     print("Symbol Import Tool")
     print("=" * 60)
     
-    import_symbols(csv_file)
+    metrics = IngestMetrics('symbols', args.csv_file)
+    import_symbols(args.csv_file, args.batch_size, args.commit_every, args.resume, args.delta, args.verify,
+                   args.pipeline_depth, metrics, args.reject_file)
+    metrics.finish(args)
     
     print("\n" + "=" * 60)
     print("Import completed successfully!")
@@ -1,28 +1,77 @@
 #!/usr/bin/env python3
 """
 Import trades1.csv into MySQL trades table
+
+Two import paths are available:
+  rows  - multi-row INSERTs through BatchWriter (kept as a fallback)
+  bulk  - convert the CSV into a tab-separated staging file, stream it in with
+          LOAD DATA LOCAL INFILE into a temporary trades_staging table (private
+          to the connection), then move it into trades with a single INSERT ... SELECT
+
+With --workers N the CSV is split into N byte ranges aligned on record
+boundaries (never inside a multi-line quoted field) and parsed and written by a process pool, one MySQL connection
+per worker process (db.shared_connection), reused for every chunk it takes.
+gzip/bz2/zstd CSVs are decompressed on the fly (compressed_io.py); they
+cannot be split into byte ranges and are read by a single worker.
+
+Every path records a checkpoint in import_checkpoints (checkpoint.py) with
+each commit; --resume continues an interrupted import from the last
+committed batch instead of starting again.
+
+By default the per-row cube triggers are suspended for the import and each
+affected partner's cubes are refreshed once at the end (cube_refresh.py);
+--no-defer-cubes keeps the per-row triggers.
+
+The client -> partner map is loaded once (partner_map.py, optionally from a
+--partner-snapshot file): an empty affiliated_partner_id is filled in while
+parsing and the partners to refresh are queued from the map instead of
+looking the clients up; --no-resolve-partners turns this off.
+
+When the trades table has the unified_* columns (add_trade_symbol_columns.sql)
+each trade also gets the unified symbol, asset type, sub type and category of its
+(platform, asset) from an in-memory index of the symbols table
+(symbol_index.py, optionally cached with --symbol-cache).
 """
 
+import argparse
 import csv
-import mysql.connector
+import multiprocessing
+import os
+import tempfile
+import time
+from db import Error, connect, shared_connection
 from datetime import datetime
+from batch_writer import BatchAborted, BatchWriter, add_batch_arguments, merge_reject_files, part_reject_path
+from compressed_io import is_compressed
+from checkpoint import (CheckpointError, ImportCheckpoint, add_resume_argument,
+                        clear_checkpoints, file_fingerprint, iter_csv_rows,
+                        read_csv_fieldnames, saved_parts)
+from cube_refresh import BulkCubeSession, add_cube_arguments
+from ingest_metrics import IngestMetrics, add_metrics_arguments
+from partner_map import PartnerMap, add_partner_map_arguments
+from symbol_index import ENRICHED_COLUMNS, SymbolIndex, add_symbol_index_arguments, table_has_columns
 
-# Database connection
-conn = mysql.connector.connect(
-    host='localhost',
-    user='root',
-    password='',
-    database='partner_report'
-)
-
-cursor = conn.cursor()
+CSV_FILE = '/Users/michalisphytides/Downloads/trades1.csv'
+STAGING_TABLE = 'trades_staging'
+# Bytes read at a time while counting quotes for the chunk boundaries
+SCAN_BLOCK_SIZE = 16 * 1024 * 1024
 
-# Read CSV file
-csv_file = '/Users/michalisphytides/Downloads/trades1.csv'
-imported = 0
-errors = 0
+# Column order of the trades table (excluding id/created_at/updated_at)
+TRADE_COLUMNS = [
+    'date', 'binary_user_id', 'loginid', 'platform', 'app_name', 'account_type',
+    'contract_type', 'asset_type', 'asset', 'number_of_trades', 'closed_pnl_usd',
+    'closed_pnl_usd_abook', 'closed_pnl_usd_bbook', 'floating_pnl_usd', 'floating_pnl',
+    'expected_revenue_usd', 'closed_pnl', 'swaps_usd', 'volume_usd', 'is_synthetic',
+    'is_financial', 'app_markup_usd', 'affiliated_partner_id'
+]
+USER_ID_INDEX = TRADE_COLUMNS.index('binary_user_id')
+PARTNER_INDEX = TRADE_COLUMNS.index('affiliated_partner_id')
+PLATFORM_INDEX = TRADE_COLUMNS.index('platform')
+ASSET_INDEX = TRADE_COLUMNS.index('asset')
 
-print(f"Starting import from {csv_file}...")
+# PartnerMap and SymbolIndex of the parallel workers, set by the pool initializer
+_worker_partner_map = None
+_worker_symbol_index = None
 
 def clean_number(value):
     """Clean numeric values by removing commas and quotes"""
@@ -40,104 +89,566 @@ def parse_boolean(value):
         return False
     return str(value).strip().upper() in ('TRUE', '1', 'YES')
 
-with open(csv_file, 'r', encoding='utf-8') as f:
-    reader = csv.DictReader(f)
-    
-    for row in reader:
+def parse_date(date_str):
+    """Parse a trade date in either YYYY-MM-DD or MM/DD/YYYY format"""
+    date_str = (date_str or '').strip()
+    if not date_str:
+        return None
+    try:
+        return datetime.strptime(date_str, '%Y-%m-%d').date()
+    except:
         try:
-            # Parse date
-            date_str = row.get('date', '').strip()
-            if date_str:
-                try:
-                    trade_date = datetime.strptime(date_str, '%Y-%m-%d').date()
-                except:
-                    try:
-                        trade_date = datetime.strptime(date_str, '%m/%d/%Y').date()
-                    except:
-                        trade_date = None
-            else:
-                trade_date = None
-            
-            binary_user_id = row.get('binary_user_id', '').strip() or None
-            loginid = row.get('loginid', '').strip() or None
-            platform = row.get('platform', '').strip() or None
-            app_name = row.get('app_name', '').strip() or None
-            account_type = row.get('account_type', '').strip() or None
-            contract_type = row.get('contract_type', '').strip() or None
-            asset_type = row.get('asset_type', '').strip() or None
-            asset = row.get('asset', '').strip() or None
-            
-            # Numeric fields
-            number_of_trades = clean_number(row.get('number_of_trades', ''))
-            closed_pnl_usd = clean_number(row.get('closed_pnl_usd', ''))
-            closed_pnl_usd_abook = clean_number(row.get('closed_pnl_usd_abook', ''))
-            closed_pnl_usd_bbook = clean_number(row.get('closed_pnl_usd_bbook', ''))
-            floating_pnl_usd = clean_number(row.get('floating_pnl_usd', ''))
-            floating_pnl = clean_number(row.get('floating_pnl', ''))
-            expected_revenue_usd = clean_number(row.get('expected_revenue_usd', ''))
-            closed_pnl = clean_number(row.get('closed_pnl', ''))
-            swaps_usd = clean_number(row.get('swaps_usd', ''))
-            volume_usd = clean_number(row.get('volume_usd', ''))
-            app_markup_usd = clean_number(row.get('app_markup_usd', ''))
-            
-            # Boolean fields
-            is_synthetic = parse_boolean(row.get('is_synthetic', ''))
-            is_financial = parse_boolean(row.get('is_financial', ''))
-            
-            affiliated_partner_id = row.get('affiliated_partner_id', '').strip() or None
-            
-            # Skip if no binary_user_id
-            if not binary_user_id:
+            return datetime.strptime(date_str, '%m/%d/%Y').date()
+        except:
+            return None
+
+def parse_trade_row(row):
+    """Convert a CSV row into a tuple in TRADE_COLUMNS order (None to skip the row)"""
+    binary_user_id = row.get('binary_user_id', '').strip() or None
+
+    # Skip if no binary_user_id
+    if not binary_user_id:
+        return None
+
+    return (
+        parse_date(row.get('date', '')),
+        binary_user_id,
+        row.get('loginid', '').strip() or None,
+        row.get('platform', '').strip() or None,
+        row.get('app_name', '').strip() or None,
+        row.get('account_type', '').strip() or None,
+        row.get('contract_type', '').strip() or None,
+        row.get('asset_type', '').strip() or None,
+        row.get('asset', '').strip() or None,
+        # Numeric fields
+        clean_number(row.get('number_of_trades', '')),
+        clean_number(row.get('closed_pnl_usd', '')),
+        clean_number(row.get('closed_pnl_usd_abook', '')),
+        clean_number(row.get('closed_pnl_usd_bbook', '')),
+        clean_number(row.get('floating_pnl_usd', '')),
+        clean_number(row.get('floating_pnl', '')),
+        clean_number(row.get('expected_revenue_usd', '')),
+        clean_number(row.get('closed_pnl', '')),
+        clean_number(row.get('swaps_usd', '')),
+        clean_number(row.get('volume_usd', '')),
+        # Boolean fields
+        parse_boolean(row.get('is_synthetic', '')),
+        parse_boolean(row.get('is_financial', '')),
+        clean_number(row.get('app_markup_usd', '')),
+        row.get('affiliated_partner_id', '').strip() or None
+    )
+
+def trade_columns(symbol_index=None):
+    """Columns of the parsed rows: TRADE_COLUMNS, plus ENRICHED_COLUMNS with a SymbolIndex"""
+    return TRADE_COLUMNS + ENRICHED_COLUMNS if symbol_index is not None else TRADE_COLUMNS
+
+def trade_parser(partner_map=None, symbol_index=None):
+    """parse_trade_row, stamping the client's partner and adding the unified symbol when given"""
+    if partner_map is None and symbol_index is None:
+        return parse_trade_row
+
+    def parse(row):
+        values = parse_trade_row(row)
+        if values is None:
+            return None
+        if partner_map is not None:
+            values = partner_map.stamp(values, USER_ID_INDEX, PARTNER_INDEX)
+        if symbol_index is not None:
+            values += symbol_index.lookup(values[PLATFORM_INDEX], values[ASSET_INDEX])
+        return values
+    return parse
+
+def trade_hook(cubes, partner_map=None):
+    """BatchWriter before_flush queueing the partners of each batch (None without cubes)"""
+    if cubes is None:
+        return None
+    if partner_map is None:
+        return cubes.trade_hook(USER_ID_INDEX)
+    return cubes.partner_hook(partner_map, USER_ID_INDEX)
+
+def import_row_by_row(conn, csv_file, batch_size=1000, commit_every=10000, parser='rows',
+                      resume=False, cubes=None, pipeline_depth=0, metrics=None,
+                      reject_file=None, partner_map=None, symbol_index=None):
+    """Insert trades with batched multi-row INSERT statements"""
+    metrics = metrics or IngestMetrics('trades', csv_file)
+    checkpoint = ImportCheckpoint(conn, 'trades', csv_file)
+    start = checkpoint.start(resume)
+    if checkpoint.completed:
+        return 0, 0
+    before_flush = trade_hook(cubes, partner_map)
+
+    errors = 0
+
+    def reject(row, e):
+        nonlocal errors
+        errors += 1
+        metrics.reject(type(e).__name__, f"{e} (row data: {row})")
+
+    if parser == 'vector':
+        from vector_parser import iter_trade_blocks
+        # Commit once per parsed chunk so the checkpoint lands on a chunk boundary
+        with BatchWriter(conn, 'trades', trade_columns(symbol_index), batch_size, None, label='trades',
+                         checkpoint=checkpoint, before_flush=before_flush,
+                         pipeline_depth=pipeline_depth, metrics=metrics,
+                         reject_file=reject_file) as writer:
+            # Reading and parsing happen together in the vectorised blocks
+            # Blocks with a malformed row go through parse_trade_row, which reports to reject
+            blocks = iter_trade_blocks(csv_file, start=start, partner_map=partner_map,
+                                       symbol_index=symbol_index, on_error=reject)
+            for rows, read, end in metrics.timed_iter('parse', blocks):
+                for values in rows:
+                    writer.add(values)
+                writer.advance(end, read)
+                writer.flush()
+                writer.commit()
+            writer.finish()
+        return writer.written, errors + writer.errors
+
+    parse = metrics.timed('parse', trade_parser(partner_map, symbol_index))
+
+    with BatchWriter(conn, 'trades', trade_columns(symbol_index), batch_size, commit_every, label='trades',
+                     checkpoint=checkpoint, before_flush=before_flush,
+                     pipeline_depth=pipeline_depth, metrics=metrics,
+                     reject_file=reject_file) as writer:
+        for row, offset in metrics.timed_iter('read', iter_csv_rows(csv_file, start)):
+            writer.advance(offset)
+            try:
+                values = parse(row)
+            except Exception as e:
+                errors += 1
+                metrics.reject(type(e).__name__, f"row {writer.rows_read}: {e}")
                 continue
-            
-            # Insert into database
-            sql = """
-                INSERT INTO trades (
-                    date, binary_user_id, loginid, platform, app_name, account_type,
-                    contract_type, asset_type, asset, number_of_trades, closed_pnl_usd,
-                    closed_pnl_usd_abook, closed_pnl_usd_bbook, floating_pnl_usd, floating_pnl,
-                    expected_revenue_usd, closed_pnl, swaps_usd, volume_usd, is_synthetic,
-                    is_financial, app_markup_usd, affiliated_partner_id
-                ) VALUES (
-                    %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s
-                )
-            """
-            
-            cursor.execute(sql, (
-                trade_date, binary_user_id, loginid, platform, app_name, account_type,
-                contract_type, asset_type, asset, number_of_trades, closed_pnl_usd,
-                closed_pnl_usd_abook, closed_pnl_usd_bbook, floating_pnl_usd, floating_pnl,
-                expected_revenue_usd, closed_pnl, swaps_usd, volume_usd, is_synthetic,
-                is_financial, app_markup_usd, affiliated_partner_id
-            ))
-            
-            imported += 1
-            if imported % 500 == 0:
-                print(f"  Imported {imported} trades...")
-                conn.commit()  # Commit in batches
-            
-        except Exception as e:
-            errors += 1
-            print(f"  Error importing trade on line {imported + errors}: {e}")
-
-# Final commit
-conn.commit()
-
-print(f"\n✓ Import completed!")
-print(f"  Total imported: {imported}")
-print(f"  Total errors: {errors}")
-
-# Verify
-cursor.execute("SELECT COUNT(*) FROM trades")
-count = cursor.fetchone()[0]
-print(f"  Trades in database: {count}")
-
-# Sample data check
-cursor.execute("SELECT date, binary_user_id, platform, number_of_trades, closed_pnl_usd, volume_usd FROM trades LIMIT 3")
-print(f"\n  Sample records:")
-for row in cursor.fetchall():
-    print(f"    {row}")
-
-cursor.close()
-conn.close()
+            if values is not None:
+                writer.add(values)
+        writer.finish()
+
+    return writer.written, errors + writer.errors
+
+def split_byte_ranges(csv_file, chunks, start=None):
+    """Split the data rows of a CSV into byte ranges aligned on record boundaries
+
+    A newline inside a quoted field does not end a record, so the quote
+    characters are counted from the first data row on: a range ends at the
+    first newline after its target size where that count is even.
+    """
+    fieldnames, data_start = read_csv_fieldnames(csv_file)
+    if start is not None:
+        data_start = start
+    size = os.path.getsize(csv_file)
+    step = max(1, (size - data_start) // max(1, chunks))
+
+    offsets = [data_start]
+    with open(csv_file, 'rb') as f:
+        f.seek(data_start)
+        position = data_start
+        quotes = 0
+        for i in range(1, chunks):
+            target = data_start + i * step
+            while position < target:
+                data = f.read(min(target - position, SCAN_BLOCK_SIZE))
+                if not data:
+                    break
+                quotes += data.count(b'"')
+                position += len(data)
+            # Move to the end of the line, then on until it ends outside quotes
+            while True:
+                line = f.readline()
+                if not line:
+                    break
+                quotes += line.count(b'"')
+                position += len(line)
+                if quotes % 2 == 0:
+                    break
+            offset = min(position, size)
+            if offset > offsets[-1]:
+                offsets.append(offset)
+        offsets.append(size)
+
+    ranges = [(offsets[i], offsets[i + 1]) for i in range(len(offsets) - 1)]
+    return fieldnames, [r for r in ranges if r[1] > r[0]]
+
+def plan_chunks(conn, csv_file, workers, fingerprint, resume=False):
+    """Byte ranges to import, each with a checkpoint row saved before the workers start
+
+    On --resume the chunks of the previous parallel run are reused as they
+    are; the rest of an interrupted row-by-row import is split into new
+    chunks. Saving every chunk up front means a crash before a chunk's first
+    commit still resumes from the right place.
+    """
+    whole = ImportCheckpoint(conn, 'trades', csv_file, fingerprint=fingerprint)
+    if resume:
+        parts = saved_parts(conn, 'trades', csv_file)
+        if parts:
+            fieldnames, _ = read_csv_fieldnames(csv_file)
+            ranges = sorted(tuple(int(x) for x in part.split('-')) for part in parts)
+            print(f"  Resuming {len(ranges)} chunks from the previous parallel run")
+            return fieldnames, ranges
+        start = whole.start(resume=True)
+        if whole.completed:
+            return None, []
+    else:
+        start = None
+
+    fieldnames, ranges = split_byte_ranges(csv_file, workers, start)
+    clear_checkpoints(conn, 'trades', csv_file)
+    cursor = conn.cursor()
+    for i, (chunk_start, chunk_end) in enumerate(ranges):
+        chunk = ImportCheckpoint(conn, 'trades', csv_file, part=f'{chunk_start}-{chunk_end}',
+                                 fingerprint=fingerprint)
+        # The first chunk carries the counts of the interrupted row-by-row import
+        chunk.save(cursor, chunk_start, whole.rows_read if i == 0 else 0,
+                   whole.rows_written if i == 0 else 0)
+    conn.commit()
+    cursor.close()
+    return fieldnames, ranges
+
+def import_chunk(task):
+    """Worker: parse one byte range and write it with the worker process's connection"""
+    (chunk_id, csv_file, fieldnames, start, end, batch_size, commit_every, fingerprint, defer_cubes,
+     pipeline_depth, reject_file) = task
+    errors = 0
+    metrics = IngestMetrics('trades', csv_file)
+    partner_map = _worker_partner_map
+    symbol_index = _worker_symbol_index
+    # Counters are reported per chunk; the parent adds them up
+    if partner_map is not None:
+        partner_map.touched = set()
+        partner_map.stamped = 0
+    if symbol_index is not None:
+        symbol_index.reset_counts()
+    parse = metrics.timed('parse', trade_parser(partner_map, symbol_index))
+
+    # Kept open for the next chunk this worker process takes
+    conn = shared_connection()
+    try:
+        # Partners are queued here and refreshed once by the parent process
+        cubes = BulkCubeSession(conn) if defer_cubes else None
+        checkpoint = ImportCheckpoint(conn, 'trades', csv_file, part=f'{start}-{end}',
+                                      fingerprint=fingerprint)
+        offset = checkpoint.start(resume=True)  # saved by plan_chunks
+        # One reject file per worker, merged by the parent
+        chunk_rejects = part_reject_path(reject_file, chunk_id) if reject_file else None
+        with BatchWriter(conn, 'trades', trade_columns(symbol_index), batch_size, commit_every,
+                         label=f'trades (chunk {chunk_id})', checkpoint=checkpoint,
+                         before_flush=trade_hook(cubes, partner_map),
+                         pipeline_depth=pipeline_depth, metrics=metrics,
+                         reject_file=chunk_rejects) as writer:
+            if not checkpoint.completed:
+                for row, position in metrics.timed_iter('read', iter_csv_rows(csv_file, offset, end, fieldnames)):
+                    writer.advance(position)
+                    try:
+                        values = parse(row)
+                    except Exception as e:
+                        errors += 1
+                        metrics.reject(type(e).__name__, f"chunk {chunk_id}: {e}")
+                        continue
+                    if values is not None:
+                        writer.add(values)
+                writer.finish()
+    except Exception:
+        conn.rollback()
+        raise
+
+    return {
+        'chunk': chunk_id,
+        'start': start,
+        'end': end,
+        'imported': writer.written,
+        'errors': errors + writer.errors,
+        'metrics': metrics.to_dict(),
+        'partners': partner_map.touched if partner_map is not None else set(),
+        'stamped': partner_map.stamped if partner_map is not None else 0,
+        'symbols': symbol_index.counts() if symbol_index is not None else None
+    }
+
+def set_worker_maps(partner_map, symbol_index):
+    """Pool initializer: the maps are sent to each worker once, not with every task"""
+    global _worker_partner_map, _worker_symbol_index
+    _worker_partner_map = partner_map
+    _worker_symbol_index = symbol_index
+
+def import_parallel(conn, csv_file, workers, batch_size=1000, commit_every=10000, resume=False,
+                    defer_cubes=True, pipeline_depth=0, metrics=None, reject_file=None,
+                    partner_map=None, symbol_index=None):
+    """Import trades with a process pool, one byte-range chunk per task"""
+    metrics = metrics or IngestMetrics('trades', csv_file)
+    fingerprint = file_fingerprint(csv_file)
+    fieldnames, ranges = plan_chunks(conn, csv_file, workers, fingerprint, resume)
+    if not ranges:
+        return 0, 0
+
+    tasks = [
+        (i + 1, csv_file, fieldnames, start, end, batch_size, commit_every, fingerprint, defer_cubes,
+         pipeline_depth, reject_file)
+        for i, (start, end) in enumerate(ranges)
+    ]
+    print(f"  Split {csv_file} into {len(tasks)} chunks for {workers} workers")
+
+    with multiprocessing.Pool(processes=workers, initializer=set_worker_maps,
+                              initargs=(partner_map, symbol_index)) as pool:
+        results = pool.map(import_chunk, tasks)
+
+    print(f"\n  {'Chunk':>5}  {'Bytes':>23}  {'Imported':>10}  {'Errors':>7}")
+    for result in results:
+        metrics.merge(result['metrics'])
+        if partner_map is not None:
+            partner_map.touched.update(result['partners'])
+            partner_map.stamped += result['stamped']
+        if symbol_index is not None:
+            symbol_index.add_counts(result['symbols'])
+        byte_range = f"{result['start']}-{result['end']}"
+        print(f"  {result['chunk']:>5}  {byte_range:>23}  {result['imported']:>10}  {result['errors']:>7}")
+
+    imported = sum(r['imported'] for r in results)
+    errors = sum(r['errors'] for r in results)
+    if reject_file:
+        moved = merge_reject_files(reject_file, [part_reject_path(reject_file, task[0]) for task in tasks])
+        if moved:
+            print(f"  ⚠️  {moved} rejected trades saved to {reject_file}")
+    return imported, errors
+
+def format_staging_value(value):
+    """Format a value for a LOAD DATA staging file (\\N is NULL)"""
+    if value is None:
+        return '\\N'
+    if value is True:
+        return '1'
+    if value is False:
+        return '0'
+    if isinstance(value, float):
+        return repr(value)
+    text = str(value)
+    if '\\' in text or '\t' in text or '\n' in text or '\r' in text:
+        text = (text.replace('\\', '\\\\').replace('\t', '\\t')
+                    .replace('\n', '\\n').replace('\r', '\\r'))
+    return text
+
+def write_staging_file(csv_file, staging_path, start=None, metrics=None, partner_map=None,
+                       symbol_index=None):
+    """Convert the CSV into a tab-separated file in trade_columns() order"""
+    metrics = metrics or IngestMetrics('trades', csv_file)
+    parse = metrics.timed('parse', trade_parser(partner_map, symbol_index))
+    written = 0
+    errors = 0
+    read = 0
+
+    with open(staging_path, 'w', encoding='utf-8', newline='\n') as out:
+        for row, _ in metrics.timed_iter('read', iter_csv_rows(csv_file, start)):
+            read += 1
+            try:
+                values = parse(row)
+                if values is None:
+                    continue
+                out.write('\t'.join([format_staging_value(v) for v in values]))
+                out.write('\n')
+                written += 1
+                if written % 100000 == 0:
+                    print(f"  Staged {written} trades...")
+            except Exception as e:
+                errors += 1
+                metrics.reject(type(e).__name__, f"row {read}: {e}")
+
+    return written, errors, read
+
+def import_bulk(conn, csv_file, parser='rows', resume=False, cubes=None, metrics=None, partner_map=None,
+                symbol_index=None):
+    """Load trades through a staging file, LOAD DATA LOCAL INFILE and a staging table"""
+    if parser == 'vector':
+        from vector_parser import write_staging_file as write_staging
+    else:
+        write_staging = write_staging_file
+    metrics = metrics or IngestMetrics('trades', csv_file)
+
+    checkpoint = ImportCheckpoint(conn, 'trades', csv_file)
+    start_offset = checkpoint.start(resume)
+    if checkpoint.completed:
+        return 0, 0
+
+    cursor = conn.cursor()
+    timings = {}
+    columns = ', '.join(trade_columns(symbol_index))
+
+    fd, staging_path = tempfile.mkstemp(prefix='trades_', suffix='.tsv')
+    os.close(fd)
+
+    try:
+        start = time.perf_counter()
+        measured = metrics.stages['read'] + metrics.stages['parse']
+        written, errors, read = write_staging(csv_file, staging_path, start_offset, metrics=metrics,
+                                               partner_map=partner_map, symbol_index=symbol_index)
+        timings['staging file'] = time.perf_counter() - start
+        metrics.add_time('staging write', timings['staging file']
+                         - (metrics.stages['read'] + metrics.stages['parse'] - measured))
+        metrics.rows_read += read
+
+        start = time.perf_counter()
+        # Temporary: concurrent bulk imports each get their own, dropped with the session
+        cursor.execute(f"DROP TEMPORARY TABLE IF EXISTS {STAGING_TABLE}")
+        cursor.execute(f"CREATE TEMPORARY TABLE {STAGING_TABLE} LIKE trades")
+        cursor.execute(f"""
+            LOAD DATA LOCAL INFILE %s
+            INTO TABLE {STAGING_TABLE}
+            CHARACTER SET utf8mb4
+            FIELDS TERMINATED BY '\\t' ESCAPED BY '\\\\'
+            LINES TERMINATED BY '\\n'
+            ({columns})
+        """, (staging_path,))
+        loaded = cursor.rowcount
+        timings['load data'] = time.perf_counter() - start
+
+        # Swap the staged rows into trades in one statement and one transaction,
+        # together with the checkpoint that marks the file as done
+        start = time.perf_counter()
+        if cubes and partner_map is not None:
+            cubes.queue_partners(cursor, partner_map.touched, True)
+        elif cubes:
+            cubes.queue_staged_trades(cursor, STAGING_TABLE)
+        cursor.execute(f"""
+            INSERT INTO trades ({columns})
+            SELECT {columns} FROM {STAGING_TABLE}
+        """)
+        imported = cursor.rowcount
+        checkpoint.save(cursor, os.path.getsize(csv_file), checkpoint.rows_read + read,
+                        checkpoint.rows_written + imported, completed=True)
+        conn.commit()
+        cursor.execute(f"DROP TEMPORARY TABLE IF EXISTS {STAGING_TABLE}")
+        timings['swap in'] = time.perf_counter() - start
+        metrics.add_time('load data', timings['load data'])
+        metrics.add_time('swap in', timings['swap in'])
+        metrics.rows_written += imported
+
+        print(f"  Staged {written} rows, loaded {loaded} rows into {STAGING_TABLE}")
+        for phase, elapsed in timings.items():
+            rate = written / elapsed if elapsed > 0 else 0
+            print(f"    {phase:13} {elapsed:8.2f}s  ({rate:,.0f} rows/s)")
+
+        return imported, errors
+    except Error:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+        if os.path.exists(staging_path):
+            os.remove(staging_path)
+
+def main():
+    parser = argparse.ArgumentParser(description='Import trades CSV into the trades table')
+    parser.add_argument('csv_file', nargs='?', default=CSV_FILE, help='Path to trades CSV')
+    parser.add_argument('--mode', choices=['bulk', 'rows'], default='bulk',
+                        help='bulk = LOAD DATA via staging table, rows = batched INSERTs')
+    parser.add_argument('--parser', choices=['rows', 'vector'], default='rows',
+                        help='rows = csv.DictReader per row, vector = pandas column kernels (vector_parser.py)')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='Parse and write byte-range chunks in N processes (uses batched INSERTs)')
+    add_batch_arguments(parser, pipeline=True, rejects=True)
+    add_resume_argument(parser)
+    add_cube_arguments(parser)
+    add_metrics_arguments(parser)
+    add_partner_map_arguments(parser)
+    add_symbol_index_arguments(parser)
+    args = parser.parse_args()
+
+    # Database connection
+    conn = connect(allow_local_infile=True)
+    metrics = IngestMetrics('trades', args.csv_file)
+    cubes = BulkCubeSession(conn) if args.defer_cubes else None
+
+    if args.workers > 1 and is_compressed(args.csv_file):
+        # Byte ranges need random access, which a compressed stream does not have
+        print(f"⚠️  {args.csv_file} is compressed, importing with a single worker")
+        args.workers = 1
+
+    mode = 'parallel' if args.workers > 1 else args.mode
+    print(f"Starting {mode} import from {args.csv_file}...")
+
+    partner_map = None
+    if args.resolve_partners:
+        start = time.perf_counter()
+        partner_map = PartnerMap.open(conn, args.partner_snapshot, args.partner_snapshot_max_age)
+        metrics.add_time('partner map', time.perf_counter() - start)
+
+    symbol_index = None
+    if args.enrich_symbols:
+        if table_has_columns(conn, 'trades', ENRICHED_COLUMNS):
+            start = time.perf_counter()
+            symbol_index = SymbolIndex.open(conn, args.symbol_cache)
+            metrics.add_time('symbol index', time.perf_counter() - start)
+        else:
+            print(f"  ⚠️  trades lacks some of {', '.join(ENRICHED_COLUMNS)} (add_trade_symbol_columns.sql), not adding symbols")
+
+    start = time.perf_counter()
+    try:
+        if mode == 'parallel':
+            imported, errors = import_parallel(conn, args.csv_file, args.workers, args.batch_size,
+                                               args.commit_every, args.resume, args.defer_cubes,
+                                               args.pipeline_depth, metrics, args.reject_file,
+                                               partner_map, symbol_index)
+        elif mode == 'bulk':
+            try:
+                imported, errors = import_bulk(conn, args.csv_file, args.parser, args.resume, cubes, metrics,
+                                               partner_map, symbol_index)
+            except Error as e:
+                # e.g. local_infile disabled on the server
+                print(f"  Bulk load failed ({e}), falling back to row-by-row import...")
+                mode = 'rows'
+                # The row-by-row import reads the whole file again: count only that run
+                failed = time.perf_counter() - start
+                metrics.reset(keep=('partner map', 'symbol index'))
+                metrics.add_time('failed bulk load', failed)
+                start = time.perf_counter()
+                if partner_map is not None:
+                    partner_map.stamped = 0
+                if symbol_index is not None:
+                    symbol_index.reset_counts()
+                imported, errors = import_row_by_row(conn, args.csv_file, args.batch_size,
+                                                     args.commit_every, args.parser, args.resume, cubes,
+                                                     args.pipeline_depth, metrics, args.reject_file,
+                                                     partner_map, symbol_index)
+        else:
+            imported, errors = import_row_by_row(conn, args.csv_file, args.batch_size,
+                                                 args.commit_every, args.parser, args.resume, cubes,
+                                                 args.pipeline_depth, metrics, args.reject_file,
+                                                 partner_map, symbol_index)
+    except CheckpointError as e:
+        print(f"✗ Cannot resume: {e}")
+        conn.close()
+        return
+    except BatchAborted as e:
+        print(f"✗ Import stopped: {e}")
+        conn.close()
+        return
+    elapsed = time.perf_counter() - start
+
+    if cubes:
+        start = time.perf_counter()
+        cubes.finish()
+        metrics.add_time('cube refresh', time.perf_counter() - start)
+
+    print(f"\n✓ Import completed!")
+    print(f"  Import path: {mode}")
+    print(f"  Total imported: {imported}")
+    print(f"  Total errors: {errors}")
+    print(f"  Elapsed: {elapsed:.2f}s ({imported / elapsed if elapsed > 0 else 0:,.0f} rows/s)")
+    if partner_map is not None:
+        print(f"  Partners: {partner_map.report()}")
+    if symbol_index is not None:
+        print(f"  Symbols: {symbol_index.report()}")
+    metrics.finish(args)
+
+    # Verify
+    cursor = conn.cursor()
+    cursor.execute("SELECT COUNT(*) FROM trades")
+    count = cursor.fetchone()[0]
+    print(f"  Trades in database: {count}")
+
+    # Sample data check
+    cursor.execute("SELECT date, binary_user_id, platform, number_of_trades, closed_pnl_usd, volume_usd FROM trades LIMIT 3")
+    print(f"\n  Sample records:")
+    for row in cursor.fetchall():
+        print(f"    {row}")
+
+    cursor.close()
+    conn.close()
 
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,272 @@
+#!/usr/bin/env python3
+"""
+Per-stage instrumentation for the CSV importers
+
+IngestMetrics collects, for one import run:
+- seconds spent per stage: read (CSV reading), parse (row conversion),
+  execute (INSERT statements), commit, trigger (before_flush hooks such as
+  the cube refresh queue) and any other stage an importer times
+- rows read / written / rejected and rows/s
+- a latency histogram of the batch INSERTs
+- peak RSS of the process (and of its pool workers)
+- rejects counted per reason; only the first MAX_PRINTED_REJECTS are
+  printed, so a dirty file does not spend its time printing
+
+    metrics = IngestMetrics('trades', csv_file)
+    parse = metrics.timed('parse', parse_trade_row)
+    for row, offset in metrics.timed_iter('read', iter_csv_rows(csv_file)):
+        ...
+    BatchWriter(..., metrics=metrics)
+    metrics.finish(args)   # summary, plus --metrics-json / --metrics-prom files
+
+--metrics-json writes a JSON run report; --metrics-prom writes a file for
+the Prometheus node_exporter textfile collector, replaced atomically so a
+scrape never sees half a file.
+"""
+
+import json
+import os
+import resource
+import sys
+import time
+from collections import Counter
+from datetime import datetime
+
+MAX_PRINTED_REJECTS = 10
+REJECT_SAMPLES = 20
+# Batch latency histogram bucket bounds (seconds)
+BATCH_BUCKETS = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0]
+METRIC_PREFIX = 'partner_report_ingest'
+
+def add_metrics_arguments(parser):
+    """Add --metrics-json and --metrics-prom to an argparse parser"""
+    parser.add_argument('--metrics-json', metavar='PATH', default=None,
+                        help='Write a JSON run report (stage times, rows/s, batch latencies, rejects)')
+    parser.add_argument('--metrics-prom', metavar='PATH', default=None,
+                        help='Write the run metrics for the Prometheus textfile collector (*.prom)')
+    return parser
+
+def peak_rss_bytes(who=resource.RUSAGE_SELF):
+    rss = resource.getrusage(who).ru_maxrss
+    # KB on Linux, bytes on macOS
+    return rss if sys.platform == 'darwin' else rss * 1024
+
+def percentile(values, fraction):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return round(ordered[min(len(ordered) - 1, int(fraction * len(ordered)))], 6)
+
+class IngestMetrics:
+    """Stage timers, counters, batch latencies and rejects of one import"""
+
+    def __init__(self, importer, source=None):
+        self.importer = importer
+        self.source = source
+        self.started_at = datetime.now()
+        self._started = time.perf_counter()
+        self.duration = None
+        self.stages = Counter()
+        self.rows_read = 0
+        self.rows_written = 0
+        self.rejects = Counter()
+        self.reject_samples = []
+        self.batch_latencies = []
+
+    # Timing
+
+    def add_time(self, stage, seconds):
+        self.stages[stage] += seconds
+
+    def timed(self, stage, function):
+        """function wrapped so its run time is added to stage"""
+        stages = self.stages
+        clock = time.perf_counter
+
+        def wrapper(*args, **kwargs):
+            start = clock()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                stages[stage] += clock() - start
+        return wrapper
+
+    def timed_iter(self, stage, iterable):
+        """iterable, with the time spent producing each item added to stage"""
+        stages = self.stages
+        clock = time.perf_counter
+        iterator = iter(iterable)
+        while True:
+            start = clock()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                stages[stage] += clock() - start
+                return
+            stages[stage] += clock() - start
+            yield item
+
+    def observe_batch(self, seconds):
+        self.batch_latencies.append(seconds)
+
+    def reset(self, keep=()):
+        """Forget the counters and stage times of a failed attempt, except the stages in keep
+
+        Used before an importer retries the whole file another way, so the
+        rows of the failed attempt are not counted twice. Cleared in place:
+        timed() wrappers keep recording into the same Counter.
+        """
+        kept = {stage: self.stages[stage] for stage in keep if stage in self.stages}
+        self.stages.clear()
+        self.stages.update(kept)
+        self.rows_read = 0
+        self.rows_written = 0
+        self.rejects.clear()
+        self.reject_samples.clear()
+        self.batch_latencies.clear()
+
+    # Rejects
+
+    def reject(self, reason, detail=None, rows=1):
+        """Count rejected rows; the first MAX_PRINTED_REJECTS are printed"""
+        total = sum(self.rejects.values())
+        self.rejects[reason] += rows
+        if len(self.reject_samples) < REJECT_SAMPLES:
+            self.reject_samples.append({'reason': reason, 'detail': str(detail) if detail else None})
+        if total < MAX_PRINTED_REJECTS:
+            print(f"  ✗ Rejected ({reason}): {detail}")
+            if total + rows >= MAX_PRINTED_REJECTS:
+                print("  (further rejects are counted, not printed)")
+
+    @property
+    def rejected(self):
+        return sum(self.rejects.values())
+
+    # Parallel workers
+
+    def to_dict(self):
+        """Picklable state, for merge() in the parent of a worker pool"""
+        return {
+            'stages': dict(self.stages), 'rows_read': self.rows_read, 'rows_written': self.rows_written,
+            'rejects': dict(self.rejects), 'reject_samples': self.reject_samples,
+            'batch_latencies': self.batch_latencies,
+        }
+
+    def merge(self, other):
+        """Add the counters of a worker's to_dict()"""
+        self.stages.update(other['stages'])
+        self.rows_read += other['rows_read']
+        self.rows_written += other['rows_written']
+        self.rejects.update(other['rejects'])
+        self.reject_samples.extend(other['reject_samples'][:REJECT_SAMPLES - len(self.reject_samples)])
+        self.batch_latencies.extend(other['batch_latencies'])
+
+    # Output
+
+    def histogram(self):
+        """Cumulative (upper bound, count) pairs, Prometheus style"""
+        return [(bound, sum(1 for latency in self.batch_latencies if latency <= bound))
+                for bound in BATCH_BUCKETS] + [('+Inf', len(self.batch_latencies))]
+
+    def report(self):
+        duration = self.duration if self.duration is not None else time.perf_counter() - self._started
+        latencies = self.batch_latencies
+        return {
+            'importer': self.importer,
+            'source': self.source,
+            'started_at': self.started_at.isoformat(timespec='seconds'),
+            'duration_s': round(duration, 3),
+            'rows': {'read': self.rows_read, 'written': self.rows_written, 'rejected': self.rejected},
+            'rows_per_s': round(self.rows_written / duration, 1) if duration > 0 else None,
+            'stages_s': {stage: round(seconds, 3) for stage, seconds in sorted(self.stages.items())},
+            'batches': {
+                'count': len(latencies),
+                'latency_s': {'p50': percentile(latencies, 0.50), 'p95': percentile(latencies, 0.95),
+                              'p99': percentile(latencies, 0.99), 'max': round(max(latencies), 6) if latencies else None},
+                'histogram': [[str(bound), count] for bound, count in self.histogram()],
+            },
+            'peak_rss_bytes': peak_rss_bytes(),
+            'children_peak_rss_bytes': peak_rss_bytes(resource.RUSAGE_CHILDREN),
+            'rejects': dict(self.rejects),
+            'reject_samples': self.reject_samples,
+        }
+
+    def prometheus(self):
+        """The run in the Prometheus text exposition format"""
+        report = self.report()
+        labels = f'importer="{self.importer}"'
+        p = METRIC_PREFIX
+        lines = [
+            f"# HELP {p}_last_run_timestamp_seconds Start of the last import run",
+            f"# TYPE {p}_last_run_timestamp_seconds gauge",
+            f"{p}_last_run_timestamp_seconds{{{labels}}} {self.started_at.timestamp():.0f}",
+            f"# HELP {p}_duration_seconds Wall time of the last import run",
+            f"# TYPE {p}_duration_seconds gauge",
+            f"{p}_duration_seconds{{{labels}}} {report['duration_s']}",
+            f"# HELP {p}_rows Rows read, written and rejected by the last run",
+            f"# TYPE {p}_rows gauge",
+        ]
+        lines += [f'{p}_rows{{{labels},kind="{kind}"}} {count}' for kind, count in report['rows'].items()]
+        lines += [
+            f"# HELP {p}_rows_per_second Rows written per second of wall time",
+            f"# TYPE {p}_rows_per_second gauge",
+            f"{p}_rows_per_second{{{labels}}} {report['rows_per_s'] or 0}",
+            f"# HELP {p}_stage_seconds Time spent per stage (summed over threads and workers)",
+            f"# TYPE {p}_stage_seconds gauge",
+        ]
+        lines += [f'{p}_stage_seconds{{{labels},stage="{stage}"}} {seconds}'
+                  for stage, seconds in report['stages_s'].items()]
+        lines += [
+            f"# HELP {p}_batch_seconds Latency of the batch INSERT statements",
+            f"# TYPE {p}_batch_seconds histogram",
+        ]
+        lines += [f'{p}_batch_seconds_bucket{{{labels},le="{bound}"}} {count}' for bound, count in self.histogram()]
+        lines += [
+            f"{p}_batch_seconds_sum{{{labels}}} {sum(self.batch_latencies):.6f}",
+            f"{p}_batch_seconds_count{{{labels}}} {len(self.batch_latencies)}",
+            f"# HELP {p}_peak_rss_bytes Peak resident memory of the importer (and of its workers)",
+            f"# TYPE {p}_peak_rss_bytes gauge",
+            f'{p}_peak_rss_bytes{{{labels},process="main"}} {report["peak_rss_bytes"]}',
+            f'{p}_peak_rss_bytes{{{labels},process="workers"}} {report["children_peak_rss_bytes"]}',
+            f"# HELP {p}_rejects Rows rejected by the last run, per reason",
+            f"# TYPE {p}_rejects gauge",
+        ]
+        lines += [f'{p}_rejects{{{labels},reason="{reason}"}} {count}' for reason, count in sorted(self.rejects.items())]
+        return '\n'.join(lines) + '\n'
+
+    def print_summary(self):
+        report = self.report()
+        rows = report['rows']
+        print(f"\n⏱️  {self.importer}: {rows['written']:,} rows written, {rows['read']:,} read, "
+              f"{rows['rejected']:,} rejected in {report['duration_s']:.2f}s "
+              f"({report['rows_per_s'] or 0:,.0f} rows/s, peak RSS {report['peak_rss_bytes'] / 1e6:,.0f} MB)")
+        if report['stages_s']:
+            print("   " + ', '.join(f"{stage} {seconds:.2f}s" for stage, seconds in report['stages_s'].items()))
+        latency = report['batches']['latency_s']
+        if report['batches']['count']:
+            print(f"   {report['batches']['count']:,} batches, latency p50 {latency['p50'] * 1000:.1f} ms, "
+                  f"p95 {latency['p95'] * 1000:.1f} ms, max {latency['max'] * 1000:.1f} ms")
+        if self.rejects:
+            print("   rejects: " + ', '.join(f"{reason} {count:,}" for reason, count in self.rejects.most_common()))
+
+    def finish(self, args=None):
+        """Stop the clock, print the summary and write the files requested in args"""
+        if self.duration is None:
+            self.duration = time.perf_counter() - self._started
+        self.print_summary()
+        json_path = getattr(args, 'metrics_json', None)
+        prom_path = getattr(args, 'metrics_prom', None)
+        if json_path:
+            write_atomic(json_path, json.dumps(self.report(), indent=2) + '\n')
+            print(f"✓ Run report saved to {json_path}")
+        if prom_path:
+            write_atomic(prom_path, self.prometheus())
+            print(f"✓ Prometheus metrics saved to {prom_path}")
+
+def write_atomic(path, text):
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    temp = f"{path}.{os.getpid()}.tmp"
+    with open(temp, 'w', encoding='utf-8') as f:
+        f.write(text)
+    os.replace(temp, path)
@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""
+Incremental reader for large JSON exports like database.json
+
+iter_json_array(path, key) yields the records of one top-level array
+(e.g. "clients") one at a time. The file is read in fixed-size chunks and
+sections that are not requested are skipped without being decoded, so
+memory stays bounded by the size of a single record whatever the file size.
+"""
+
+import json
+import re
+
+CHUNK_SIZE = 1024 * 1024
+WHITESPACE = ' \t\n\r'
+NUMBER_DELIMITERS = ',]}' + WHITESPACE
+STRING_SPECIAL = re.compile(r'["\\]')
+STRUCTURE_SPECIAL = re.compile(r'[{}\[\]"]')
+
+class JSONStreamReader:
+    """Chunked character reader with just enough JSON parsing to walk arrays"""
+
+    def __init__(self, f, chunk_size=CHUNK_SIZE):
+        self.f = f
+        self.chunk_size = chunk_size
+        self.buf = ''
+        self.pos = 0
+        self.eof = False
+        self.decoder = json.JSONDecoder()
+
+    def _fill(self):
+        """Read the next chunk, dropping the consumed part of the buffer"""
+        if self.eof:
+            return False
+        chunk = self.f.read(self.chunk_size)
+        if not chunk:
+            self.eof = True
+            return False
+        self.buf = self.buf[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def peek(self):
+        """Return the next non-whitespace character without consuming it"""
+        while True:
+            while self.pos < len(self.buf) and self.buf[self.pos] in WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self._fill():
+                return ''
+
+    def expect(self, char):
+        """Consume the next non-whitespace character, which must be char"""
+        found = self.peek()
+        if found != char:
+            raise ValueError(f"Expected '{char}' but found '{found or 'EOF'}'")
+        self.pos += 1
+
+    def decode_value(self):
+        """Decode one complete JSON value, reading more data as needed"""
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buf, self.pos)
+                # A number is only complete once a delimiter follows it
+                # ("-4." or "1e" at the end of a chunk decode as -4 and 1)
+                if (self.eof or not isinstance(value, (int, float))
+                        or (end < len(self.buf) and self.buf[end] in NUMBER_DELIMITERS)):
+                    self.pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+            self._fill()
+
+    def skip_value(self):
+        """Consume one JSON value without building it"""
+        first = self.peek()
+        if first not in '{["':
+            self.decode_value()
+            return
+
+        depth = 0
+        in_string = False
+        while True:
+            pattern = STRING_SPECIAL if in_string else STRUCTURE_SPECIAL
+            match = pattern.search(self.buf, self.pos)
+            if match is None:
+                self.pos = len(self.buf)
+                if not self._fill():
+                    raise ValueError('Unexpected end of JSON input')
+                continue
+
+            char = match.group()
+            self.pos = match.end()
+            if char == '\\':
+                # Skip the escaped character, which may be in the next chunk
+                if self.pos >= len(self.buf) and not self._fill():
+                    raise ValueError('Unexpected end of JSON input')
+                self.pos += 1
+            elif char == '"':
+                in_string = not in_string
+                if not in_string and depth == 0:
+                    return
+            elif char in '{[':
+                depth += 1
+            else:
+                depth -= 1
+                if depth == 0:
+                    return
+
+    def iter_array(self):
+        """Yield the elements of the array starting at the current position"""
+        self.expect('[')
+        if self.peek() == ']':
+            self.pos += 1
+            return
+        while True:
+            yield self.decode_value()
+            separator = self.peek()
+            self.pos += 1
+            if separator == ']':
+                return
+            if separator != ',':
+                raise ValueError(f"Expected ',' or ']' but found '{separator or 'EOF'}'")
+
+def iter_json_array(path, key, chunk_size=CHUNK_SIZE):
+    """Yield the records of the top-level array `key` one at a time"""
+    with open(path, 'r', encoding='utf-8') as f:
+        reader = JSONStreamReader(f, chunk_size)
+        reader.expect('{')
+        if reader.peek() == '}':
+            return
+
+        while True:
+            name = reader.decode_value()
+            reader.expect(':')
+            if name == key and reader.peek() == '[':
+                yield from reader.iter_array()
+                return
+            reader.skip_value()
+
+            separator = reader.peek()
+            reader.pos += 1
+            if separator == '}':
+                return
+            if separator != ',':
+                raise ValueError(f"Expected ',' or '}}' but found '{separator or 'EOF'}'")
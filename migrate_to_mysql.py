@@ -1,28 +1,28 @@
 #!/usr/bin/env python3
 """
 Migration script to convert JSON database to MySQL
+
+database.json is read incrementally (json_stream.iter_json_array), one
+record at a time, and written with batched multi-row INSERTs, so memory
+use stays flat however large the export is.
 """
 
+import argparse
 import json
-import mysql.connector
-from mysql.connector import Error
+from db import Error, connect
+import resource
 import sys
+import time
 from datetime import datetime
+from batch_writer import BatchWriter, add_batch_arguments, update_all_columns
+from json_stream import iter_json_array
 
-# Database configuration
-DB_CONFIG = {
-    'host': 'localhost',
-    'database': 'partner_report',
-    'user': 'root',
-    'password': '',  # Update with your MySQL password
-    'charset': 'utf8mb4',
-    'collation': 'utf8mb4_unicode_ci'
-}
+JSON_FILE = 'database.json'
 
 def connect_to_mysql():
     """Create connection to MySQL database"""
     try:
-        connection = mysql.connector.connect(**DB_CONFIG)
+        connection = connect(charset='utf8mb4', collation='utf8mb4_unicode_ci')
         if connection.is_connected():
             print("Successfully connected to MySQL database")
             return connection
@@ -30,83 +30,67 @@ def connect_to_mysql():
         print(f"Error connecting to MySQL: {e}")
         sys.exit(1)
 
-def load_json_data():
-    """Load data from JSON file"""
+def check_json_file(json_file):
+    """Make sure the JSON export exists and is readable"""
     try:
-        with open('database.json', 'r', encoding='utf-8') as f:
-            data = json.load(f)
-        print(f"Successfully loaded JSON data")
-        return data
+        with open(json_file, 'r', encoding='utf-8') as f:
+            if f.read(1) != '{':
+                raise json.JSONDecodeError('Expected a top-level object', '', 0)
+        print(f"Streaming JSON data from {json_file}")
     except FileNotFoundError:
-        print("Error: database.json file not found")
+        print(f"Error: {json_file} file not found")
         sys.exit(1)
     except json.JSONDecodeError as e:
         print(f"Error parsing JSON: {e}")
         sys.exit(1)
 
-def migrate_partners(connection, data):
+def peak_rss_mb():
+    """Peak resident set size of this process in MB"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is reported in bytes on macOS and kilobytes on Linux
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+def migrate_partners(connection, records, batch_size=1000, commit_every=10000):
     """Migrate partners data"""
-    cursor = connection.cursor()
-    
-    partners = data.get('partners', [])
-    print(f"Migrating {len(partners)} partners...")
-    
-    for partner in partners:
-        try:
-            query = """
-            INSERT INTO partners (partner_id, name, tier)
-            VALUES (%s, %s, %s)
-            ON DUPLICATE KEY UPDATE
-            name = VALUES(name),
-            tier = VALUES(tier)
-            """
-            cursor.execute(query, (
+    columns = ['partner_id', 'name', 'tier']
+    with BatchWriter(connection, 'partners', columns, batch_size, commit_every,
+                     on_duplicate=update_all_columns(columns, key_columns=('partner_id',)),
+                     label='partners') as writer:
+        for partner in records:
+            writer.add((
                 partner.get('partnerId'),
                 partner.get('name'),
                 partner.get('tier')
             ))
-        except Error as e:
-            print(f"Error inserting partner {partner.get('partnerId')}: {e}")
-    
-    connection.commit()
-    print(f"Successfully migrated {len(partners)} partners")
+    return writer
 
-def migrate_partner_tiers(connection, data):
+def migrate_partner_tiers(connection, records, batch_size=1000, commit_every=10000):
     """Migrate partner tiers data"""
-    cursor = connection.cursor()
-    
-    partner_tiers = data.get('partnerTiers', [])
-    print(f"Migrating {len(partner_tiers)} partner tiers...")
-    
-    for tier in partner_tiers:
-        try:
-            query = """
-            INSERT INTO partner_tiers (tier, range_description, reward)
-            VALUES (%s, %s, %s)
-            ON DUPLICATE KEY UPDATE
-            range_description = VALUES(range_description),
-            reward = VALUES(reward)
-            """
-            cursor.execute(query, (
+    columns = ['tier', 'range_description', 'reward']
+    with BatchWriter(connection, 'partner_tiers', columns, batch_size, commit_every,
+                     on_duplicate=update_all_columns(columns, key_columns=('tier',)),
+                     label='partner tiers') as writer:
+        for tier in records:
+            writer.add((
                 tier.get('tier'),
                 tier.get('range'),
                 tier.get('reward')
             ))
-        except Error as e:
-            print(f"Error inserting tier {tier.get('tier')}: {e}")
-    
-    connection.commit()
-    print(f"Successfully migrated {len(partner_tiers)} partner tiers")
+    return writer
+
+CLIENT_COLUMNS = [
+    'customer_id', 'name', 'join_date', 'account_type', 'account_number',
+    'country', 'lifetime_deposits', 'commission_plan', 'tracking_link_used',
+    'tier', 'sub_partner', 'partner_id', 'email', 'preferred_language',
+    'gender', 'age'
+]
 
-def migrate_clients(connection, data):
+def migrate_clients(connection, records, batch_size=1000, commit_every=10000):
     """Migrate clients data"""
-    cursor = connection.cursor()
-    
-    clients = data.get('clients', [])
-    print(f"Migrating {len(clients)} clients...")
-    
-    for client in clients:
-        try:
+    with BatchWriter(connection, 'clients', CLIENT_COLUMNS, batch_size, commit_every,
+                     on_duplicate=update_all_columns(CLIENT_COLUMNS, key_columns=('customer_id',)),
+                     label='clients') as writer:
+        for client in records:
             # Parse join date
             join_date = None
             if client.get('joinDate'):
@@ -114,33 +98,8 @@ def migrate_clients(connection, data):
                     join_date = datetime.strptime(client.get('joinDate'), '%Y-%m-%d').date()
                 except ValueError:
                     print(f"Invalid join date for client {client.get('customerId')}: {client.get('joinDate')}")
-            
-            query = """
-            INSERT INTO clients (
-                customer_id, name, join_date, account_type, account_number,
-                country, lifetime_deposits, commission_plan, tracking_link_used,
-                tier, sub_partner, partner_id, email, preferred_language,
-                gender, age
-            )
-            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-            ON DUPLICATE KEY UPDATE
-            name = VALUES(name),
-            join_date = VALUES(join_date),
-            account_type = VALUES(account_type),
-            account_number = VALUES(account_number),
-            country = VALUES(country),
-            lifetime_deposits = VALUES(lifetime_deposits),
-            commission_plan = VALUES(commission_plan),
-            tracking_link_used = VALUES(tracking_link_used),
-            tier = VALUES(tier),
-            sub_partner = VALUES(sub_partner),
-            partner_id = VALUES(partner_id),
-            email = VALUES(email),
-            preferred_language = VALUES(preferred_language),
-            gender = VALUES(gender),
-            age = VALUES(age)
-            """
-            cursor.execute(query, (
+
+            writer.add((
                 client.get('customerId'),
                 client.get('name'),
                 join_date,
@@ -158,100 +117,89 @@ def migrate_clients(connection, data):
                 client.get('gender'),
                 client.get('age')
             ))
-        except Error as e:
-            print(f"Error inserting client {client.get('customerId')}: {e}")
-    
-    connection.commit()
-    print(f"Successfully migrated {len(clients)} clients")
+    return writer
 
-def migrate_trades(connection, data):
-    """Migrate trades data"""
-    cursor = connection.cursor()
-    
-    trades = data.get('trades', [])
-    print(f"Migrating {len(trades)} trades...")
-    
-    for trade in trades:
+def parse_date_time(value, label):
+    """Parse 'YYYY-MM-DD HH:MM:SS' or 'YYYY-MM-DD' (None if missing or invalid)"""
+    if not value:
+        return None
+    try:
+        return datetime.strptime(value, '%Y-%m-%d %H:%M:%S')
+    except ValueError:
         try:
-            # Parse date time
-            date_time = None
-            if trade.get('dateTime'):
-                try:
-                    date_time = datetime.strptime(trade.get('dateTime'), '%Y-%m-%d %H:%M:%S')
-                except ValueError:
-                    try:
-                        date_time = datetime.strptime(trade.get('dateTime'), '%Y-%m-%d')
-                    except ValueError:
-                        print(f"Invalid date for trade: {trade.get('dateTime')}")
-            
-            query = """
-            INSERT INTO trades (customer_id, date_time, commission, volume)
-            VALUES (%s, %s, %s, %s)
-            """
-            cursor.execute(query, (
+            return datetime.strptime(value, '%Y-%m-%d')
+        except ValueError:
+            print(f"Invalid date for {label}: {value}")
+            return None
+
+def migrate_trades(connection, records, batch_size=1000, commit_every=10000):
+    """Migrate trades data"""
+    columns = ['customer_id', 'date_time', 'commission', 'volume']
+    with BatchWriter(connection, 'trades', columns, batch_size, commit_every,
+                     label='trades') as writer:
+        for trade in records:
+            writer.add((
                 trade.get('customerId'),
-                date_time,
+                parse_date_time(trade.get('dateTime'), 'trade'),
                 trade.get('commission', 0.0),
                 trade.get('volume', 0.0)
             ))
-        except Error as e:
-            print(f"Error inserting trade: {e}")
-    
-    connection.commit()
-    print(f"Successfully migrated {len(trades)} trades")
+    return writer
 
-def migrate_deposits(connection, data):
+def migrate_deposits(connection, records, batch_size=1000, commit_every=10000):
     """Migrate deposits data"""
-    cursor = connection.cursor()
-    
-    deposits = data.get('deposits', [])
-    print(f"Migrating {len(deposits)} deposits...")
-    
-    for deposit in deposits:
-        try:
-            # Parse date time
-            date_time = None
-            if deposit.get('dateTime'):
-                try:
-                    date_time = datetime.strptime(deposit.get('dateTime'), '%Y-%m-%d %H:%M:%S')
-                except ValueError:
-                    try:
-                        date_time = datetime.strptime(deposit.get('dateTime'), '%Y-%m-%d')
-                    except ValueError:
-                        print(f"Invalid date for deposit: {deposit.get('dateTime')}")
-            
-            query = """
-            INSERT INTO deposits (customer_id, date_time, value)
-            VALUES (%s, %s, %s)
-            """
-            cursor.execute(query, (
+    columns = ['customer_id', 'date_time', 'value']
+    with BatchWriter(connection, 'deposits', columns, batch_size, commit_every,
+                     label='deposits') as writer:
+        for deposit in records:
+            writer.add((
                 deposit.get('customerId'),
-                date_time,
+                parse_date_time(deposit.get('dateTime'), 'deposit'),
                 deposit.get('value', 0.0)
             ))
-        except Error as e:
-            print(f"Error inserting deposit: {e}")
-    
-    connection.commit()
-    print(f"Successfully migrated {len(deposits)} deposits")
+    return writer
+
+# (label, JSON key, migrate function) in foreign key order
+SECTIONS = [
+    ('partners', 'partners', migrate_partners),
+    ('partner tiers', 'partnerTiers', migrate_partner_tiers),
+    ('clients', 'clients', migrate_clients),
+    ('trades', 'trades', migrate_trades),
+    ('deposits', 'deposits', migrate_deposits),
+]
+
+def migrate_section(connection, json_file, label, key, migrate, batch_size, commit_every):
+    """Stream one top-level array into MySQL and report its throughput"""
+    print(f"Migrating {label}...")
+    start = time.perf_counter()
+    writer = migrate(connection, iter_json_array(json_file, key), batch_size, commit_every)
+    elapsed = time.perf_counter() - start
+    rate = writer.written / elapsed if elapsed > 0 else 0
+    print(f"Successfully migrated {writer.written} {label} in {elapsed:.2f}s "
+          f"({rate:,.0f} records/s, peak RSS {peak_rss_mb():.1f} MB)")
+    if writer.errors:
+        print(f"  Failed to write {writer.errors} {label}")
 
 def main():
     """Main migration function"""
+    parser = argparse.ArgumentParser(description='Migrate database.json into MySQL')
+    parser.add_argument('json_file', nargs='?', default=JSON_FILE, help='Path to the JSON export')
+    add_batch_arguments(parser)
+    args = parser.parse_args()
+
     print("Starting JSON to MySQL migration...")
     
     # Connect to MySQL
     connection = connect_to_mysql()
     
-    # Load JSON data
-    data = load_json_data()
+    # Check the JSON export (records are streamed per section)
+    check_json_file(args.json_file)
     
     try:
         # Migrate data in order (respecting foreign key constraints)
-        migrate_partners(connection, data)
-        migrate_partner_tiers(connection, data)
-        migrate_clients(connection, data)
-        migrate_trades(connection, data)
-        migrate_deposits(connection, data)
+        for label, key, migrate in SECTIONS:
+            migrate_section(connection, args.json_file, label, key, migrate,
+                            args.batch_size, args.commit_every)
         
         # Award badges to partners
         print("\nAwarding badges to partners...")
@@ -296,6 +244,9 @@ def main():
     except Error as e:
         print(f"Migration failed: {e}")
         connection.rollback()
+    except ValueError as e:
+        print(f"Error parsing JSON: {e}")
+        connection.rollback()
     finally:
         if connection.is_connected():
             connection.close()
@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+binary_user_id -> partnerId map for the trades import
+
+The trades cube triggers (and BulkCubeSession.trade_hook) look up each
+trade's client in the clients table to find the partner whose cubes need
+refreshing. PartnerMap loads the whole mapping once, so the importer can
+resolve partners while it parses:
+- an empty affiliated_partner_id is stamped with the client's partner
+  (a value present in the CSV is kept)
+- the partners of the clients seen are collected in touched, and the
+  deferred cube refresh queues them without querying clients
+
+    partners = PartnerMap.open(conn, snapshot='partners.tsv.gz')
+    values = partners.stamp(values, USER_ID_INDEX, PARTNER_INDEX)
+    cubes.partner_hook(partners, USER_ID_INDEX)
+
+Partner IDs are interned, so a few hundred partners shared by millions of
+clients cost one string each. With a snapshot path the map is read from
+that file (gzip TSV) while it is younger than max_age hours and written
+there after loading it from clients otherwise; pass max_age=0 to always
+reload. Clients imported after the map was loaded are not in it; their
+trades keep the CSV value and are not queued.
+"""
+
+import argparse
+import gzip
+import os
+import sys
+import time
+
+SNAPSHOT_MAX_AGE_HOURS = 24
+FETCH_SIZE = 10000
+
+PARTNER_QUERY = "SELECT binary_user_id, partnerId FROM clients WHERE partnerId IS NOT NULL AND partnerId <> ''"
+
+def add_partner_map_arguments(parser):
+    """Add --resolve-partners, --partner-snapshot and --partner-snapshot-max-age to an argparse parser"""
+    parser.add_argument('--resolve-partners', action=argparse.BooleanOptionalAction, default=True,
+                        help='Load the client -> partner map once, fill empty affiliated_partner_id '
+                             'and queue cube refreshes without per-batch client lookups (default: on)')
+    parser.add_argument('--partner-snapshot', metavar='PATH', default=None,
+                        help='Cache the client -> partner map in this file (gzip TSV) between runs')
+    parser.add_argument('--partner-snapshot-max-age', type=float, default=SNAPSHOT_MAX_AGE_HOURS,
+                        help='Reload from clients when the snapshot is older than this many hours '
+                             f'(default: {SNAPSHOT_MAX_AGE_HOURS})')
+    return parser
+
+class PartnerMap:
+    """Partner of every client, plus the partners touched by the rows stamped"""
+
+    def __init__(self, partners=None, source=None):
+        self.partners = {}
+        self.source = source
+        self.touched = set()
+        self.stamped = 0
+        self._interned = {}
+        for user_id, partner_id in (partners or {}).items():
+            self.add(user_id, partner_id)
+
+    def __len__(self):
+        return len(self.partners)
+
+    def add(self, user_id, partner_id):
+        partner_id = self._interned.setdefault(partner_id, partner_id)
+        self.partners[sys.intern(str(user_id))] = partner_id
+
+    def get(self, user_id):
+        return self.partners.get(user_id)
+
+    @classmethod
+    def load(cls, connection):
+        """Read the map from the clients table"""
+        partner_map = cls(source='clients')
+        cursor = connection.cursor()
+        cursor.execute(PARTNER_QUERY)
+        while True:
+            rows = cursor.fetchmany(FETCH_SIZE)
+            if not rows:
+                break
+            for user_id, partner_id in rows:
+                partner_map.add(user_id, partner_id)
+        cursor.close()
+        return partner_map
+
+    @classmethod
+    def from_snapshot(cls, path):
+        partner_map = cls(source=path)
+        with gzip.open(path, 'rt', encoding='utf-8', newline='\n') as f:
+            for line in f:
+                user_id, partner_id = line.rstrip('\n').split('\t')
+                partner_map.add(user_id, partner_id)
+        return partner_map
+
+    def save(self, path):
+        """Write the map to a snapshot file (replaced atomically)"""
+        temp = f"{path}.{os.getpid()}.tmp"
+        with gzip.open(temp, 'wt', encoding='utf-8', newline='\n', compresslevel=6) as f:
+            for user_id, partner_id in self.partners.items():
+                f.write(f"{user_id}\t{partner_id}\n")
+        os.replace(temp, path)
+
+    @classmethod
+    def open(cls, connection, snapshot=None, max_age=SNAPSHOT_MAX_AGE_HOURS):
+        """The map from a fresh enough snapshot, else from clients (saving the snapshot)"""
+        start = time.perf_counter()
+        if snapshot and os.path.exists(snapshot) and max_age > 0:
+            age = (time.time() - os.path.getmtime(snapshot)) / 3600
+            if age < max_age:
+                partner_map = cls.from_snapshot(snapshot)
+                print(f"  Partner map: {len(partner_map):,} clients from {snapshot} "
+                      f"({age:.1f}h old) in {time.perf_counter() - start:.2f}s")
+                return partner_map
+        partner_map = cls.load(connection)
+        print(f"  Partner map: {len(partner_map):,} clients from clients "
+              f"in {time.perf_counter() - start:.2f}s")
+        if snapshot:
+            partner_map.save(snapshot)
+            print(f"  ✓ Partner snapshot saved to {snapshot}")
+        return partner_map
+
+    def stamp(self, values, user_index, partner_index):
+        """values with an empty partner filled from the map; records the client's partner as touched"""
+        if values is None:
+            return None
+        partner_id = self.partners.get(values[user_index])
+        if partner_id is None:
+            return values
+        self.touched.add(partner_id)
+        if values[partner_index] is not None:
+            return values
+        self.stamped += 1
+        return values[:partner_index] + (partner_id,) + values[partner_index + 1:]
+
+    def report(self):
+        return (f"{self.stamped:,} trades stamped with their client's partner, "
+                f"{len(self.touched):,} partners touched")
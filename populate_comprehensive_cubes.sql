@@ -118,12 +118,13 @@ BEGIN
     INSERT INTO cube_commissions_symbol (partner_id, asset, total_commissions, trade_count)
     SELECT 
         t.affiliated_partner_id as partner_id,
-        COALESCE(t.asset, 'Unknown') as asset,
+        -- Unified symbol added at import (add_trade_symbol_columns.sql), raw asset otherwise
+        COALESCE(t.unified_symbol, t.asset, 'Unknown') as asset,
         SUM(t.closed_pnl_usd) as total_commissions,
         SUM(t.number_of_trades) as trade_count
     FROM trades t
     WHERE t.affiliated_partner_id IS NOT NULL
-    GROUP BY t.affiliated_partner_id, t.asset
+    GROUP BY t.affiliated_partner_id, COALESCE(t.unified_symbol, t.asset, 'Unknown')
     LIMIT 1000;
 END$$
 
@@ -261,14 +262,14 @@ BEGIN
     INSERT INTO cube_product_volume (partner_id, asset_type, total_volume, trade_count, avg_trade_size, client_count)
     SELECT 
         t.affiliated_partner_id as partner_id,
-        COALESCE(t.asset_type, 'Unknown') as asset_type,
+        COALESCE(t.unified_asset_type, t.asset_type, 'Unknown') as asset_type,
         SUM(t.volume_usd) as total_volume,
         SUM(t.number_of_trades) as trade_count,
         AVG(t.volume_usd / NULLIF(t.number_of_trades, 0)) as avg_trade_size,
         COUNT(DISTINCT t.binary_user_id) as client_count
     FROM trades t
     WHERE t.affiliated_partner_id IS NOT NULL
-    GROUP BY t.affiliated_partner_id, t.asset_type;
+    GROUP BY t.affiliated_partner_id, COALESCE(t.unified_asset_type, t.asset_type, 'Unknown');
 END$$
 
 -- ============================================================================
@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""
+Render cache for the population pyramid scripts
+
+A pyramid only changes when its partner's clients change, so every rendered
+PNG is kept on disk together with its stats dict, keyed by renderer and
+partner ID. The cache entry records a data version: the row count and
+MAX(updated_at) of the partner's clients (one cheap query, or one grouped
+query for --all-partners). While the version is unchanged, the cached PNG is
+copied to the output file and neither the counts query nor the render runs.
+
+Entries not used for --cache-max-age-days are evicted, and beyond
+--cache-max-entries the least recently used ones go first.
+"""
+
+import json
+import os
+import re
+import shutil
+import time
+from pathlib import Path
+
+CACHE_DIR = Path(__file__).parent / '.pyramid_cache'
+INDEX_FILE = 'index.json'
+DEFAULT_MAX_ENTRIES = 5000
+DEFAULT_MAX_AGE_DAYS = 30
+ALL_PARTNERS = '*'
+
+def add_cache_arguments(parser):
+    """Add the render cache options to an argparse parser"""
+    parser.add_argument('--no-cache', action='store_true',
+                        help='Always query and render, ignoring the render cache')
+    parser.add_argument('--cache-dir', default=str(CACHE_DIR),
+                        help=f'Render cache directory (default: {CACHE_DIR})')
+    parser.add_argument('--cache-max-entries', type=int, default=DEFAULT_MAX_ENTRIES,
+                        help=f'Keep at most this many cached pyramids (default: {DEFAULT_MAX_ENTRIES})')
+    parser.add_argument('--cache-max-age-days', type=float, default=DEFAULT_MAX_AGE_DAYS,
+                        help=f'Evict pyramids unused for this many days (default: {DEFAULT_MAX_AGE_DAYS})')
+    return parser
+
+def format_version(count, last_updated):
+    return f"{count}:{last_updated.isoformat() if last_updated else ''}"
+
+def fetch_versions(conn, partner_ids=None):
+    """{partner_id: data version} for the given partners (None: every partner)"""
+    cursor = conn.cursor()
+    where = ""
+    if partner_ids is not None:
+        if not partner_ids:
+            return {}
+        where = f"WHERE partnerId IN ({', '.join(['%s'] * len(partner_ids))})"
+    cursor.execute(f"""
+        SELECT partnerId, COUNT(*), MAX(updated_at)
+        FROM clients
+        {where}
+        GROUP BY partnerId
+    """, list(partner_ids or []))
+    versions = {partner_id: format_version(count, last_updated)
+                for partner_id, count, last_updated in cursor.fetchall() if partner_id is not None}
+    cursor.close()
+    return versions
+
+def fetch_version(conn, partner_id=None):
+    """Data version of one partner's clients, or of the whole table for partner_id=None"""
+    if partner_id:
+        return fetch_versions(conn, [partner_id]).get(partner_id, format_version(0, None))
+    cursor = conn.cursor()
+    cursor.execute("SELECT COUNT(*), MAX(updated_at) FROM clients")
+    count, last_updated = cursor.fetchone()
+    cursor.close()
+    return format_version(count, last_updated)
+
+class PyramidCache:
+    """PNG + stats per (renderer, partner), valid while the partner's data version matches"""
+
+    def __init__(self, renderer, cache_dir=CACHE_DIR, max_entries=DEFAULT_MAX_ENTRIES,
+                 max_age_days=DEFAULT_MAX_AGE_DAYS):
+        self.renderer = renderer
+        self.cache_dir = Path(cache_dir)
+        self.max_entries = max(1, max_entries)
+        self.max_age = max_age_days * 86400
+        self.index_path = self.cache_dir / INDEX_FILE
+        self.hits = 0
+        self.misses = 0
+        self.evicted = 0
+        try:
+            with open(self.index_path, encoding='utf-8') as f:
+                self.entries = json.load(f)
+        except (OSError, ValueError):
+            self.entries = {}
+
+    @classmethod
+    def from_args(cls, renderer, args):
+        """Cache configured by add_cache_arguments() options, or None with --no-cache"""
+        if args.no_cache:
+            return None
+        return cls(renderer, args.cache_dir, args.cache_max_entries, args.cache_max_age_days)
+
+    def _key(self, partner_id):
+        return f"{self.renderer}/{partner_id or ALL_PARTNERS}"
+
+    def _png_path(self, partner_id):
+        name = re.sub(r'[^\w.-]', '_', partner_id or 'all')
+        return self.cache_dir / self.renderer / f"{name}.png"
+
+    def get(self, partner_id, version, output_file):
+        """Copy the cached PNG to output_file and return its stats, or None on a miss"""
+        entry = self.entries.get(self._key(partner_id))
+        png = self._png_path(partner_id)
+        if entry is None or entry['version'] != version or not png.exists():
+            self.misses += 1
+            return None
+        if os.path.abspath(output_file) != os.path.abspath(png):
+            shutil.copyfile(png, output_file)
+        entry['last_used'] = time.time()
+        self.hits += 1
+        return entry['stats']
+
+    def put(self, partner_id, version, output_file, stats):
+        """Store a freshly rendered PNG and its stats"""
+        png = self._png_path(partner_id)
+        png.parent.mkdir(parents=True, exist_ok=True)
+        shutil.copyfile(output_file, png)
+        self.entries[self._key(partner_id)] = {'version': version, 'stats': stats, 'last_used': time.time(),
+                                               'png': str(png.relative_to(self.cache_dir))}
+
+    def evict(self):
+        """Drop entries unused for max_age, then the least recently used beyond max_entries"""
+        now = time.time()
+        ordered = sorted(self.entries.items(), key=lambda item: item[1]['last_used'], reverse=True)
+        keep = {key for key, entry in ordered[:self.max_entries] if now - entry['last_used'] <= self.max_age}
+        for key in [key for key in self.entries if key not in keep]:
+            (self.cache_dir / self.entries.pop(key)['png']).unlink(missing_ok=True)
+            self.evicted += 1
+
+    def save(self):
+        """Evict, then write the index atomically"""
+        self.evict()
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.index_path.with_suffix('.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.entries, f)
+        os.replace(tmp_path, self.index_path)
+
+    def report(self):
+        print(f"Render cache: {self.hits} hits, {self.misses} misses, {self.evicted} evicted "
+              f"({len(self.entries)} cached)")
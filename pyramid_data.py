@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+"""
+Client age/gender counts for the population pyramid scripts
+
+Two ways to get the counts behind the pyramid:
+- aggregate (default): MySQL bins the ages with a CASE expression and
+  returns one (age_group, gender, count) row per bar segment
+- rows: every client's (age, gender) is fetched and binned locally with
+  pd.cut, as the scripts originally did
+
+Both go through pyramid_counts(), so their results can be compared with
+--compare in create_population_pyramid.py / generate_population_pyramid.py.
+fetch_all_partner_counts() returns the aggregate counts of every partner
+from one query, for generate_population_pyramid.py --all-partners; with
+partner_ids it is limited to the partners that missed the render cache
+(pyramid_cache.py).
+
+pandas is imported only by the functions returning DataFrames:
+fetch_pyramid_series() and pyramid_series() build the chart's stats from
+the aggregate rows in plain Python, for the JSON/SVG outputs of
+generate_population_pyramid.py.
+"""
+
+import time
+
+# Left-closed bins, as pd.cut(..., right=False): ages outside [0, 100) get no group
+AGE_BINS = [0, 18, 25, 35, 45, 55, 65, 100]
+AGE_LABELS = ['Under 18', '18-25', '25-35', '35-45', '45-55', '55-65', '65+']
+FETCH_MODES = ['aggregate', 'rows']
+
+def age_group_sql(column='age'):
+    """CASE expression with the same bins as create_age_bins"""
+    whens = ' '.join(f"WHEN {column} >= {low} AND {column} < {high} THEN '{label}'"
+                     for low, high, label in zip(AGE_BINS, AGE_BINS[1:], AGE_LABELS))
+    return f"CASE {whens} END"
+
+def partner_filter(partner_id):
+    """WHERE clause and parameters shared by both fetch modes"""
+    where = "WHERE age IS NOT NULL AND gender IS NOT NULL"
+    if partner_id:
+        return where + " AND partnerId = %s", [partner_id]
+    return where, []
+
+def fetch_age_gender_count_rows(conn, partner_id=None):
+    """(age_group, gender, count) tuples aggregated by MySQL"""
+    where, params = partner_filter(partner_id)
+    cursor = conn.cursor()
+    cursor.execute(f"""
+        SELECT age_group, gender, COUNT(*)
+        FROM (
+            SELECT {age_group_sql()} AS age_group, gender
+            FROM clients
+            {where}
+        ) binned
+        WHERE age_group IS NOT NULL
+        GROUP BY age_group, gender
+    """, params)
+    rows = cursor.fetchall()
+    cursor.close()
+    return rows
+
+def fetch_age_gender_counts(conn, partner_id=None):
+    """(age_group, gender, count) rows aggregated by MySQL"""
+    import pandas as pd
+    return pd.DataFrame(fetch_age_gender_count_rows(conn, partner_id), columns=['age_group', 'gender', 'count'])
+
+def fetch_age_gender_rows(conn, partner_id=None):
+    """Every client's (age, gender), for the local pandas path"""
+    import pandas as pd
+    where, params = partner_filter(partner_id)
+    cursor = conn.cursor()
+    cursor.execute(f"SELECT age, gender FROM clients {where}", params)
+    rows = cursor.fetchall()
+    cursor.close()
+    return pd.DataFrame(rows, columns=['age', 'gender'])
+
+def fetch_client_counts(conn, partner_id=None, mode='aggregate'):
+    """Fetch with one of FETCH_MODES"""
+    if mode == 'rows':
+        return fetch_age_gender_rows(conn, partner_id)
+    return fetch_age_gender_counts(conn, partner_id)
+
+def create_age_bins(df):
+    """Create age group bins"""
+    import pandas as pd
+    df['age_group'] = pd.cut(df['age'], bins=AGE_BINS, labels=AGE_LABELS, right=False)
+    return df
+
+def client_total(df):
+    """Number of clients behind either fetch mode's DataFrame"""
+    if 'count' in df.columns:
+        return int(df['count'].sum())
+    return len(df)
+
+def pyramid_counts(df):
+    """Male/Female counts per age group (in AGE_LABELS order) from either fetch mode"""
+    df = df.copy()
+    # Normalize gender values to title case
+    df['gender'] = df['gender'].str.title()
+
+    if 'count' in df.columns:
+        # Already binned by MySQL; genders differing only in case are merged here
+        grouped = df.groupby(['age_group', 'gender'])['count'].sum().unstack(fill_value=0)
+    else:
+        df = create_age_bins(df)
+        grouped = df.groupby(['age_group', 'gender'], observed=True).size().unstack(fill_value=0)
+
+    # Ensure we have both male and female columns
+    for gender in ('Male', 'Female'):
+        if gender not in grouped.columns:
+            grouped[gender] = 0
+
+    # Sort by age group index
+    grouped.index = grouped.index.astype(str)
+    return grouped.reindex([ag for ag in AGE_LABELS if ag in grouped.index])[['Male', 'Female']].astype(int)
+
+def compare_fetch_modes(conn, partner_id=None):
+    """Fetch with both modes and check that the pyramid counts agree"""
+    import pandas as pd
+    results = {}
+    for mode in FETCH_MODES:
+        start = time.perf_counter()
+        df = fetch_client_counts(conn, partner_id, mode)
+        counts = pyramid_counts(df) if not df.empty else pd.DataFrame(columns=['Male', 'Female'])
+        results[mode] = (counts, len(df), time.perf_counter() - start)
+
+    for mode, (_, rows, elapsed) in results.items():
+        print(f"  {mode:9}: {rows:,} rows fetched in {elapsed:.3f}s")
+    aggregate, rows = results['aggregate'][0], results['rows'][0]
+    same = aggregate.equals(rows)
+    print("✓ Both fetch modes give the same counts" if same else "✗ Fetch modes disagree:")
+    if not same:
+        print(pd.concat({'aggregate': aggregate, 'rows': rows}, axis=1).fillna(0).astype(int))
+    return same
+
+def fetch_all_partner_count_rows(conn, partner_ids=None):
+    """{partner_id: [(age_group, gender, count)]} for every partner (or partner_ids), from one grouped query"""
+    where, params = partner_filter(None)
+    if partner_ids is not None:
+        if not partner_ids:
+            return {}
+        where += f" AND partnerId IN ({', '.join(['%s'] * len(partner_ids))})"
+        params += list(partner_ids)
+    cursor = conn.cursor()
+    cursor.execute(f"""
+        SELECT partnerId, age_group, gender, COUNT(*)
+        FROM (
+            SELECT partnerId, {age_group_sql()} AS age_group, gender
+            FROM clients
+            {where} AND partnerId IS NOT NULL
+        ) binned
+        WHERE age_group IS NOT NULL
+        GROUP BY partnerId, age_group, gender
+        ORDER BY partnerId
+    """, params)
+    by_partner = {}
+    for partner_id, age_group, gender, count in cursor.fetchall():
+        by_partner.setdefault(partner_id, []).append((age_group, gender, count))
+    cursor.close()
+    return by_partner
+
+def fetch_all_partner_counts(conn, partner_ids=None):
+    """{partner_id: (age_group, gender, count) DataFrame} for every partner (or partner_ids), from one grouped query"""
+    import pandas as pd
+    return {partner_id: pd.DataFrame(rows, columns=['age_group', 'gender', 'count'])
+            for partner_id, rows in fetch_all_partner_count_rows(conn, partner_ids).items()}
+
+def pyramid_series(rows):
+    """Stats of the pyramid (as draw_population_pyramid returns them) from (age_group, gender, count) rows
+
+    Same result as pyramid_counts() on the aggregate DataFrame, without pandas.
+    """
+    counts = {}
+    for age_group, gender, count in rows:
+        by_gender = counts.setdefault(age_group, {'Male': 0, 'Female': 0})
+        gender = gender.title()
+        if gender in by_gender:
+            by_gender[gender] += int(count)
+    age_groups = [ag for ag in AGE_LABELS if ag in counts]
+    male_by_age = [counts[ag]['Male'] for ag in age_groups]
+    female_by_age = [counts[ag]['Female'] for ag in age_groups]
+    return {
+        'total_clients': sum(male_by_age) + sum(female_by_age),
+        'male_count': sum(male_by_age),
+        'female_count': sum(female_by_age),
+        'age_groups': age_groups,
+        'male_by_age': male_by_age,
+        'female_by_age': female_by_age
+    }
+
+def fetch_pyramid_series(conn, partner_id=None, mode='aggregate'):
+    """pyramid_series() of one partner (or all clients); only the rows mode needs pandas"""
+    if mode != 'rows':
+        return pyramid_series(fetch_age_gender_count_rows(conn, partner_id))
+    df = fetch_age_gender_rows(conn, partner_id)
+    if df.empty:
+        return pyramid_series([])
+    grouped = pyramid_counts(df)
+    return pyramid_series([(age_group, gender, count)
+                           for age_group, row in grouped.iterrows() for gender, count in row.items()])
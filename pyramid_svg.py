@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+"""
+Population pyramid as a small standalone SVG, without matplotlib
+
+render_svg() draws the stats dict of pyramid_data.pyramid_series() (or of
+draw_population_pyramid()) in the dark theme of generate_population_pyramid.py:
+males to the left, females to the right, one row per age group.
+"""
+
+from xml.sax.saxutils import escape
+
+WIDTH, HEIGHT = 640, 400
+MARGIN_LEFT, MARGIN_RIGHT, MARGIN_TOP, MARGIN_BOTTOM = 80, 20, 60, 40
+BACKGROUND = '#0f172a'
+MALE_COLOR = '#38bdf8'
+FEMALE_COLOR = '#f59e0b'
+TEXT_COLOR = '#e2e8f0'
+AXIS_COLOR = '#475569'
+TICK_COLOR = '#94a3b8'
+
+def render_svg(stats, partner_id=None):
+    """SVG document (str) of a population pyramid"""
+    age_groups = stats['age_groups']
+    male, female = stats['male_by_age'], stats['female_by_age']
+    plot_width = WIDTH - MARGIN_LEFT - MARGIN_RIGHT
+    plot_height = HEIGHT - MARGIN_TOP - MARGIN_BOTTOM
+    center = MARGIN_LEFT + plot_width / 2
+    scale = (plot_width / 2) / max(male + female + [1])
+    row_height = plot_height / max(len(age_groups), 1)
+    title = 'Client Population Pyramid' + (f' for Partner {partner_id}' if partner_id else '')
+
+    parts = [
+        f'<svg xmlns="http://www.w3.org/2000/svg" viewBox="0 0 {WIDTH} {HEIGHT}" '
+        f'font-family="sans-serif" font-size="11">',
+        f'<rect width="{WIDTH}" height="{HEIGHT}" fill="{BACKGROUND}"/>',
+        f'<text x="{WIDTH / 2:g}" y="24" fill="{TEXT_COLOR}" font-size="16" text-anchor="middle">{escape(title)}</text>',
+        f'<text x="{MARGIN_LEFT}" y="44" fill="{TICK_COLOR}">Total Clients: {stats["total_clients"]:,} '
+        f'| Male: {stats["male_count"]:,} | Female: {stats["female_count"]:,}</text>',
+        f'<line x1="{center:g}" y1="{MARGIN_TOP}" x2="{center:g}" y2="{HEIGHT - MARGIN_BOTTOM}" stroke="{AXIS_COLOR}"/>',
+    ]
+    # Youngest group at the bottom, as in the matplotlib chart
+    for i, (age_group, m, f) in enumerate(zip(age_groups, male, female)):
+        y = HEIGHT - MARGIN_BOTTOM - (i + 1) * row_height + row_height * 0.1
+        bar = row_height * 0.8
+        text_y = y + bar / 2 + 4
+        parts.append(f'<text x="{MARGIN_LEFT - 6}" y="{text_y:.1f}" fill="{TICK_COLOR}" '
+                     f'text-anchor="end">{escape(age_group)}</text>')
+        if m > 0:
+            parts.append(f'<rect x="{center - m * scale:.1f}" y="{y:.1f}" width="{m * scale:.1f}" '
+                         f'height="{bar:.1f}" fill="{MALE_COLOR}"><title>Male {m}</title></rect>')
+        if f > 0:
+            parts.append(f'<rect x="{center:g}" y="{y:.1f}" width="{f * scale:.1f}" '
+                         f'height="{bar:.1f}" fill="{FEMALE_COLOR}"><title>Female {f}</title></rect>')
+    parts.append(f'<text x="{center - 8:g}" y="{HEIGHT - 14}" fill="{MALE_COLOR}" text-anchor="end">Male</text>')
+    parts.append(f'<text x="{center + 8:g}" y="{HEIGHT - 14}" fill="{FEMALE_COLOR}">Female</text>')
+    parts.append('</svg>')
+    return '\n'.join(parts)
@@ -0,0 +1,170 @@
+-- Legacy refresh_partner_cubes (before the pre-aggregated rewrite)
+-- Joins clients -> trades -> deposits in one query, so every trade is
+-- repeated once per deposit of the same client (and vice versa). Kept only
+-- as the baseline for check_partner_cubes.py; nothing else calls it.
+
+USE partner_report;
+
+DROP PROCEDURE IF EXISTS refresh_partner_cubes_legacy;
+DELIMITER //
+CREATE PROCEDURE refresh_partner_cubes_legacy(IN p_partner_id VARCHAR(20))
+BEGIN
+    DECLARE current_month VARCHAR(7);
+    DECLARE month_start DATE;
+    
+    SET current_month = DATE_FORMAT(CURDATE(), '%Y-%m');
+    SET month_start = DATE_FORMAT(CURDATE(), '%Y-%m-01');
+    
+    -- ========================================================================
+    -- CUBE 1: Partner Dashboard Metrics
+    -- ========================================================================
+    INSERT INTO cube_partner_dashboard (
+        partner_id, partner_name, partner_tier,
+        total_clients, total_deposits, total_commissions, total_trades,
+        mtd_clients, mtd_deposits, mtd_commissions, mtd_trades,
+        month_1_commissions, month_2_commissions, month_3_commissions,
+        month_4_commissions, month_5_commissions, month_6_commissions
+    )
+    SELECT 
+        p.partner_id,
+        p.name,
+        p.tier,
+        -- Lifetime metrics
+        COUNT(DISTINCT c.binary_user_id),
+        COALESCE(SUM(DISTINCT c.lifetimeDeposits), 0),
+        COALESCE(SUM(t.closed_pnl_usd), 0),
+        COUNT(t.id),
+        -- MTD metrics
+        COUNT(DISTINCT CASE WHEN c.joinDate >= month_start THEN c.binary_user_id END),
+        COALESCE(SUM(CASE WHEN d.transaction_time >= month_start THEN d.amount_usd ELSE 0 END), 0),
+        COALESCE(SUM(CASE WHEN DATE_FORMAT(t.date, '%Y-%m') = current_month THEN t.closed_pnl_usd ELSE 0 END), 0),
+        COUNT(CASE WHEN DATE_FORMAT(t.date, '%Y-%m') = current_month THEN t.id END),
+        -- Last 6 months commissions
+        COALESCE(SUM(CASE WHEN DATE_FORMAT(t.date, '%Y-%m') = DATE_FORMAT(DATE_SUB(CURDATE(), INTERVAL 0 MONTH), '%Y-%m') THEN t.closed_pnl_usd ELSE 0 END), 0),
+        COALESCE(SUM(CASE WHEN DATE_FORMAT(t.date, '%Y-%m') = DATE_FORMAT(DATE_SUB(CURDATE(), INTERVAL 1 MONTH), '%Y-%m') THEN t.closed_pnl_usd ELSE 0 END), 0),
+        COALESCE(SUM(CASE WHEN DATE_FORMAT(t.date, '%Y-%m') = DATE_FORMAT(DATE_SUB(CURDATE(), INTERVAL 2 MONTH), '%Y-%m') THEN t.closed_pnl_usd ELSE 0 END), 0),
+        COALESCE(SUM(CASE WHEN DATE_FORMAT(t.date, '%Y-%m') = DATE_FORMAT(DATE_SUB(CURDATE(), INTERVAL 3 MONTH), '%Y-%m') THEN t.closed_pnl_usd ELSE 0 END), 0),
+        COALESCE(SUM(CASE WHEN DATE_FORMAT(t.date, '%Y-%m') = DATE_FORMAT(DATE_SUB(CURDATE(), INTERVAL 4 MONTH), '%Y-%m') THEN t.closed_pnl_usd ELSE 0 END), 0),
+        COALESCE(SUM(CASE WHEN DATE_FORMAT(t.date, '%Y-%m') = DATE_FORMAT(DATE_SUB(CURDATE(), INTERVAL 5 MONTH), '%Y-%m') THEN t.closed_pnl_usd ELSE 0 END), 0)
+    FROM partners p
+    LEFT JOIN clients c ON p.partner_id = c.partnerId
+    LEFT JOIN trades t ON c.binary_user_id = t.binary_user_id
+    LEFT JOIN deposits d ON c.binary_user_id = d.binary_user_id_1 AND d.affiliate_id = p.partner_id
+    WHERE p.partner_id = p_partner_id
+    GROUP BY p.partner_id, p.name, p.tier
+    ON DUPLICATE KEY UPDATE
+        partner_name = VALUES(partner_name),
+        partner_tier = VALUES(partner_tier),
+        total_clients = VALUES(total_clients),
+        total_deposits = VALUES(total_deposits),
+        total_commissions = VALUES(total_commissions),
+        total_trades = VALUES(total_trades),
+        mtd_clients = VALUES(mtd_clients),
+        mtd_deposits = VALUES(mtd_deposits),
+        mtd_commissions = VALUES(mtd_commissions),
+        mtd_trades = VALUES(mtd_trades),
+        month_1_commissions = VALUES(month_1_commissions),
+        month_2_commissions = VALUES(month_2_commissions),
+        month_3_commissions = VALUES(month_3_commissions),
+        month_4_commissions = VALUES(month_4_commissions),
+        month_5_commissions = VALUES(month_5_commissions),
+        month_6_commissions = VALUES(month_6_commissions);
+    
+    -- ========================================================================
+    -- CUBE 2: Client Tier Distribution
+    -- ========================================================================
+    DELETE FROM cube_client_tiers WHERE partner_id = p_partner_id;
+    
+    INSERT INTO cube_client_tiers (partner_id, tier, client_count, percentage)
+    SELECT 
+        c.partnerId,
+        COALESCE(c.tier, 'Unknown') as tier,
+        COUNT(*) as client_count,
+        (COUNT(*) * 100.0 / SUM(COUNT(*)) OVER (PARTITION BY c.partnerId)) as percentage
+    FROM clients c
+    WHERE c.partnerId = p_partner_id
+    GROUP BY c.partnerId, tier;
+    
+    -- ========================================================================
+    -- CUBE 3: Client Demographics
+    -- ========================================================================
+    DELETE FROM cube_client_demographics WHERE partner_id = p_partner_id;
+    
+    -- Gender distribution
+    INSERT INTO cube_client_demographics (partner_id, dimension, dimension_value, client_count, percentage)
+    SELECT 
+        c.partnerId,
+        'gender',
+        COALESCE(c.gender, 'Unknown'),
+        COUNT(*),
+        (COUNT(*) * 100.0 / SUM(COUNT(*)) OVER (PARTITION BY c.partnerId))
+    FROM clients c
+    WHERE c.partnerId = p_partner_id
+    GROUP BY c.partnerId, c.gender;
+    
+    -- Age group distribution
+    INSERT INTO cube_client_demographics (partner_id, dimension, dimension_value, client_count, percentage)
+    SELECT 
+        c.partnerId,
+        'age_group',
+        CASE 
+            WHEN c.age < 18 THEN 'Under 18'
+            WHEN c.age BETWEEN 18 AND 24 THEN '18-24'
+            WHEN c.age BETWEEN 25 AND 34 THEN '25-34'
+            WHEN c.age BETWEEN 35 AND 44 THEN '35-44'
+            WHEN c.age BETWEEN 45 AND 54 THEN '45-54'
+            WHEN c.age >= 55 THEN '55+'
+            ELSE 'Unknown'
+        END as age_group,
+        COUNT(*),
+        (COUNT(*) * 100.0 / SUM(COUNT(*)) OVER (PARTITION BY c.partnerId))
+    FROM clients c
+    WHERE c.partnerId = p_partner_id
+    GROUP BY c.partnerId, age_group;
+    
+    -- ========================================================================
+    -- CUBE 6: Country Performance
+    -- ========================================================================
+    DELETE FROM cube_country_performance WHERE partner_id = p_partner_id;
+    
+    INSERT INTO cube_country_performance (
+        partner_id, country, client_count, total_deposits, total_commissions, total_trades
+    )
+    SELECT 
+        c.partnerId,
+        c.country,
+        COUNT(DISTINCT c.binary_user_id),
+        COALESCE(SUM(d.amount_usd), 0),
+        COALESCE(SUM(t.closed_pnl_usd), 0),
+        COUNT(t.id)
+    FROM clients c
+    LEFT JOIN trades t ON c.binary_user_id = t.binary_user_id
+    LEFT JOIN deposits d ON c.binary_user_id = d.binary_user_id_1 AND d.affiliate_id = c.partnerId
+    WHERE c.partnerId = p_partner_id
+    GROUP BY c.partnerId, c.country;
+    
+    -- ========================================================================
+    -- CUBE 7: Badge Progress
+    -- ========================================================================
+    INSERT INTO cube_badge_progress (
+        partner_id, total_commissions, total_deposits, badges_earned
+    )
+    SELECT 
+        p.partner_id,
+        COALESCE(SUM(t.closed_pnl_usd), 0),
+        COALESCE(SUM(d.amount_usd), 0),
+        COUNT(DISTINCT pb.badge_name)
+    FROM partners p
+    LEFT JOIN clients c ON p.partner_id = c.partnerId
+    LEFT JOIN trades t ON c.binary_user_id = t.binary_user_id
+    LEFT JOIN deposits d ON c.binary_user_id = d.binary_user_id_1 AND d.affiliate_id = p.partner_id
+    LEFT JOIN partner_badges pb ON p.partner_id = pb.partner_id
+    WHERE p.partner_id = p_partner_id
+    GROUP BY p.partner_id
+    ON DUPLICATE KEY UPDATE
+        total_commissions = VALUES(total_commissions),
+        total_deposits = VALUES(total_deposits),
+        badges_earned = VALUES(badges_earned);
+        
+END //
+DELIMITER ;
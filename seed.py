@@ -1,8 +1,38 @@
 #!/usr/bin/env python3
+"""
+Seed data for the partner report
+
+    python3 seed.py
+    python3 seed.py --output-dir data/ --clients 1000000 --trades 10000000 --deposits 2000000
+
+Without --output-dir, database.json is seeded with 100 clients, 100 trades
+and 200 deposits as before.
+
+With --output-dir, synthetic clients1.csv, trades1.csv and deposits1.csv
+(or .ndjson with --format ndjson) are streamed out with the headers of the
+real exports, for load testing import_clients.py, import_trades1.py,
+import_deposits.py and the cubes, plus partners.sql for the partners they
+reference. Partners, countries, platforms and trading activity are skewed
+(a few partners and clients account for most of the volume).
+
+Each table is generated in shards of --shard-rows rows, each with its own
+RNG seeded from (--seed, table, shard), across a process pool; shards are
+appended to the output in order as they complete. The files are therefore
+identical for a given seed whatever --workers is, and memory stays bounded
+by a shard.
+"""
+import argparse
+import bisect
+import csv
 import json
+import math
+import multiprocessing
+import os
 import random
+import shutil
 import string
-from datetime import datetime, timedelta
+import time
+from datetime import date, datetime, timedelta
 from pathlib import Path
 
 DB_PATH = Path(__file__).parent / 'database.json'
@@ -31,9 +61,9 @@ def rand_name():
 def rand_account_number():
     return 'ACC-' + ''.join(random.choices(string.digits, k=6))
 
-def rand_tracking():
+def rand_tracking(rng=random):
     roots = ['spring','summer','fall','affiliate','social','display','email']
-    return random.choice(roots) + '-' + str(random.randint(100,999))
+    return rng.choice(roots) + '-' + str(rng.randint(100,999))
 
 def rand_date(start_year=2022):
     start = datetime(start_year, 1, 1)
@@ -100,7 +130,289 @@ def generate_deposits(clients, n=200):
         })
     return deposits
 
-def main():
+# Scalable CSV/NDJSON generation (--output-dir)
+
+CLIENT_HEADERS = [
+    'binary_user_id', 'name', 'country', 'joinDate', 'account_type', 'accountNumber',
+    'lifetimeDeposits', 'commissionPlan', 'trackingLinkUsed', 'tier', 'sub-partner',
+    'partnerId', 'email', 'preferredLanguage', 'gender', 'age'
+]
+TRADE_HEADERS = [
+    'date', 'binary_user_id', 'loginid', 'platform', 'app_name', 'account_type',
+    'contract_type', 'asset_type', 'asset', 'number_of_trades', 'closed_pnl_usd',
+    'closed_pnl_usd_abook', 'closed_pnl_usd_bbook', 'floating_pnl_usd', 'floating_pnl',
+    'expected_revenue_usd', 'closed_pnl', 'swaps_usd', 'volume_usd', 'is_synthetic',
+    'is_financial', 'app_markup_usd', 'affiliated_partner_id'
+]
+DEPOSIT_HEADERS = [
+    'binary_user_id_1', 'transaction_id', 'payment_id', 'currency_code', 'transaction_time',
+    'amount', 'payment_gateway_code', 'payment_type_code', 'account_id', 'client_loginid',
+    'remark', 'transfer_fees', 'is_pa', 'amount_usd', 'transfer_type', 'category',
+    'payment_processor', 'payment_method', 'affiliate_id', 'target_loginid', 'target_is_pa'
+]
+TABLE_HEADERS = {'clients': CLIENT_HEADERS, 'trades': TRADE_HEADERS, 'deposits': DEPOSIT_HEADERS}
+TABLE_FILES = {'clients': 'clients1', 'trades': 'trades1', 'deposits': 'deposits1'}
+OUTPUT_FORMATS = ['csv', 'ndjson']
+
+SHARD_ROWS = 100000
+FIRST_USER_ID = 1000000
+FIRST_PARTNER_ID = 100000
+PARTNER_SKEW = 1.1          # Zipf exponent of clients per partner
+ACTIVITY_SKEW = 3.0         # trades/deposits drawn from client index n * u**ACTIVITY_SKEW
+DIRECT_CLIENT_SHARE = 0.02  # clients without a partner
+START_DATE = date(2023, 1, 1)
+END_DATE = date(2025, 10, 1)
+
+COUNTRY_WEIGHTS = {
+    'Pakistan': 18, 'India': 14, 'Nigeria': 9, 'Indonesia': 7, 'Brazil': 6, 'Vietnam': 5,
+    'South Africa': 5, 'Kenya': 4, 'Bangladesh': 4, 'Egypt': 3, 'Philippines': 3, 'Malaysia': 3,
+    'Thailand': 2, 'Mexico': 2, 'Colombia': 2, 'Ghana': 2, 'United Kingdom': 2, 'Germany': 1,
+    'France': 1, 'Spain': 1, 'Italy': 1, 'Poland': 1, 'Portugal': 1, 'Cyprus': 1
+}
+PLATFORM_WEIGHTS = {'MT5': 45, 'dTrader': 20, 'DerivX': 10, 'cTrader': 8, 'WebTrader': 9, 'Mobile': 8}
+ASSETS = {
+    'synthetic': ['Volatility 75 Index', 'Volatility 100 Index', 'Boom 1000 Index', 'Crash 500 Index', 'Step Index'],
+    'forex': ['EURUSD', 'GBPUSD', 'USDJPY', 'AUDUSD', 'USDCAD'],
+    'commodities': ['XAUUSD', 'XAGUSD', 'WTI'],
+    'cryptocurrency': ['BTCUSD', 'ETHUSD', 'LTCUSD'],
+    'stocks': ['AAPL', 'TSLA', 'AMZN', 'NVDA'],
+    'indices': ['US 500', 'Germany 40', 'UK 100']
+}
+ASSET_TYPE_WEIGHTS = {'synthetic': 55, 'forex': 20, 'commodities': 10, 'cryptocurrency': 8, 'stocks': 4, 'indices': 3}
+PAYMENT_METHODS = {'Skrill': 20, 'Neteller': 15, 'Visa': 20, 'Mastercard': 10, 'PerfectMoney': 10,
+                   'Crypto': 15, 'PaymentAgent': 10}
+CURRENCY_RATES = {'USD': 1.0, 'EUR': 1.08, 'GBP': 1.27, 'USDT': 1.0}
+LANGUAGES = ['English', 'Urdu', 'Hindi', 'Portuguese', 'Spanish', 'French', 'Indonesian', 'Vietnamese']
+
+MASK64 = (1 << 64) - 1
+
+def mix64(x):
+    """splitmix64 finalizer: a cheap, well-mixed hash of an integer"""
+    x = (x + 0x9E3779B97F4A7C15) & MASK64
+    x = ((x ^ (x >> 30)) * 0xBF58476D1CE4E5B9) & MASK64
+    x = ((x ^ (x >> 27)) * 0x94D049BB133111EB) & MASK64
+    return x ^ (x >> 31)
+
+def cumulative(weights):
+    """(values, cumulative weights) for random.choices(..., cum_weights=...)"""
+    values = list(weights)
+    total = 0
+    cum = []
+    for value in values:
+        total += weights[value]
+        cum.append(total)
+    return values, cum
+
+class SyntheticPopulation:
+    """Attributes shared across tables, derived from the seed and the client index alone
+
+    A client's partner is a hash of (seed, index), so trades and deposits
+    can be attributed to the same partner as the client without keeping the
+    clients in memory.
+    """
+
+    def __init__(self, seed, clients, partners):
+        self.seed = seed
+        self.clients = clients
+        self.partner_ids = [str(FIRST_PARTNER_ID + k) for k in range(partners)]
+        self.partner_cum = []
+        total = 0.0
+        for rank in range(1, partners + 1):
+            total += 1 / rank ** PARTNER_SKEW
+            self.partner_cum.append(total)
+        self.partner_salt = mix64(seed)
+        # Multiplicative permutation so that the most active clients are spread over partners
+        self.step = 2654435761
+        while clients > 1 and math.gcd(self.step, clients) != 1:
+            self.step += 2
+
+    def user_id(self, index):
+        return str(FIRST_USER_ID + index)
+
+    def partner_of(self, index):
+        u = mix64(self.partner_salt ^ index) / 2 ** 64
+        if u < DIRECT_CLIENT_SHARE:
+            return None
+        u = (u - DIRECT_CLIENT_SHARE) / (1 - DIRECT_CLIENT_SHARE)
+        return self.partner_ids[min(bisect.bisect(self.partner_cum, u * self.partner_cum[-1]),
+                                    len(self.partner_ids) - 1)]
+
+    def active_client(self, rng):
+        """Client index for a trade or deposit; a small share of clients gets most of them"""
+        index = int(self.clients * rng.random() ** ACTIVITY_SKEW)
+        return (index * self.step + self.seed) % self.clients
+
+def rand_day(rng, start=START_DATE, end=END_DATE):
+    return start + timedelta(days=rng.randrange((end - start).days + 1))
+
+def money(value):
+    return f"{value:.2f}"
+
+def flag(value):
+    return 'TRUE' if value else 'FALSE'
+
+def client_rows(population, rng, start, count):
+    countries, country_cum = cumulative(COUNTRY_WEIGHTS)
+    for index in range(start, start + count):
+        user_id = population.user_id(index)
+        partner_id = population.partner_of(index)
+        has_profile = rng.random() > 0.05
+        yield [
+            user_id,
+            f"{rng.choice(first_names)[0]}***** {rng.choice(last_names)[0]}*****",
+            rng.choices(countries, cum_weights=country_cum)[0],
+            rand_day(rng, date(2018, 1, 1)).isoformat(),
+            'Real',
+            'CR' + user_id,
+            money(rng.paretovariate(1.2) * 50),
+            rng.choice(commission_plans) if partner_id else '',
+            rand_tracking(rng) if partner_id else '',
+            rng.choices(tiers, weights=[60, 25, 10, 5])[0],
+            flag(rng.random() < 0.03),
+            partner_id or '',
+            f"dummy{user_id}@example.com",
+            rng.choice(LANGUAGES),
+            (rng.choices(['male', 'female'], weights=[72, 28])[0]) if has_profile else '',
+            str(min(18 + int(rng.gammavariate(3, 6)), 90)) if has_profile else ''
+        ]
+
+def trade_rows(population, rng, start, count):
+    platforms_list, platform_cum = cumulative(PLATFORM_WEIGHTS)
+    asset_types, asset_cum = cumulative(ASSET_TYPE_WEIGHTS)
+    days = [(START_DATE + timedelta(days=d)).isoformat() for d in range((END_DATE - START_DATE).days + 1)]
+    for _ in range(count):
+        index = population.active_client(rng)
+        user_id = population.user_id(index)
+        platform = rng.choices(platforms_list, cum_weights=platform_cum)[0]
+        asset_type = rng.choices(asset_types, cum_weights=asset_cum)[0]
+        if platform in ('MT5', 'cTrader', 'DerivX'):
+            contract_type = 'CFD'
+        elif platform == 'dTrader':
+            contract_type = rng.choice(['Accumulators', 'Vanillas', 'Turbos', 'Multipliers'])
+        else:
+            contract_type = rng.choice(['CFD', 'Options', 'Multipliers'])
+        trades = max(1, int(rng.paretovariate(1.5)))
+        volume = trades * rng.lognormvariate(6, 1.2)
+        closed_pnl = rng.gauss(-0.02, 0.1) * volume
+        abook = closed_pnl * rng.random() * 0.3
+        floating = rng.gauss(0, 0.02) * volume
+        revenue = volume * rng.uniform(0.0005, 0.003)
+        yield [
+            rng.choice(days),
+            user_id,
+            'CR' + user_id,
+            platform,
+            'Deriv ' + platform,
+            'real',
+            contract_type,
+            asset_type,
+            rng.choice(ASSETS[asset_type]),
+            str(trades),
+            money(closed_pnl),
+            money(abook),
+            money(closed_pnl - abook),
+            money(floating),
+            money(floating),
+            money(revenue),
+            money(closed_pnl),
+            money(rng.gauss(0, 0.001) * volume),
+            money(volume),
+            flag(asset_type == 'synthetic'),
+            flag(asset_type != 'synthetic'),
+            money(revenue * 0.1 if platform == 'dTrader' else 0),
+            population.partner_of(index) or ''
+        ]
+
+def deposit_rows(population, rng, start, count):
+    methods, method_cum = cumulative(PAYMENT_METHODS)
+    currencies = list(CURRENCY_RATES)
+    for number in range(start, start + count):
+        index = population.active_client(rng)
+        user_id = population.user_id(index)
+        category = 'withdrawal' if rng.random() < 0.25 else 'deposit'
+        currency = rng.choices(currencies, weights=[70, 10, 5, 15])[0]
+        amount_usd = min(rng.paretovariate(1.3) * 20, 250000)
+        method = rng.choices(methods, cum_weights=method_cum)[0]
+        moment = datetime.combine(rand_day(rng), datetime.min.time()) + timedelta(
+            seconds=rng.randrange(86400), microseconds=rng.randrange(1000000))
+        yield [
+            user_id,
+            str(100000000 + number),
+            str(500000000 + number),
+            currency,
+            moment.strftime('%Y-%m-%d %H:%M:%S.%f') + ' UTC',
+            money(amount_usd / CURRENCY_RATES[currency]),
+            method.lower(),
+            'payment_agent_transfer' if method == 'PaymentAgent' else 'external_cashier',
+            str(700000000 + number),
+            'CR' + user_id,
+            '',
+            money(amount_usd * 0.01 if method == 'PaymentAgent' else 0),
+            'FALSE',
+            money(amount_usd),
+            'internal' if method == 'PaymentAgent' else 'external',
+            category,
+            method,
+            method,
+            population.partner_of(index) or '',
+            '',
+            ''
+        ]
+
+ROW_GENERATORS = {'clients': client_rows, 'trades': trade_rows, 'deposits': deposit_rows}
+
+def generate_shard(task):
+    """Write one shard of a table to its part file; returns (part_path, rows)"""
+    table, shard, start, count, seed, clients, partners, fmt, part_path = task
+    population = SyntheticPopulation(seed, clients, partners)
+    rng = random.Random(f"{seed}:{table}:{shard}")
+    headers = TABLE_HEADERS[table]
+    with open(part_path, 'w', encoding='utf-8', newline='') as f:
+        if fmt == 'csv':
+            csv.writer(f).writerows(ROW_GENERATORS[table](population, rng, start, count))
+        else:
+            for row in ROW_GENERATORS[table](population, rng, start, count):
+                f.write(json.dumps(dict(zip(headers, row)), ensure_ascii=False) + '\n')
+    return part_path, count
+
+def write_partners_sql(path, partners):
+    """INSERT IGNORE statements for the partners referenced by the generated clients"""
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write("-- Synthetic partners generated by seed.py\nUSE partner_report;\n\n")
+        ids = [str(FIRST_PARTNER_ID + k) for k in range(partners)]
+        for i in range(0, len(ids), 1000):
+            values = ',\n'.join(f"('{pid}', 'Partner {pid}', '{'Gold' if k < 10 else 'Silver' if k < 50 else 'Bronze'}')"
+                                 for k, pid in enumerate(ids[i:i + 1000], start=i))
+            f.write(f"INSERT IGNORE INTO partners (partner_id, name, tier) VALUES\n{values};\n\n")
+
+def generate_dataset(output_dir, clients, trades, deposits, partners=500, seed=42, workers=None,
+                     fmt='csv', shard_rows=SHARD_ROWS):
+    """Stream clients/trades/deposits files of the given sizes into output_dir"""
+    os.makedirs(output_dir, exist_ok=True)
+    write_partners_sql(os.path.join(output_dir, 'partners.sql'), partners)
+    workers = workers or os.cpu_count() or 1
+    sizes = {'clients': clients, 'trades': trades, 'deposits': deposits}
+    with multiprocessing.Pool(processes=workers) as pool:
+        for table, total in sizes.items():
+            if total <= 0:
+                continue
+            path = os.path.join(output_dir, f"{TABLE_FILES[table]}.{fmt}")
+            tasks = [(table, shard, start, min(shard_rows, total - start), seed, clients, partners, fmt,
+                      f"{path}.part{shard}")
+                     for shard, start in enumerate(range(0, total, shard_rows))]
+            started = time.perf_counter()
+            with open(path, 'w', encoding='utf-8', newline='') as out:
+                if fmt == 'csv':
+                    csv.writer(out).writerow(TABLE_HEADERS[table])
+                # imap keeps shard order, so parts are appended as soon as their predecessors are
+                for part_path, _ in pool.imap(generate_shard, tasks):
+                    with open(part_path, 'r', encoding='utf-8', newline='') as part:
+                        shutil.copyfileobj(part, out)
+                    os.remove(part_path)
+            elapsed = time.perf_counter() - started
+            print(f"✓ {path}: {total:,} rows in {elapsed:.1f}s ({total / max(elapsed, 1e-9):,.0f} rows/s)")
+
+def seed_database_json():
     with open(DB_PATH, 'r', encoding='utf-8') as f:
         db = json.load(f)
 
@@ -116,6 +428,29 @@ def main():
         json.dump(db, f, ensure_ascii=False, indent=2)
     print('Seeded 100 clients and 100 trades into database.json')
 
+def main():
+    parser = argparse.ArgumentParser(description='Seed database.json, or generate synthetic import files')
+    parser.add_argument('--output-dir', default=None,
+                        help='Write synthetic clients1/trades1/deposits1 files here instead of seeding database.json')
+    parser.add_argument('--clients', type=int, default=100000, help='Clients to generate (default: 100000)')
+    parser.add_argument('--trades', type=int, default=1000000, help='Trade rows to generate (default: 1000000)')
+    parser.add_argument('--deposits', type=int, default=200000, help='Deposit rows to generate (default: 200000)')
+    parser.add_argument('--partners', type=int, default=500, help='Partners to spread clients over (default: 500)')
+    parser.add_argument('--seed', type=int, default=42, help='Random seed; same seed, same files (default: 42)')
+    parser.add_argument('--format', choices=OUTPUT_FORMATS, default='csv', help='csv (default) or ndjson')
+    parser.add_argument('--workers', type=int, default=None, help='Generator processes (default: CPU count)')
+    parser.add_argument('--shard-rows', type=int, default=SHARD_ROWS,
+                        help=f'Rows per generated shard; part of the seed (default: {SHARD_ROWS})')
+    args = parser.parse_args()
+
+    if args.output_dir is None:
+        seed_database_json()
+        return
+    if args.clients <= 0 or args.partners <= 0:
+        parser.error('--clients and --partners must be positive')
+    generate_dataset(args.output_dir, args.clients, args.trades, args.deposits, args.partners,
+                     args.seed, args.workers, args.format, args.shard_rows)
+
 if __name__ == '__main__':
     main()
 
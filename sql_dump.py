@@ -0,0 +1,227 @@
+#!/usr/bin/env python3
+"""
+Streaming SQL dump writer for the *_sql.py generators
+
+Rows (tuples of Python values, None for NULL) are written straight to a
+buffered file as extended INSERTs:
+    INSERT INTO table (a, b) VALUES
+    (...),
+    (...)[ ON DUPLICATE KEY UPDATE ...];
+A statement is closed before it would grow past max_statement_bytes, which
+must stay below the server's max_allowed_packet, instead of after a fixed
+number of rows.
+
+With shards > 1 the statements are dealt round-robin over N files
+(name.part1.sql, ...), each a complete script that can be loaded in its own
+session in parallel.
+
+With fmt='tsv' the rows go to tab-separated files instead, and each .sql
+script LOADs its file (LOAD DATA LOCAL INFILE, so the mysql client needs
+--local-infile=1 and must run in the dump directory). With an ON DUPLICATE
+KEY UPDATE clause the file is loaded into a temporary copy of the table and
+upserted from there.
+
+With compress='gzip'/'bz2'/'zstd' the scripts are written through the
+compressor (name.sql.gz, ...) and piped into mysql with zcat/bzcat/zstdcat;
+the throughput of each file is in writer.report(). LOAD DATA needs plain
+files, so compression is for the insert format only.
+"""
+
+import os
+
+from compressed_io import CODECS, CompressedOutput, add_compression_argument
+
+DEFAULT_STATEMENT_BYTES = 1024 * 1024
+DUMP_FORMATS = ['insert', 'tsv']
+WRITE_BUFFER = 1024 * 1024
+DECOMPRESS_COMMANDS = {'.gz': 'zcat', '.bz2': 'bzcat', '.zst': 'zstdcat'}
+
+SESSION_START = [
+    "-- Disable checks for faster import",
+    "SET FOREIGN_KEY_CHECKS = 0;",
+    "SET UNIQUE_CHECKS = 0;",
+    "SET AUTOCOMMIT = 0;",
+]
+SESSION_END = [
+    "COMMIT;",
+    "SET FOREIGN_KEY_CHECKS = 1;",
+    "SET UNIQUE_CHECKS = 1;",
+    "SET AUTOCOMMIT = 1;",
+]
+
+def add_dump_arguments(parser):
+    """Add --format, --shards, --max-statement-bytes and --compress to an argparse parser"""
+    parser.add_argument('--format', choices=DUMP_FORMATS, default='insert',
+                        help='insert = extended INSERT statements, tsv = TSV files + LOAD DATA scripts')
+    parser.add_argument('--shards', type=int, default=1,
+                        help='Split the dump into N scripts that can be loaded in parallel (default: 1)')
+    parser.add_argument('--max-statement-bytes', type=int, default=DEFAULT_STATEMENT_BYTES,
+                        help='Largest INSERT statement; keep below the server max_allowed_packet '
+                             f'(default: {DEFAULT_STATEMENT_BYTES})')
+    add_compression_argument(parser)
+    return parser
+
+def check_dump_arguments(parser, args):
+    """Reject option combinations add_dump_arguments cannot honour"""
+    if args.compress and args.format == 'tsv':
+        parser.error('--compress only applies to --format insert (LOAD DATA reads plain files)')
+
+def sql_literal(value):
+    """SQL literal of a Python value (strings quoted and escaped)"""
+    if value is None:
+        return 'NULL'
+    if isinstance(value, bool):
+        return '1' if value else '0'
+    if isinstance(value, (int, float)):
+        return str(value)
+    # Escape single quotes and backslashes
+    return "'" + str(value).replace('\\', '\\\\').replace("'", "\\'") + "'"
+
+def tsv_field(value):
+    """LOAD DATA field of a Python value (\\N for NULL, tabs/newlines escaped)"""
+    if value is None:
+        return '\\N'
+    if isinstance(value, bool):
+        return '1' if value else '0'
+    return (str(value).replace('\\', '\\\\').replace('\t', '\\t')
+            .replace('\n', '\\n').replace('\r', '\\r'))
+
+def shard_path(path, shard, shards, extension=None):
+    """name.sql -> name.part<N>.sql when sharded (and/or with another extension)"""
+    base, ext = os.path.splitext(path)
+    if shards > 1:
+        base = f"{base}.part{shard + 1}"
+    return base + (extension or ext)
+
+class SQLDumpWriter:
+    """Writes rows to one or more SQL scripts as byte-sized INSERTs or TSV + LOAD DATA"""
+
+    def __init__(self, output_file, table, columns, header_lines=(), on_duplicate=None, fmt='insert',
+                 shards=1, max_statement_bytes=DEFAULT_STATEMENT_BYTES, database='partner_report',
+                 compress=None):
+        if compress and fmt == 'tsv':
+            raise ValueError("compressed dumps need fmt='insert'")
+        if compress and compress not in CODECS:
+            raise ValueError(f"unknown codec {compress!r} (expected one of {', '.join(CODECS)})")
+        self.table = table
+        self.columns = list(columns)
+        self.on_duplicate = on_duplicate
+        self.fmt = fmt
+        self.shards = max(1, shards)
+        self.max_statement_bytes = max_statement_bytes
+        self.header = list(header_lines) + ['', f"USE {database};", ''] + SESSION_START + ['']
+        self.scripts = [CompressedOutput(shard_path(output_file, i, self.shards), compress, buffering=WRITE_BUFFER)
+                        for i in range(self.shards)]
+        self.outputs = list(self.scripts)
+        self.paths = [script.path for script in self.scripts]
+        for script in self.scripts:
+            script.write('\n'.join(self.header) + '\n')
+
+        self.rows = 0
+        self.statements = 0
+        self._shard = 0
+        self._statement_bytes = 0
+        self._prefix = f"INSERT INTO {table} ({', '.join(self.columns)}) VALUES\n"
+        self._suffix = (f"\nON DUPLICATE KEY UPDATE\n    {on_duplicate};\n\n" if on_duplicate else ";\n\n")
+        self.data_paths = []
+        self.data_files = []
+        if fmt == 'tsv':
+            self.data_paths = [shard_path(output_file, i, self.shards, '.tsv') for i in range(self.shards)]
+            self.data_files = [open(path, 'w', encoding='utf-8', newline='', buffering=WRITE_BUFFER)
+                               for path in self.data_paths]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def add(self, values):
+        """Write one row"""
+        self.rows += 1
+        if self.fmt == 'tsv':
+            self.data_files[self.rows % self.shards].write('\t'.join(tsv_field(v) for v in values) + '\n')
+            return
+        row = '(' + ', '.join(sql_literal(v) for v in values) + ')'
+        # UTF-8 length, as the server counts the packet
+        size = len(row.encode('utf-8')) + 2
+        if self._statement_bytes and self._statement_bytes + size + len(self._suffix) > self.max_statement_bytes:
+            self._end_statement()
+        script = self.scripts[self._shard]
+        if not self._statement_bytes:
+            script.write(self._prefix)
+            self._statement_bytes = len(self._prefix.encode('utf-8'))
+        else:
+            script.write(',\n')
+        script.write(row)
+        self._statement_bytes += size
+
+    def _end_statement(self):
+        self.scripts[self._shard].write(self._suffix)
+        self.statements += 1
+        self._statement_bytes = 0
+        self._shard = (self._shard + 1) % self.shards
+
+    def _write_load(self, script, data_path):
+        columns = ', '.join(self.columns)
+        fields = "FIELDS TERMINATED BY '\\t' ESCAPED BY '\\\\' LINES TERMINATED BY '\\n'"
+        data_file = os.path.basename(data_path)
+        if self.on_duplicate:
+            staging = f"{self.table}_load"
+            script.write(f"DROP TEMPORARY TABLE IF EXISTS {staging};\n"
+                         f"CREATE TEMPORARY TABLE {staging} LIKE {self.table};\n"
+                         f"LOAD DATA LOCAL INFILE '{data_file}' INTO TABLE {staging}\n"
+                         f"    {fields}\n    ({columns});\n"
+                         f"INSERT INTO {self.table} ({columns})\n"
+                         f"SELECT {columns} FROM {staging}\n"
+                         f"ON DUPLICATE KEY UPDATE\n    {self.on_duplicate};\n"
+                         f"DROP TEMPORARY TABLE {staging};\n\n")
+        else:
+            script.write(f"LOAD DATA LOCAL INFILE '{data_file}' INTO TABLE {self.table}\n"
+                         f"    {fields}\n    ({columns});\n\n")
+        self.statements += 1
+
+    def close(self, footer_lines=()):
+        """Finish every script; returns the paths written"""
+        if not self.scripts:
+            return self.paths + self.data_paths
+        if self._statement_bytes:
+            self._end_statement()
+        for data_file in self.data_files:
+            data_file.close()
+        for i, script in enumerate(self.scripts):
+            if self.data_paths:
+                self._write_load(script, self.data_paths[i])
+            script.write('\n'.join(SESSION_END + [''] + list(footer_lines)) + '\n')
+            script.close()
+        self.scripts = []
+        return self.paths + self.data_paths
+
+    def report(self):
+        """Size, compression ratio and MB/s of every script written"""
+        return [output.report() for output in self.outputs]
+
+def print_load_instructions(paths, fmt='insert'):
+    """Print the mysql commands that load the written scripts"""
+    scripts = [path for path in paths if not path.endswith('.tsv')]
+    local = ' --local-infile=1' if fmt == 'tsv' else ''
+    print("\nTo import into MySQL, run:")
+    if fmt == 'tsv':
+        # LOAD DATA LOCAL INFILE paths are relative to the client's directory
+        print(f"  cd {os.path.dirname(os.path.abspath(scripts[0]))}")
+        scripts = [os.path.basename(path) for path in scripts]
+    commands = [load_command(script, local) for script in scripts]
+    if len(commands) == 1:
+        print(f"  {commands[0]}")
+        return
+    print("  (one session per shard, in parallel)")
+    for command in commands:
+        print(f"  {command} &")
+    print("  wait")
+
+def load_command(script, local=''):
+    """Shell command loading one script, decompressing it on the way"""
+    decompress = DECOMPRESS_COMMANDS.get(os.path.splitext(script)[1])
+    if decompress:
+        return f"{decompress} {script} | mysql{local} -u root -p partner_report"
+    return f"mysql{local} -u root -p partner_report < {script}"
@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+"""
+(platform, symbol) -> unified symbol index for the trades import
+
+The symbols table (import_symbols.py) maps every platform's symbol to a
+unified symbol, asset type, asset sub type and category. SymbolIndex loads it
+once into a dict so import_trades1.py can add those values to each trade while
+it streams (trades.unified_symbol, unified_asset_type, unified_asset_sub_type
+and unified_category, see add_trade_symbol_columns.sql); the symbol and product cubes then group
+by them without joining symbols at refresh time.
+
+    symbols = SymbolIndex.open(conn, cache='symbols.json.gz')
+    values = values + symbols.lookup(values[PLATFORM_INDEX], values[ASSET_INDEX])
+
+Keys are matched case-insensitively, as the symbols table's collation does.
+With a cache path the index is written to that file and reused as long as
+the symbols table still has the same row count and latest updated_at (one
+cheap query), so it is rebuilt only after a symbols import.
+"""
+
+import argparse
+import gzip
+import json
+import os
+import time
+
+# Columns added to each trade, in this order
+ENRICHED_COLUMNS = ['unified_symbol', 'unified_asset_type', 'unified_asset_sub_type', 'unified_category']
+KEY_SEPARATOR = '\x1f'
+NO_MATCH = (None,) * len(ENRICHED_COLUMNS)
+MAX_REPORTED_MISSES = 5
+
+SYMBOL_QUERY = f"SELECT platform, symbol, {', '.join(ENRICHED_COLUMNS)} FROM symbols"
+VERSION_QUERY = "SELECT COUNT(*), MAX(updated_at) FROM symbols"
+
+def add_symbol_index_arguments(parser):
+    """Add --enrich-symbols and --symbol-cache to an argparse parser"""
+    parser.add_argument('--enrich-symbols', action=argparse.BooleanOptionalAction, default=True,
+                        help='Add the unified symbol, asset type, sub type and category of each trade from the '
+                             'symbols table (default: on when trades has the columns)')
+    parser.add_argument('--symbol-cache', metavar='PATH', default=None,
+                        help='Cache the symbol index in this file until the symbols table changes')
+    return parser
+
+def symbol_key(platform, symbol):
+    """Lookup key of a (platform, symbol) pair, None if either is missing"""
+    if not platform or not symbol:
+        return None
+    return f"{platform.strip().casefold()}{KEY_SEPARATOR}{symbol.strip().casefold()}"
+
+def table_has_columns(connection, table, columns):
+    """True if every column exists in table (e.g. before writing the enriched trades)"""
+    cursor = connection.cursor()
+    cursor.execute(f"SELECT * FROM {table} LIMIT 0")
+    names = {column[0] for column in cursor.description}
+    cursor.fetchall()
+    cursor.close()
+    return all(column in names for column in columns)
+
+class SymbolIndex:
+    """Unified (symbol, asset type, sub type, category) per platform symbol, with hit/miss counts"""
+
+    def __init__(self, version=None, source=None):
+        self.entries = {}
+        self.version = version
+        self.source = source
+        self.matched = 0
+        self.missed = 0
+        self.misses = {}
+
+    def __len__(self):
+        return len(self.entries)
+
+    def add(self, platform, symbol, *values):
+        """values: the ENRICHED_COLUMNS of the symbol, in order"""
+        key = symbol_key(platform, symbol)
+        if key is not None:
+            self.entries[key] = tuple(value or None for value in values)
+
+    @staticmethod
+    def table_version(connection):
+        cursor = connection.cursor()
+        cursor.execute(VERSION_QUERY)
+        count, updated = cursor.fetchone()
+        cursor.close()
+        return [count, str(updated) if updated is not None else None]
+
+    @classmethod
+    def load(cls, connection, version=None):
+        """Read the index from the symbols table"""
+        index = cls(version or cls.table_version(connection), source='symbols')
+        cursor = connection.cursor()
+        cursor.execute(SYMBOL_QUERY)
+        for row in cursor.fetchall():
+            index.add(*row)
+        cursor.close()
+        return index
+
+    @classmethod
+    def from_cache(cls, path):
+        with gzip.open(path, 'rt', encoding='utf-8') as f:
+            data = json.load(f)
+        if data.get('columns') != ENRICHED_COLUMNS:
+            raise ValueError('written for other symbol columns')
+        index = cls(data['version'], source=path)
+        index.entries = {key: tuple(value) for key, value in data['entries'].items()}
+        return index
+
+    def save(self, path):
+        """Write the index to a cache file (replaced atomically)"""
+        temp = f"{path}.{os.getpid()}.tmp"
+        with gzip.open(temp, 'wt', encoding='utf-8') as f:
+            json.dump({'version': self.version, 'columns': ENRICHED_COLUMNS, 'entries': self.entries}, f)
+        os.replace(temp, path)
+
+    @classmethod
+    def open(cls, connection, cache=None):
+        """The cached index if the symbols table is unchanged, else a fresh one (re-cached)"""
+        start = time.perf_counter()
+        version = cls.table_version(connection)
+        if cache and os.path.exists(cache):
+            try:
+                index = cls.from_cache(cache)
+            except (OSError, ValueError, KeyError) as e:
+                print(f"  ⚠️  Ignoring unreadable symbol cache {cache}: {e}")
+            else:
+                if index.version == version:
+                    print(f"  Symbol index: {len(index):,} symbols from {cache} "
+                          f"in {time.perf_counter() - start:.2f}s")
+                    return index
+        index = cls.load(connection, version)
+        print(f"  Symbol index: {len(index):,} symbols from symbols in {time.perf_counter() - start:.2f}s")
+        if cache:
+            index.save(cache)
+            print(f"  ✓ Symbol cache saved to {cache}")
+        return index
+
+    def lookup(self, platform, symbol):
+        """The ENRICHED_COLUMNS values of a symbol, Nones when unknown"""
+        key = symbol_key(platform, symbol)
+        match = self.entries.get(key) if key is not None else None
+        if match is None:
+            self.miss(key)
+            return NO_MATCH
+        self.matched += 1
+        return match
+
+    def miss(self, key, rows=1):
+        self.missed += rows
+        if key is not None:
+            self.misses[key] = self.misses.get(key, 0) + rows
+
+    def reset_counts(self):
+        self.matched = 0
+        self.missed = 0
+        self.misses = {}
+
+    def counts(self):
+        """Picklable hit/miss counts, for add_counts() in the parent of a worker pool"""
+        return (self.matched, self.missed, self.misses)
+
+    def add_counts(self, counts):
+        matched, missed, misses = counts
+        self.matched += matched
+        self.missed += missed
+        for key, rows in misses.items():
+            self.misses[key] = self.misses.get(key, 0) + rows
+
+    def report(self):
+        total = self.matched + self.missed
+        line = (f"{self.matched:,} of {total:,} trades matched a symbol "
+                f"({self.matched / total * 100 if total else 0:.1f}%)")
+        if self.misses:
+            top = sorted(self.misses.items(), key=lambda item: -item[1])[:MAX_REPORTED_MISSES]
+            line += "; unknown: " + ', '.join(
+                f"{key.replace(KEY_SEPARATOR, '/')} ({count:,})" for key, count in top)
+        return line
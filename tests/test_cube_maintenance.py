@@ -0,0 +1,40 @@
+"""apply_changes must not delete change log rows it has not applied"""
+
+import cube_maintenance
+from cube_maintenance import LOG_COLUMNS, LOG_TABLE, STATE_TABLE, apply_changes
+from db import connect
+
+def log_row(row_id, user_id):
+    # sqlite stores no dates or decimals; the batch is only counted here
+    return (row_id, 'trade', 1, user_id, 'P1', 1, 'P1', 'plan', None, None, 1, 1, 2)
+
+def test_late_commit_with_lower_id_is_kept(monkeypatch):
+    conn = connect('sqlite', path=':memory:')
+    cursor = conn.cursor()
+    cursor.execute(f"CREATE TABLE {LOG_TABLE} ({', '.join(LOG_COLUMNS)})")
+    cursor.execute(f"CREATE TABLE {STATE_TABLE} (name, value)")
+    insert = f"INSERT INTO {LOG_TABLE} VALUES ({', '.join(['%s'] * len(LOG_COLUMNS))})"
+    for row_id in (1, 2, 4):
+        cursor.execute(insert, log_row(row_id, f'u{row_id}'))
+    conn.commit()
+
+    applied = []
+
+    def apply(deltas, cursor):
+        applied.append(deltas.touched_partners())
+        if len(applied) == 1:
+            # An import transaction that took id 3 commits while the batch is applied
+            cursor.execute(insert, log_row(3, 'late'))
+
+    monkeypatch.setattr(cube_maintenance.CubeDeltas, 'apply', apply)
+    monkeypatch.setattr(cube_maintenance, 'refresh_dashboard', lambda cursor, partner_ids=None: None)
+    monkeypatch.setattr(cube_maintenance, 'set_state', lambda cursor, name, value: None)
+
+    assert apply_changes(conn) == 3
+    cursor.execute(f"SELECT id, binary_user_id FROM {LOG_TABLE}")
+    assert cursor.fetchall() == [(3, 'late')]
+
+    # The next run applies it
+    assert apply_changes(conn) == 1
+    cursor.execute(f"SELECT COUNT(*) FROM {LOG_TABLE}")
+    assert cursor.fetchone()[0] == 0
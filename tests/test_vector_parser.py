@@ -0,0 +1,100 @@
+"""The vectorised parser must read malformed CSV rows exactly like the row parser"""
+
+import csv
+
+from import_deposits import parse_deposit_row
+from import_trades1 import TRADE_COLUMNS, parse_trade_row
+from vector_parser import FLOAT_COLUMNS, iter_deposit_blocks, iter_trade_blocks, read_csv_chunks
+
+def write_trades(path, rows):
+    with open(path, 'w', encoding='utf-8', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(TRADE_COLUMNS)
+        writer.writerows(rows)
+
+def trade(user_id, pnl='1,234.50', partner='P-0001', **extra):
+    values = dict.fromkeys(TRADE_COLUMNS, '')
+    values.update(date='2025-07-01', binary_user_id=user_id, platform='MT5', asset='frxEURUSD',
+                  number_of_trades='3', closed_pnl_usd=pnl, is_synthetic='TRUE',
+                  affiliated_partner_id=partner, **extra)
+    return [values[name] for name in TRADE_COLUMNS]
+
+def row_parser_result(path):
+    """(parsed rows, rows rejected) the way --parser rows reads the file"""
+    parsed, errors = [], 0
+    with open(path, 'r', encoding='utf-8', newline='') as f:
+        for row in csv.DictReader(f):
+            try:
+                values = parse_trade_row(row)
+            except Exception:
+                errors += 1
+                continue
+            if values is not None:
+                parsed.append(values)
+    return parsed, errors
+
+def vector_result(path, chunk_rows=2):
+    rejected = []
+    rows = []
+    for block, read, end in iter_trade_blocks(path, chunk_rows, on_error=lambda row, e: rejected.append(row)):
+        rows.extend(block)
+    return rows, len(rejected)
+
+def test_clean_file_stays_vectorised(tmp_path):
+    path = tmp_path / 'trades.csv'
+    write_trades(path, [trade('100001'), trade('100002', pnl=''), trade('100003', partner='')])
+
+    chunks = [chunk for chunk, _ in read_csv_chunks(path, 10)]
+    assert all(not isinstance(chunk, list) for chunk in chunks)
+    assert vector_result(path) == row_parser_result(path)
+
+def test_extra_field_matches_row_parser(tmp_path):
+    path = tmp_path / 'trades.csv'
+    write_trades(path, [trade('100001'), trade('100002') + ['unexpected'], trade('100003')])
+
+    rows, errors = vector_result(path)
+    assert (rows, errors) == row_parser_result(path)
+    assert [values[1] for values in rows] == ['100001', '100002', '100003']
+
+def test_short_row_is_not_padded(tmp_path):
+    path = tmp_path / 'trades.csv'
+    write_trades(path, [trade('100001'), trade('100002')[:5], trade('100003'), trade('100004')])
+
+    rows, errors = vector_result(path)
+    assert (rows, errors) == row_parser_result(path)
+    assert errors == 1
+    assert [values[1] for values in rows] == ['100001', '100003', '100004']
+
+def test_quoted_separators_are_not_fields(tmp_path):
+    path = tmp_path / 'trades.csv'
+    write_trades(path, [trade('100001', pnl='-12,345,678.90'), trade('100002', partner='P,0002')])
+
+    assert not any(isinstance(chunk, list) for chunk, _ in read_csv_chunks(path, 10))
+    assert vector_result(path, 10) == row_parser_result(path)
+
+def test_sparse_float_columns_stay_floats(tmp_path):
+    path = tmp_path / 'trades.csv'
+    write_trades(path, [trade('100001', swaps_usd='0', floating_pnl='TRUE'),
+                        trade('100002', swaps_usd='1', floating_pnl='FALSE')])
+
+    chunk, _ = next(read_csv_chunks(path, 10, FLOAT_COLUMNS))
+    # Empty and 0/1 columns keep their tokenizer floats; only the 0/1 ones are re-read as text
+    assert chunk['app_markup_usd'].dtype == 'float64'
+    assert chunk['closed_pnl_usd'].dtype == 'float64'
+    assert chunk['swaps_usd'].tolist() == ['0', '1']
+    assert chunk['floating_pnl'].tolist() == ['TRUE', 'FALSE']
+    assert vector_result(path, 10) == row_parser_result(path)
+
+def test_short_deposit_row_matches_row_parser(tmp_path):
+    path = tmp_path / 'deposits.csv'
+    headers = ['transaction_id', 'binary_user_id', 'amount_usd', 'transaction_time']
+    with open(path, 'w', encoding='utf-8', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(headers)
+        writer.writerows([['1', '100001', '50', '2025-07-01 03:33:11 UTC'], ['2', '100002'],
+                          ['3', '100003', '75', '2025-07-02 10:00:00 UTC', 'extra']])
+
+    with open(path, 'r', encoding='utf-8', newline='') as f:
+        expected = [parse_deposit_row(headers, row) for row in csv.DictReader(f)]
+    rows = [values for block, _, _ in iter_deposit_blocks(path, 10) for values in block]
+    assert rows == expected
@@ -0,0 +1,428 @@
+#!/usr/bin/env python3
+"""
+Vectorised CSV parsing for the trades and deposits importers
+
+Reads the CSV in chunks of rows with pandas and applies the same
+conversions as the row-by-row parsers (clean_number, parse_boolean,
+parse_date, strip/empty-to-NULL) as whole-column operations. The result is
+a typed DataFrame per chunk in table column order, which the importers turn
+into row tuples for BatchWriter or a LOAD DATA staging file.
+
+Run directly to benchmark against the row parser on a synthetic file:
+    python3 vector_parser.py --rows 1000000
+"""
+
+import argparse
+import csv
+import io
+import os
+import random
+import tempfile
+import time
+from collections import Counter
+from datetime import date, timedelta
+from itertools import islice
+
+import numpy as np
+import pandas as pd
+
+from compressed_io import open_input, open_input_text
+
+CHUNK_ROWS = 100000
+
+FLOAT_COLUMNS = {
+    'number_of_trades', 'closed_pnl_usd', 'closed_pnl_usd_abook', 'closed_pnl_usd_bbook',
+    'floating_pnl_usd', 'floating_pnl', 'expected_revenue_usd', 'closed_pnl',
+    'swaps_usd', 'volume_usd', 'app_markup_usd'
+}
+BOOLEAN_COLUMNS = {'is_synthetic', 'is_financial'}
+
+def read_csv_header(csv_file):
+    """Field names exactly as csv.DictReader sees them"""
+    with open_input_text(csv_file) as f:
+        return next(csv.reader(f), [])
+
+def iter_csv_blocks(csv_file, chunk_rows=CHUNK_ROWS, start=None):
+    """Yield (text, byte offset after it) for blocks of about chunk_rows data lines
+
+    A block is only cut where the number of quote characters is even, so
+    quoted fields that span lines are never split. start is the byte offset
+    of a line boundary to begin at instead of the first data line.
+    """
+    with open_input(csv_file) as f:
+        header = f.readline()
+        offset = len(header)
+        if start is not None:
+            f.seek(start)
+            offset = start
+        pending = b''
+        while True:
+            lines = list(islice(f, chunk_rows))
+            if not lines:
+                break
+            block = pending + b''.join(lines)
+            offset += sum(len(line) for line in lines)
+            if block.count(b'"') % 2:
+                pending = block
+                continue
+            pending = b''
+            yield block.decode('utf-8'), offset
+        if pending:
+            yield pending.decode('utf-8'), offset
+
+def delimiters_outside_quotes(block):
+    """Field separators in a block of CSV text, not counting those inside quoted fields"""
+    data = np.frombuffer(block.encode('utf-8'), dtype=np.uint8)
+    # Parity of the quotes seen so far (uint8 wraps, which keeps the parity)
+    quoted = np.cumsum(data == ord('"'), dtype=np.uint8) & 1
+    return int(np.count_nonzero((data == ord(',')) & (quoted == 0)))
+
+def read_csv_chunks(csv_file, chunk_rows=CHUNK_ROWS, float_columns=(), start=None):
+    """Yield (DataFrame, byte offset after it), strings with float_columns parsed by pandas
+
+    Float columns are converted by the C tokenizer (thousands=',' and
+    float_precision='round_trip', which rounds exactly like float()). If a
+    block has a value the tokenizer rejects, the whole block is re-read as
+    strings and number_column converts it with clean_number instead; a
+    column that came out as only 0/1 (possibly TRUE/FALSE) is re-read alone.
+
+    The tokenizer refuses a row with an extra field and silently pads a
+    short one, so every block's separators are counted against its rows.
+    A block with a malformed row is yielded as a list of csv.DictReader
+    rows instead, for the row parser (parse_trades_chunk and
+    parse_deposits_chunk do that), so it is read exactly as with --parser rows.
+    """
+    fieldnames = read_csv_header(csv_file)
+    floats = [name for name in fieldnames if name in float_columns]
+    options = dict(header=None, names=fieldnames, index_col=False,
+                   keep_default_na=False, encoding='utf-8')
+
+    for block, end in iter_csv_blocks(csv_file, chunk_rows, start):
+        chunk = None
+        if floats:
+            try:
+                chunk = pd.read_csv(
+                    io.StringIO(block), **options,
+                    dtype={name: (np.float64 if name in float_columns else object) for name in fieldnames},
+                    na_values={name: [''] for name in floats},
+                    thousands=',', float_precision='round_trip'
+                )
+                # A column of only TRUE/FALSE is read as bool and cast to 1.0/0.0,
+                # so float columns with nothing but 0/1 (and empties) are re-read as text
+                ambiguous = [name for name in floats
+                             if chunk[name].notna().any() and chunk[name].dropna().isin([0.0, 1.0]).all()]
+                if ambiguous:
+                    text = pd.read_csv(io.StringIO(block), **options, usecols=ambiguous,
+                                       dtype=object, na_filter=False)
+                    for name in ambiguous:
+                        chunk[name] = text[name]
+            except (ValueError, pd.errors.ParserError):
+                chunk = None
+        if chunk is None:
+            try:
+                chunk = pd.read_csv(io.StringIO(block), **options, dtype=object, na_filter=False)
+            except pd.errors.ParserError:
+                chunk = None
+        if chunk is None or delimiters_outside_quotes(block) != len(chunk) * (len(fieldnames) - 1):
+            chunk = list(csv.DictReader(io.StringIO(block), fieldnames=fieldnames))
+        yield chunk, end
+
+def skip_row(row, error):
+    """Default on_error of the row fallback: report the row and leave it out"""
+    print(f"  ⚠️  Skipping malformed row ({type(error).__name__}: {error}): {row}")
+
+def parse_rows(rows, parse, columns, on_error=None):
+    """Row-parser fallback for a block read as csv.DictReader rows: a frame of the parsed tuples
+
+    Rows parse rejects (or returns None for) are left out; on_error(row,
+    exception) is called for the rejected ones.
+    """
+    on_error = on_error or skip_row
+    parsed = []
+    for row in rows:
+        try:
+            values = parse(row)
+        except Exception as e:
+            on_error(row, e)
+            continue
+        if values is not None:
+            parsed.append(values)
+    # object columns keep the values exactly as the row parser returned them
+    return pd.DataFrame(parsed, columns=columns, dtype=object)
+
+def _column(chunk, name):
+    """Column as strings, '' when the CSV does not have it"""
+    if name in chunk:
+        return chunk[name]
+    return pd.Series([''] * len(chunk), index=chunk.index, dtype=object)
+
+def map_distinct(values, convert, dtype=object):
+    """Apply a scalar parser once per distinct value and broadcast the result"""
+    codes, uniques = pd.factorize(values, use_na_sentinel=False)
+    # factorize reports None as NaN
+    converted = np.array([convert(None if pd.isna(value) else value) for value in uniques],
+                         dtype=dtype)
+    return pd.Series(converted[codes], index=values.index, dtype=converted.dtype)
+
+def text_column(chunk, name):
+    """Vectorised `value.strip() or None`"""
+    return map_distinct(_column(chunk, name), lambda value: value.strip() or None)
+
+def number_column(chunk, name, clean_number):
+    """Vectorised clean_number: strip, drop commas and quotes, convert to float"""
+    values = _column(chunk, name)
+    if values.dtype == np.float64:
+        return values  # already converted by the CSV tokenizer
+
+    parsed = [clean_number(value) for value in values.tolist()]
+    missing = pd.Series([value is None for value in parsed], index=values.index)
+    numbers = pd.Series(parsed, index=values.index, dtype=object).astype('float64')
+    if (numbers.isna() & ~missing).any():
+        # Literal "nan" values: keep them apart from NULLs like clean_number does
+        return numbers.astype(object).where(~missing, None)
+    return numbers
+
+def boolean_column(chunk, name, parse_boolean):
+    """Vectorised parse_boolean"""
+    return map_distinct(_column(chunk, name), parse_boolean, dtype=bool)
+
+def date_column(chunk, name, parse_date):
+    """Parse dates once per distinct value (a daily export has very few)"""
+    return map_distinct(_column(chunk, name), parse_date)
+
+def parse_trades_chunk(chunk, on_error=None):
+    """Convert a chunk of trades CSV rows into a DataFrame in TRADE_COLUMNS order"""
+    from import_trades1 import TRADE_COLUMNS, clean_number, parse_boolean, parse_date, parse_trade_row
+
+    if isinstance(chunk, list):
+        return parse_rows(chunk, parse_trade_row, TRADE_COLUMNS, on_error)
+
+    # Skip rows without binary_user_id before doing any other work
+    user_ids = text_column(chunk, 'binary_user_id')
+    chunk = chunk[user_ids.notna()]
+
+    columns = {}
+    for name in TRADE_COLUMNS:
+        if name == 'date':
+            columns[name] = date_column(chunk, name, parse_date)
+        elif name == 'binary_user_id':
+            columns[name] = user_ids[user_ids.notna()]
+        elif name in FLOAT_COLUMNS:
+            columns[name] = number_column(chunk, name, clean_number)
+        elif name in BOOLEAN_COLUMNS:
+            columns[name] = boolean_column(chunk, name, parse_boolean)
+        else:
+            columns[name] = text_column(chunk, name)
+    return pd.DataFrame(columns, index=chunk.index)
+
+def parse_deposits_chunk(chunk, on_error=None):
+    """Apply parse_deposit_row to a chunk of deposits CSV rows"""
+    if isinstance(chunk, list):
+        from import_deposits import parse_deposit_row
+
+        # DictReader rows carry every field name (extra fields are under None)
+        headers = [name for name in chunk[0] if name is not None] if chunk else []
+        return parse_rows(chunk, lambda row: parse_deposit_row(headers, row), headers, on_error)
+
+    def convert(value, is_time=False):
+        if value == '' or value == 'NULL':
+            return None
+        if is_time and value not in ('TRUE', 'FALSE'):
+            # Parse: 2025-07-01 03:33:11.481401 UTC
+            return value.replace(' UTC', '')
+        return value
+
+    return pd.DataFrame({
+        name: map_distinct(chunk[name], lambda value, t=(name == 'transaction_time'): convert(value, t))
+        for name in chunk.columns
+    }, index=chunk.index)
+
+def stamp_partners(frame, partner_map):
+    """Vectorised partner_map.PartnerMap.stamp over a parsed trades chunk"""
+    mapped = frame['binary_user_id'].map(partner_map.partners)
+    partner_map.touched.update(mapped.dropna().unique().tolist())
+    missing = frame['affiliated_partner_id'].isna() & mapped.notna()
+    partner_map.stamped += int(missing.sum())
+    frame.loc[missing, 'affiliated_partner_id'] = mapped[missing]
+    return frame
+
+def enrich_symbols(frame, symbol_index):
+    """Vectorised symbol_index.SymbolIndex.lookup over a parsed trades chunk (adds its columns)"""
+    from symbol_index import ENRICHED_COLUMNS, NO_MATCH, symbol_key
+
+    keys = [symbol_key(platform, asset)
+            for platform, asset in zip(frame['platform'].tolist(), frame['asset'].tolist())]
+    # Look up each distinct symbol once (a chunk trades few of them)
+    matches = {}
+    for key, count in Counter(keys).items():
+        match = symbol_index.entries.get(key) if key is not None else None
+        if match is None:
+            symbol_index.miss(key, count)
+            match = NO_MATCH
+        else:
+            symbol_index.matched += count
+        matches[key] = match
+    values = [matches[key] for key in keys]
+    for i, name in enumerate(ENRICHED_COLUMNS):
+        frame[name] = pd.Series([match[i] for match in values], index=frame.index, dtype=object)
+    return frame
+
+def iter_frame_rows(frame):
+    """Yield row tuples with NaN turned into None"""
+    columns = []
+    for name in frame.columns:
+        values = frame[name]
+        if values.dtype == np.float64:
+            objects = values.astype(object)
+            columns.append(objects.where(values.notna(), None).tolist())
+        else:
+            columns.append(values.tolist())
+    return zip(*columns)
+
+def iter_trade_blocks(csv_file, chunk_rows=CHUNK_ROWS, start=None, partner_map=None, symbol_index=None,
+                      on_error=None):
+    """Yield (row tuples, CSV rows read, byte offset after them) per chunk of trades"""
+    for chunk, end in read_csv_chunks(csv_file, chunk_rows, FLOAT_COLUMNS, start):
+        frame = parse_trades_chunk(chunk, on_error)
+        if partner_map is not None:
+            frame = stamp_partners(frame, partner_map)
+        if symbol_index is not None:
+            frame = enrich_symbols(frame, symbol_index)
+        yield iter_frame_rows(frame), len(chunk), end
+
+def iter_deposit_blocks(csv_file, chunk_rows=CHUNK_ROWS, start=None, on_error=None):
+    """Yield (row tuples, CSV rows read, byte offset after them) per chunk of deposits"""
+    for chunk, end in read_csv_chunks(csv_file, chunk_rows, start=start):
+        yield iter_frame_rows(parse_deposits_chunk(chunk, on_error)), len(chunk), end
+
+def iter_trade_rows(csv_file, chunk_rows=CHUNK_ROWS):
+    """Vectorised replacement for `parse_trade_row` over a whole file"""
+    for rows, _, _ in iter_trade_blocks(csv_file, chunk_rows):
+        yield from rows
+
+def iter_deposit_rows(csv_file, chunk_rows=CHUNK_ROWS):
+    """Vectorised replacement for `parse_deposit_row` over a whole file"""
+    for rows, _, _ in iter_deposit_blocks(csv_file, chunk_rows):
+        yield from rows
+
+def staging_column(name, values):
+    """Format one parsed column for a LOAD DATA file (\\N is NULL)"""
+    from import_trades1 import format_staging_value
+
+    if values.dtype == np.float64:
+        text = values.astype(object).map(repr)
+        return text.where(values.notna(), '\\N').tolist()
+    if name in FLOAT_COLUMNS:
+        # Float column holding a literal "nan" next to NULLs
+        return [format_staging_value(value) for value in values.tolist()]
+    return map_distinct(values, format_staging_value).tolist()
+
+def staging_lines(frame):
+    """Format a parsed trades chunk as LOAD DATA lines (tab separated)"""
+    columns = [staging_column(name, frame[name]) for name in frame.columns]
+    return ['\t'.join(fields) for fields in zip(*columns)]
+
+def write_staging_file(csv_file, staging_path, start=None, chunk_rows=CHUNK_ROWS, metrics=None,
+                       partner_map=None, symbol_index=None):
+    """Vectorised version of import_trades1.write_staging_file"""
+    written = 0
+    errors = 0
+    read = 0
+
+    def reject(row, e):
+        nonlocal errors
+        errors += 1
+        if metrics is not None:
+            metrics.reject(type(e).__name__, f"{e} (row data: {row})")
+        else:
+            skip_row(row, e)
+
+    chunks = read_csv_chunks(csv_file, chunk_rows, FLOAT_COLUMNS, start)
+    parse = parse_trades_chunk
+    if metrics is not None:
+        chunks = metrics.timed_iter('read', chunks)
+        parse = metrics.timed('parse', parse_trades_chunk)
+    with open(staging_path, 'w', encoding='utf-8', newline='\n') as out:
+        for chunk, _ in chunks:
+            read += len(chunk)
+            frame = parse(chunk, reject)
+            if partner_map is not None:
+                frame = stamp_partners(frame, partner_map)
+            if symbol_index is not None:
+                frame = enrich_symbols(frame, symbol_index)
+            lines = staging_lines(frame)
+            if lines:
+                out.write('\n'.join(lines))
+                out.write('\n')
+            written += len(lines)
+            print(f"  Staged {written} trades...")
+    return written, errors, read
+
+def generate_synthetic_trades(path, rows, seed=42):
+    """Write a trades CSV with the real header and realistic dirty values"""
+    from import_trades1 import TRADE_COLUMNS
+
+    rng = random.Random(seed)
+    platforms = ['MT5', 'cTrader', 'DerivX', 'dTrader', 'SmartTrader']
+    start = date(2025, 1, 1)
+    with open(path, 'w', encoding='utf-8', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(TRADE_COLUMNS)
+        for i in range(rows):
+            day = start + timedelta(days=rng.randint(0, 270))
+            trade_date = day.isoformat() if rng.random() < 0.7 else day.strftime('%m/%d/%Y')
+            numbers = [
+                f"{rng.uniform(-50000, 50000):,.2f}" if rng.random() < 0.8 else ''
+                for _ in range(9)
+            ]
+            writer.writerow([
+                trade_date, str(100000 + rng.randint(0, 200000)) if rng.random() > 0.001 else '',
+                f"CR{rng.randint(1000, 99999)}", rng.choice(platforms), ' app ', 'real',
+                rng.choice(['CFD', 'Multipliers', 'Accumulators']), 'forex', 'frxEURUSD',
+                str(rng.randint(1, 500)), *numbers,
+                rng.choice(['TRUE', 'FALSE', '']), rng.choice(['TRUE', 'FALSE', '1', 'no']),
+                *([f"{rng.uniform(0, 100):.4f}"] if rng.random() < 0.5 else ['']),
+                rng.choice(['', '', 'P-0001', 'P-0002'])
+            ])
+
+def benchmark(rows, csv_file=None):
+    """Compare the row parser with the vectorised parser on the same file"""
+    from import_trades1 import parse_trade_row
+
+    path = csv_file
+    if path is None:
+        fd, path = tempfile.mkstemp(prefix='trades_bench_', suffix='.csv')
+        os.close(fd)
+        print(f"Generating {rows:,} synthetic trades in {path}...")
+        generate_synthetic_trades(path, rows)
+
+    try:
+        start = time.perf_counter()
+        with open(path, 'r', encoding='utf-8') as f:
+            row_count = sum(1 for row in csv.DictReader(f) if parse_trade_row(row) is not None)
+        row_elapsed = time.perf_counter() - start
+
+        start = time.perf_counter()
+        vector_count = sum(1 for _ in iter_trade_rows(path))
+        vector_elapsed = time.perf_counter() - start
+
+        # Row-for-row comparison, streamed so memory stays flat
+        with open(path, 'r', encoding='utf-8') as f:
+            expected = (r for r in map(parse_trade_row, csv.DictReader(f)) if r is not None)
+            mismatches = sum(1 for a, b in zip(expected, iter_trade_rows(path)) if a != b)
+
+        print(f"\n{'Parser':<12} {'Rows':>10} {'Seconds':>9} {'Rows/s':>12}")
+        print(f"{'row':<12} {row_count:>10,} {row_elapsed:>9.2f} {row_count / row_elapsed:>12,.0f}")
+        print(f"{'vector':<12} {vector_count:>10,} {vector_elapsed:>9.2f} {vector_count / vector_elapsed:>12,.0f}")
+        print(f"\nSpeed-up: {row_elapsed / vector_elapsed:.1f}x")
+        print(f"Identical rows: {'yes' if mismatches == 0 and row_count == vector_count else f'no ({mismatches} differ)'}")
+    finally:
+        if csv_file is None and os.path.exists(path):
+            os.remove(path)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Benchmark the vectorised trades parser')
+    parser.add_argument('--rows', type=int, default=1000000, help='Synthetic rows to generate')
+    parser.add_argument('--csv', help='Benchmark an existing trades CSV instead')
+    args = parser.parse_args()
+    benchmark(args.rows, args.csv)